@@ -1,30 +1,61 @@
 from .actor_manager import ActorManager
 from flask import Flask
+from schema import schemas
 from utils.api import *
 
+SIGN_UP_SCHEMA = schemas.get("actor_sign_up", 1, {
+    "type": "object",
+    "required": ["identifier", "password", "type", "display_name"],
+    "properties": {
+        "identifier": {"type": "string"},
+        "password": {"type": "string"},
+        "type": {"type": "string"},
+        "display_name": {"type": "string"},
+    },
+})
+TOKEN_SCHEMA = schemas.get("actor_token", 1, {
+    "type": "object",
+    "required": ["identifier", "password"],
+    "properties": {
+        "identifier": {"type": "string"},
+        "password": {"type": "string"},
+    },
+})
+
 
 class ActorApi:
-    def __init__(self, app: Flask, actor_manager: ActorManager):
+    def __init__(self, app: Flask, actor_manager: ActorManager, bulk_max_items: int = 50000):
         self.app = app
         self.actor_manager = actor_manager
+        self.bulk_max_items = bulk_max_items
 
     def register(self):
         @self.app.post('/api/v1/nodes/<node_identifier>/actors/signup')
         def actor_sign_up(node_identifier: str):
+            body = validated_body(SIGN_UP_SCHEMA)
             return self.actor_manager.sign_up(
                 node_identifier,
-                required_param("identifier"),
-                required_param("password"),
-                required_param("type"),
-                required_param("display_name")
+                body["identifier"],
+                body["password"],
+                body["type"],
+                body["display_name"]
             )
 
+        @self.app.post('/api/v1/nodes/<node_identifier>/actors/bulk')
+        @authenticate_admin
+        def actor_bulk_sign_up(_, node_identifier: str):
+            return {
+                "results": self.actor_manager.sign_up_many(node_identifier,
+                                                           bulk_param("actors", self.bulk_max_items))
+            }
+
         @self.app.post('/api/v1/nodes/<node_identifier>/actors/token')
         def get_actor_token(node_identifier: str):
+            body = validated_body(TOKEN_SCHEMA)
             return self.actor_manager.get_token(
                 node_identifier,
-                required_param("identifier"),
-                required_param("password")
+                body["identifier"],
+                body["password"]
             )
 
         @self.app.get("/api/v1/nodes/<node_identifier>/actors/current")
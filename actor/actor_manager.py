@@ -1,20 +1,35 @@
 import time
+from typing import Callable
 
-import bcrypt
 import jwt
-from tinydb.table import Table
-from tinydb import Query
+from storage import DURABLE, Table
 
 import utils.ed25519
 from node import NodeManager
+from schema import schemas
+from utils.password_hasher import HASH_PATTERN, PasswordHasher
+
+ACTOR_SCHEMA = schemas.get("actor", 1, {
+    "type": "object",
+    "required": ["identifier", "type", "display_name"],
+    "properties": {
+        "identifier": {"type": "string"},
+        "type": {"type": "string"},
+        "display_name": {"type": "string"},
+        "password": {"type": "string"},
+        "password_hash": {"type": "string", "pattern": HASH_PATTERN.pattern},
+    },
+}, "Actor")
 
 
 class ActorManager:
 
-    def __init__(self, db: Table, node_manager: NodeManager, vertex_endpoint: str):
+    def __init__(self, db: Table, node_manager: NodeManager, vertex_endpoint: str, password_hasher: PasswordHasher):
         self.db = db
         self.node_manager = node_manager
         self.vertex_endpoint = vertex_endpoint
+        self.password_hasher = password_hasher
+        self.listeners = []
 
     def sign_up(self, node_identifier: str, identifier: str, password: str, actor_type: str, display_name: str):
         if not self.node_manager.identifier_exists(node_identifier):
@@ -26,7 +41,7 @@ class ActorManager:
         actor_id = self.db.insert({
             "node_identifier": node_identifier,
             "identifier": identifier,
-            "password": bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8"),
+            "password": self.password_hasher.hash(password),
             "type": actor_type,
             "display_name": display_name,
             "created_on": int(time.time()),
@@ -38,19 +53,60 @@ class ActorManager:
             "identifier": identifier,
         }
 
+    def sign_up_many(self, node_identifier: str, actors: list) -> list[dict]:
+        """Signs up ``actors`` with a single write and returns one result per actor, in order.
+
+        Each actor carries either a plain ``password``, hashed here in parallel, or an existing bcrypt
+        ``password_hash`` for imports.
+        """
+        if not self.node_manager.identifier_exists(node_identifier):
+            raise Exception(f"Node {node_identifier} not found")
+
+        results = [None] * len(actors)
+        accepted = []
+        seen = set()
+        for position, (actor, error) in enumerate(zip(actors, ACTOR_SCHEMA.validate_many(actors))):
+            identifier = actor.get("identifier") if isinstance(actor, dict) else None
+            if error is None and ("password" in actor) == ("password_hash" in actor):
+                error = "Exactly one of password and password_hash is required"
+            if error is None and (identifier in seen or self.username_exists(node_identifier, identifier)):
+                error = f"Actor {identifier} already exists on node {node_identifier}"
+            if error is not None:
+                results[position] = {"identifier": identifier, "success": False, "message": error}
+                continue
+            seen.add(identifier)
+            accepted.append(position)
+
+        plain = [position for position in accepted if "password" in actors[position]]
+        passwords = dict(zip(plain, self.password_hasher.hash_many([actors[position]["password"]
+                                                                   for position in plain])))
+        now = int(time.time())
+        actor_ids = self.db.insert_multiple([{
+            "node_identifier": node_identifier,
+            "identifier": actors[position]["identifier"],
+            "password": passwords.get(position) or actors[position]["password_hash"],
+            "type": actors[position]["type"],
+            "display_name": actors[position]["display_name"],
+            "created_on": now,
+            "modified_on": now,
+        } for position in accepted]) if accepted else []
+
+        for position, actor_id in zip(accepted, actor_ids):
+            results[position] = {"identifier": actors[position]["identifier"], "success": True, "id": actor_id}
+        return results
+
     def get_token(self, node_identifier: str, identifier: str, password: str,
                   audience_node_address: str = None) -> dict:
         node = self.node_manager.get_signing_private_key(node_identifier)
-        query = Query()
-        actor = self.db.get(
-            (query.node_identifier == node_identifier) &
-            (query.identifier == identifier)
-        )
+        actor = self.db.get({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+        })
 
         if not actor:
             raise Exception("Invalid login credentials")
 
-        if not bcrypt.checkpw(password.encode("utf-8"), actor["password"].encode("utf-8")):
+        if not self.password_hasher.check(password, actor["password"]):
             raise Exception("Invalid login credentials")
 
         issuer = "%s/%s" % (self.vertex_endpoint, node_identifier)
@@ -70,9 +126,10 @@ class ActorManager:
         }
 
     def get(self, node_identifier: str, identifier: str) -> dict:
-        query = Query()
-        actor = self.db.get((query.node_identifier == node_identifier) &
-                            (query.identifier == identifier))
+        actor = self.db.get({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+        })
 
         if not actor:
             raise Exception(f"Actor {identifier} not found on node {node_identifier}")
@@ -80,12 +137,13 @@ class ActorManager:
         return self.to_dict(actor)
 
     def update(self, node_identifier: str, identifier: str, display_name: str):
-        query = Query()
         results = self.db.update({
             "display_name": display_name,
             "modified_on": int(time.time()),
-        }, (query.node_identifier == node_identifier) &
-           (query.identifier == identifier))
+        }, {
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+        })
 
         if len(results) == 0:
             raise Exception(f"Actor {identifier} not found on node {node_identifier}")
@@ -95,12 +153,13 @@ class ActorManager:
         }
 
     def change_password(self, node_identifier: str, identifier: str, password: str) -> dict:
-        query = Query()
         results = self.db.update({
-            "password": bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()),
+            "password": self.password_hasher.hash(password),
             "modified_on": int(time.time()),
-        }, (query.node_identifier == node_identifier) &
-           (query.identifier == identifier))
+        }, {
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+        }, durability=DURABLE)
 
         if len(results) == 0:
             raise Exception(f"Actor {identifier} not found on node {node_identifier}")
@@ -110,19 +169,24 @@ class ActorManager:
         }
 
     def delete(self, node_identifier: str, identifier: str) -> dict:
-        query = Query()
-        results = self.db.remove((query.node_identifier == node_identifier) &
-                                 (query.identifier == identifier))
+        results = self.db.remove({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+        })
 
         if len(results) == 0:
             raise Exception(f"Actor {identifier} not found on node {node_identifier}")
+        for listener in self.listeners:
+            listener(node_identifier, identifier)
         return {
             "identifier": identifier,
         }
 
+    def add_listener(self, listener: Callable[[str, str], None]):
+        self.listeners.append(listener)
+
     def username_exists(self, node_identifier: str, identifier: str) -> bool:
-        query = Query()
-        return self.db.contains((query.node_identifier == node_identifier) & (query.identifier == identifier))
+        return self.db.contains({"node_identifier": node_identifier, "identifier": identifier})
 
     @staticmethod
     def to_dict(self) -> dict:
@@ -1,12 +1,14 @@
 from .admin_manager import AdminManager
 from flask import Flask
 from utils.api import *
+from utils.profiler import Profiler
 
 
 class AdminAPI:
-    def __init__(self, app: Flask, manager: AdminManager):
+    def __init__(self, app: Flask, manager: AdminManager, profiler: Profiler):
         self.app = app
         self.manager = manager
+        self.profiler = profiler
 
     def register(self):
         @self.app.post("/api/v1/admins/init")
@@ -44,7 +46,9 @@ class AdminAPI:
         @self.app.get("/api/v1/admins")
         @authenticate_admin
         def list_admins(_):
-            return self.manager.list()
+            if streamed():
+                return stream_results(self.manager.iterate(cursor()))
+            return self.manager.list(cursor(), size())
 
         @self.app.get("/api/v1/admins/<username>")
         @authenticate_admin
@@ -56,6 +60,15 @@ class AdminAPI:
         def delete_admin(_, username):
             return self.manager.delete(username)
 
+        @self.app.post("/api/v1/admins/profiler")
+        @authenticate_admin
+        def profile(_):
+            return self.profiler.run(
+                optional_param("seconds", (int, float)) or 10,
+                optional_param("requests", int),
+                optional_param("interval", (int, float)) or 0.005,
+            )
+
         @self.app.put("/api/v1/admins/<username>/password")
         @authenticate_admin
         def reset_admin_password(_, username):
@@ -1,30 +1,34 @@
-import bcrypt
 import jwt
 from password_generator import PasswordGenerator
-from tinydb.table import Table
-from tinydb import Query
+from storage import DURABLE, Table
 from time import time
+from typing import Callable, Iterator
+
+from utils.password_hasher import PasswordHasher
 
 
 class AdminManager:
 
-    def __init__(self, db: Table, jwt_signing_key: str, vertex_endpoint: str) -> None:
+    def __init__(self, db: Table, jwt_signing_key: str, vertex_endpoint: str,
+                 password_hasher: PasswordHasher) -> None:
         self.db = db
         self.jwt_signing_key = jwt_signing_key
         self.vertex_endpoint = vertex_endpoint
+        self.password_hasher = password_hasher
         self.password_generator = PasswordGenerator()
+        self.listeners = []
 
     def init(self, username: str, password: str) -> dict:
-        if len(self.db.all()) != 0:
+        if len(self.db) != 0:
             raise Exception("Not allowed")
 
         admin_id = self.db.insert({
             "username": username,
-            "password": bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8'),
+            "password": self.password_hasher.hash(password),
             "creator": None,
             "created_on": int(time()),
             "modified_on": int(time()),
-        })
+        }, durability=DURABLE)
 
         return {
             "id": admin_id,
@@ -32,13 +36,12 @@ class AdminManager:
         }
 
     def get_token(self, username: str, password: str) -> dict:
-        query = Query()
-        admin = self.db.get(query.username == username)
+        admin = self.db.get({"username": username})
 
         if not admin:
             raise Exception("Invalid username and password combination")
 
-        if not bcrypt.checkpw(password.encode('utf-8'), admin["password"].encode('utf-8')):
+        if not self.password_hasher.check(password, admin["password"]):
             raise Exception("Invalid username and password combination")
 
         return {
@@ -52,18 +55,16 @@ class AdminManager:
         }
 
     def get(self, username: str) -> dict:
-        query = Query()
-        admin = self.db.get(query.username == username)
+        admin = self.db.get({"username": username})
         if not admin:
             raise Exception(f"Admin {username} not found")
         return self.to_dict(admin)
 
     def change_password(self, username: str, password: str) -> dict:
-        query = Query()
         result = self.db.update({
-            "password": bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8'),
+            "password": self.password_hasher.hash(password),
             "modified_on": int(time()),
-        }, query.username == username)
+        }, {"username": username}, durability=DURABLE)
 
         if len(result) == 0:
             raise Exception("User not found")
@@ -80,7 +81,7 @@ class AdminManager:
 
         admin_id = self.db.insert({
             "username": username,
-            "password": bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8'),
+            "password": self.password_hasher.hash(password),
             "creator": creator,
             "created_on": int(time()),
             "modified_on": int(time()),
@@ -92,10 +93,11 @@ class AdminManager:
         }
 
     def delete(self, username: str) -> dict:
-        query = Query()
-        result = self.db.remove(query.username == username)
+        result = self.db.remove({"username": username})
         if len(result) == 0:
             raise Exception(f"User {username} not found")
+        for listener in self.listeners:
+            listener(username)
         return {
             "username": username
         }
@@ -104,16 +106,22 @@ class AdminManager:
         password = self.password_generator.generate()
         return self.change_password(username, password)
 
-    def list(self):
-        admins = self.db.all()
-        results = []
-        for admin in admins:
-            results.append(self.to_dict(admin))
-        return results
+    def list(self, cursor: int = None, size: int = 50) -> dict:
+        admins = self.db.page({}, cursor, size + 1)
+        return {
+            "results": [self.to_dict(admin) for admin in admins[:size]],
+            "next": str(admins[size - 1].doc_id) if len(admins) > size else None,
+        }
+
+    def iterate(self, cursor: int = None) -> Iterator[dict]:
+        for admin in self.db.iterate({}, cursor):
+            yield self.to_dict(admin)
+
+    def add_listener(self, listener: Callable[[str], None]):
+        self.listeners.append(listener)
 
     def username_exists(self, username: str) -> bool:
-        query = Query()
-        return self.db.contains(query.username == username)
+        return self.db.contains({"username": username})
 
     @staticmethod
     def to_dict(self) -> dict:
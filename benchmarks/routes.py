@@ -0,0 +1,201 @@
+"""Route-level micro-benchmarks driven through the Flask test client.
+
+The app is built from main.py against a temporary DATA_PATH which is seeded before timing starts:
+
+    python -m benchmarks.routes --nodes 10 --actors 10000 --inboxes 100000 --output results.json
+    python -m benchmarks.routes --output current.json --compare results.json
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+
+PASSWORD = "benchmark-password"
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def load_app(data_path: str, backend: str):
+    os.environ.update({
+        "DATA_PATH": data_path,
+        "STORAGE_BACKEND": backend,
+        "JWT_SIGNING_KEY": os.getenv("JWT_SIGNING_KEY") or "benchmark-signing-key-" + "x" * 32,
+        "VERTEX_ENDPOINT": "localhost:5000",
+        "FEDERATION_PROTOCOL": "http",
+    })
+    return importlib.import_module("main")
+
+
+def seed(app_module, nodes: int, actors: int, inboxes: int):
+    """Seeds through the managers' tables directly so large datasets don't pay for bcrypt per actor.
+
+    Actor ``actor-0`` on ``node-0`` owns ``inbox-0`` and ``outbox-0``, which the scenarios read and update.
+    """
+    app_module.admin_manager.init("benchmark", PASSWORD)
+    for n in range(nodes):
+        app_module.node_manager.add(f"node-{n}", None, "benchmark")
+
+    password = app_module.password_hasher.hash(PASSWORD)
+    now = int(time.time())
+    app_module.actor_manager.db.insert_multiple([{
+        "node_identifier": f"node-{a % nodes}",
+        "identifier": f"actor-{a}",
+        "password": password,
+        "type": "person",
+        "display_name": f"Actor {a}",
+        "created_on": now,
+        "modified_on": now,
+    } for a in range(actors)])
+    app_module.inbox_manager.db.insert_multiple([{
+        "node_identifier": f"node-{i % nodes}",
+        "identifier": f"inbox-{i}",
+        "description": None,
+        "creator_address": f"{app_module.vertex_endpoint}/node-{i % nodes}/actor-{i % actors}",
+        "created_on": now,
+        "modified_on": now,
+    } for i in range(inboxes)])
+    app_module.outbox_manager.create("node-0", "outbox-0", None, f"{app_module.vertex_endpoint}/node-0/actor-0")
+
+
+def measure(name: str, request: Callable[[int], object], iterations: int, warmup: int,
+            setup: Callable[[int], object] | None = None) -> dict:
+    if setup is not None:
+        for i in range(-warmup, iterations):
+            setup(i)
+    for i in range(-warmup, 0):
+        request(i)
+    samples = []
+    errors = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        start = time.perf_counter()
+        response = request(i)
+        samples.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    result = {
+        "count": iterations,
+        "errors": errors,
+        "p50_ms": round(percentile(samples, 0.50), 3),
+        "p99_ms": round(percentile(samples, 0.99), 3),
+        "mean_ms": round(sum(samples) / len(samples), 3),
+        "throughput": round(iterations / elapsed, 1),
+    }
+    print("%-16s p50 %8.3fms  p99 %8.3fms  %9.1f req/s  %d errors" % (
+        name, result["p50_ms"], result["p99_ms"], result["throughput"], errors), file=sys.stderr)
+    return result
+
+
+def scenarios(client, setups: dict) -> dict[str, Callable[[int], object]]:
+    """Returns the timed request of every scenario; requests that consume fixtures register a setup in ``setups``."""
+    admin_credentials = {"username": "benchmark", "password": PASSWORD}
+    actor_credentials = {"identifier": "actor-0", "password": PASSWORD}
+    actor_token = client.post("/api/v1/nodes/node-0/actors/token", json=actor_credentials).get_json()["token"]
+    headers = {"Authorization": "Bearer " + actor_token}
+    base = "/api/v1/nodes/node-0"
+
+    def crud(kind: str) -> dict[str, Callable[[int], object]]:
+        name = kind[:-2]
+        url = f"{base}/messaging/{kind}"
+        setups[f"{name}_delete"] = lambda i: client.post(url, json={"identifier": f"bench-delete-{i}"},
+                                                         headers=headers)
+        return {
+            f"{name}_create": lambda i: client.post(url, json={"identifier": f"bench-{i}"}, headers=headers),
+            f"{name}_get": lambda i: client.get(f"{url}/{name}-0", headers=headers),
+            f"{name}_list": lambda i: client.get(url, headers=headers),
+            f"{name}_update": lambda i: client.put(f"{url}/{name}-0", json={"description": str(i)}, headers=headers),
+            f"{name}_delete": lambda i: client.delete(f"{url}/bench-delete-{i}", headers=headers),
+        }
+
+    return {
+        "admin_token": lambda i: client.post("/api/v1/admins/token", json=admin_credentials),
+        "actor_signup": lambda i: client.post(f"{base}/actors/signup", json={
+            "identifier": f"signup-{i}", "password": PASSWORD, "type": "person", "display_name": "Signup"}),
+        "actor_token": lambda i: client.post(f"{base}/actors/token", json=actor_credentials),
+        **crud("inboxes"),
+        **crud("outboxes"),
+        "nodes_list": lambda i: client.get("/api/v1/nodes"),
+    }
+
+
+def compare(results: dict, baseline: dict):
+    print("%-16s %22s %22s %26s" % ("scenario", "p50 ms", "p99 ms", "req/s"), file=sys.stderr)
+    for name, result in results["results"].items():
+        before = baseline["results"].get(name)
+        if before is None:
+            continue
+        print("%-16s %s %s %s" % (name, *(
+            "%9.3f -> %9.3f (%+6.1f%%)" % (before[key], result[key], (result[key] / before[key] - 1) * 100)
+            if before[key] else "%22s" % "n/a" for key in ("p50_ms", "p99_ms", "throughput"))), file=sys.stderr)
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--actors", type=int, default=1000)
+    parser.add_argument("--inboxes", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--backend", default=os.getenv("STORAGE_BACKEND", "tinydb"))
+    parser.add_argument("--only", help="comma separated scenarios to run")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="baseline JSON results to compare against")
+    args = parser.parse_args()
+    if args.nodes < 1 or args.actors < 1:
+        parser.error("at least one node and one actor are required")
+
+    data_path = tempfile.mkdtemp(prefix="vertex-benchmark-")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    app_module = load_app(data_path, args.backend)
+    started = time.perf_counter()
+    seed(app_module, args.nodes, args.actors, args.inboxes)
+    print("seeded %d nodes, %d actors, %d inboxes in %.1fs" % (
+        args.nodes, args.actors, args.inboxes, time.perf_counter() - started), file=sys.stderr)
+
+    client = app_module.app.test_client()
+    selected = set(args.only.split(",")) if args.only else None
+    setups = {}
+    results = {
+        "commit": commit(),
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "backend": args.backend,
+        "seed": {"nodes": args.nodes, "actors": args.actors, "inboxes": args.inboxes},
+        "iterations": args.iterations,
+        "results": {name: measure(name, request, args.iterations, args.warmup, setups.get(name))
+                    for name, request in scenarios(client, setups).items()
+                    if selected is None or name in selected},
+    }
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+    app_module.meta_db.close()
+
+
+if __name__ == "__main__":
+    main()
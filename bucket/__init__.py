@@ -0,0 +1,3 @@
+from .bucket_api import BucketApi
+from .bucket_manager import BucketManager
+from .object_store import ObjectStore
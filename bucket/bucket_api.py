@@ -0,0 +1,115 @@
+from flask import Flask, Response, request
+from werkzeug.datastructures import ContentRange
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.http import http_date
+from utils.api import *
+
+from .bucket_manager import BucketManager
+
+
+class BucketApi:
+    def __init__(self, app: Flask, manager: BucketManager):
+        self.app = app
+        self.manager = manager
+
+    def register(self):
+        @self.app.post("/api/v1/nodes/<node_identifier>/buckets")
+        @authenticate_actor
+        def create_bucket(actor, node_identifier):
+            return self.manager.create(
+                node_identifier,
+                required_param("identifier"),
+                optional_param("description"),
+                actor["address"]
+            )
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/buckets")
+        @authenticate_actor
+        def list_buckets(actor, node_identifier):
+            if streamed():
+                return stream_results(self.manager.iterate(node_identifier, actor["address"], cursor()))
+            return self.manager.list(node_identifier, actor["address"], cursor(), size())
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/buckets/<identifier>")
+        @authenticate_actor
+        def get_bucket(actor, node_identifier, identifier: str):
+            return self.manager.get(node_identifier, identifier, actor["address"])
+
+        @self.app.put("/api/v1/nodes/<node_identifier>/buckets/<identifier>")
+        @authenticate_actor
+        def update_bucket(actor, node_identifier, identifier):
+            return self.manager.update(node_identifier, identifier, optional_param("description"), actor["address"])
+
+        @self.app.delete("/api/v1/nodes/<node_identifier>/buckets/<identifier>")
+        @authenticate_actor
+        def delete_bucket(actor, node_identifier, identifier):
+            return self.manager.delete(node_identifier, identifier, actor["address"])
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/buckets/<identifier>/objects")
+        @authenticate_actor
+        def list_objects(actor, node_identifier, identifier):
+            return self.manager.list_objects(node_identifier, identifier, request.args.get("prefix", ""),
+                                             request.args.get("cursor"), size(), actor["address"])
+
+        @self.app.put("/api/v1/nodes/<node_identifier>/buckets/<identifier>/objects/<path:key>")
+        @authenticate_actor
+        def put_object(actor, node_identifier, identifier, key):
+            return self.manager.put_object(node_identifier, identifier, key, request.stream, request.content_length,
+                                           request.content_type, actor["address"])
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/buckets/<identifier>/objects/<path:key>")
+        @authenticate_actor
+        def get_object(actor, node_identifier, identifier, key):
+            return self.send(self.manager.get_object(node_identifier, identifier, key, actor["address"]))
+
+        @self.app.delete("/api/v1/nodes/<node_identifier>/buckets/<identifier>/objects/<path:key>")
+        @authenticate_actor
+        def delete_object(actor, node_identifier, identifier, key):
+            return self.manager.delete_object(node_identifier, identifier, key, actor["address"])
+
+    def send(self, stored: dict) -> Response:
+        """Responds with ``stored`` or the single byte range asked for.
+
+        A span that lies within one chunk file goes through the server's ``wsgi.file_wrapper``, which servers
+        such as gunicorn send with sendfile(2) up to the Content-Length; other spans are read in blocks.
+        """
+        length = stored["size"]
+        headers = {
+            "ETag": '"%s"' % stored["etag"],
+            "Accept-Ranges": "bytes",
+            "Last-Modified": http_date(stored["modified_on"]),
+        }
+        if request.if_none_match.contains_weak(stored["etag"]):
+            return Response(status=304, headers=headers)
+
+        status, start, stop = 200, 0, length
+        if request.range and self.range_applies(stored):
+            byte_range = request.range.range_for_length(length)
+            if byte_range is not None:
+                status, (start, stop) = 206, byte_range
+                headers["Content-Range"] = ContentRange("bytes", start, stop, length).to_header()
+            elif request.range.units == "bytes" and len(request.range.ranges) == 1:
+                raise RequestedRangeNotSatisfiable(length=length)
+
+        segments = self.manager.object_store.segments(stored, start, stop)
+        file_wrapper = request.environ.get("wsgi.file_wrapper")
+        if len(segments) == 1 and file_wrapper is not None:
+            path, offset, _ = segments[0]
+            file = open(path, "rb")
+            file.seek(offset)
+            body = file_wrapper(file)
+        else:
+            body = self.manager.object_store.read(segments)
+
+        response = Response(body, status, headers, content_type=stored["content_type"], direct_passthrough=True)
+        response.content_length = stop - start
+        return response
+
+    @staticmethod
+    def range_applies(stored: dict) -> bool:
+        if_range = request.if_range
+        if if_range.etag is not None:
+            return if_range.etag == stored["etag"]
+        if if_range.date is not None:
+            return int(if_range.date.timestamp()) == stored["modified_on"]
+        return True
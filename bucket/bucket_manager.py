@@ -0,0 +1,142 @@
+import time
+from typing import BinaryIO, Iterator
+
+from storage import Table
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from node import NodeManager
+from .object_store import ObjectStore
+
+
+class BucketManager:
+    def __init__(self, db: Table, node_manager: NodeManager, object_store: ObjectStore,
+                 max_object_size: int = 1024 * 1024 * 1024):
+        self.db = db
+        self.node_manager = node_manager
+        self.object_store = object_store
+        self.max_object_size = max_object_size
+
+    def create(self, node_identifier: str, identifier: str, description: str, creator_address: str) -> dict:
+        if not self.node_manager.identifier_exists(node_identifier):
+            raise Exception(f"Node {node_identifier} does not exist")
+        if self.identifier_exists(identifier, node_identifier):
+            raise Exception(f"Bucket {identifier} already exists on node {node_identifier}")
+
+        bucket_id = self.db.insert({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "description": description,
+            "creator_address": creator_address,
+            "created_on": int(time.time()),
+            "modified_on": int(time.time()),
+        })
+
+        return {
+            "id": bucket_id,
+            "identifier": identifier,
+        }
+
+    def put_object(self, node_identifier: str, identifier: str, key: str, stream: BinaryIO,
+                   content_length: int | None, content_type: str | None, actor_address: str) -> dict:
+        bucket = self.get_owned(node_identifier, identifier, actor_address)
+        if not key or len(key) > 1024:
+            raise Exception("Object key must be between 1 and 1024 characters long")
+        if content_length is not None and content_length > self.max_object_size:
+            raise RequestEntityTooLarge("Object is too large")
+        return self.object_store.put(bucket.doc_id, key, stream, content_type or "application/octet-stream",
+                                     self.max_object_size)
+
+    def get_object(self, node_identifier: str, identifier: str, key: str, actor_address: str) -> dict:
+        bucket = self.get_owned(node_identifier, identifier, actor_address)
+        stored = self.object_store.get(bucket.doc_id, key)
+        if not stored:
+            raise Exception(f"Object {key} does not exist in bucket {identifier}")
+        return stored
+
+    def list_objects(self, node_identifier: str, identifier: str, prefix: str, cursor: str | None, size: int,
+                     actor_address: str) -> dict:
+        bucket = self.get_owned(node_identifier, identifier, actor_address)
+        return self.object_store.list(bucket.doc_id, prefix, cursor, size)
+
+    def delete_object(self, node_identifier: str, identifier: str, key: str, actor_address: str) -> dict:
+        bucket = self.get_owned(node_identifier, identifier, actor_address)
+        if not self.object_store.delete(bucket.doc_id, key):
+            raise Exception(f"Object {key} does not exist in bucket {identifier}")
+        return {
+            "key": key,
+        }
+
+    def get_owned(self, node_identifier: str, identifier: str, actor_address: str):
+        bucket = self.db.get({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
+        if not bucket:
+            raise Exception(f"Bucket {identifier} does not exist on node {node_identifier}")
+        return bucket
+
+    def list(self, node_identifier: str, actor_address: str, cursor: int = None, size: int = 50) -> dict:
+        buckets = self.db.page({
+            "node_identifier": node_identifier,
+            "creator_address": actor_address,
+        }, cursor, size + 1)
+        return {
+            "results": [self.to_dict(bucket) for bucket in buckets[:size]],
+            "next": str(buckets[size - 1].doc_id) if len(buckets) > size else None,
+        }
+
+    def iterate(self, node_identifier: str, actor_address: str, cursor: int = None) -> Iterator[dict]:
+        for bucket in self.db.iterate({
+            "node_identifier": node_identifier,
+            "creator_address": actor_address,
+        }, cursor):
+            yield self.to_dict(bucket)
+
+    def get(self, node_identifier: str, identifier: str, actor_address: str) -> dict:
+        return self.to_dict(self.get_owned(node_identifier, identifier, actor_address))
+
+    def update(self, node_identifier: str, identifier: str, description: str, actor_address: str) -> dict:
+        results = self.db.update({
+            "description": description,
+            "modified_on": int(time.time()),
+        }, {
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
+
+        if len(results) == 0:
+            raise Exception(f"Bucket {identifier} does not exist on node {node_identifier}")
+
+        return {
+            "identifier": identifier,
+        }
+
+    def delete(self, node_identifier: str, identifier: str, actor_address) -> dict:
+        results = self.db.remove({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
+        if len(results) == 0:
+            raise Exception(f"Bucket {identifier} does not exist on node {node_identifier}")
+        for bucket_id in results:
+            self.object_store.delete_bucket(bucket_id)
+        return {
+            "identifier": identifier,
+        }
+
+    def identifier_exists(self, identifier: str, node_identifier: str) -> bool:
+        return self.db.contains({"node_identifier": node_identifier, "identifier": identifier})
+
+    @staticmethod
+    def to_dict(self):
+        return {
+            "node_identifier": self["node_identifier"],
+            "identifier": self["identifier"],
+            "description": self["description"],
+            "creator_address": self["creator_address"],
+            "created_on": self["created_on"],
+            "modified_on": self["modified_on"],
+        }
@@ -0,0 +1,234 @@
+import hashlib
+import os
+import tempfile
+import time
+from typing import BinaryIO, Iterator
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from storage.sqlite_storage import SqliteStorage
+from utils import fast_json
+
+READ_SIZE = 256 * 1024
+
+
+def prefix_bound(prefix: str) -> str | None:
+    """Returns the smallest string greater than every string starting with ``prefix``, if there is one."""
+    while prefix and ord(prefix[-1]) == 0x10FFFF:
+        prefix = prefix[:-1]
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix else None
+
+
+class ObjectStore:
+    """Stores object bodies as content-addressed chunks that are shared between objects.
+
+    Object metadata and chunk reference counts live in a SQLite index next to the chunks. An upload takes a
+    reference on each chunk before checking whether the chunk file exists, and a chunk file is only removed
+    inside the transaction that drops its last reference, so a chunk is never deleted from under an upload.
+    """
+
+    def __init__(self, root: str, chunk_size: int = 4 * 1024 * 1024):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.chunks_path = os.path.join(root, "chunks")
+        self.uploads_path = os.path.join(root, "uploads")
+        os.makedirs(self.chunks_path, exist_ok=True)
+        os.makedirs(self.uploads_path, exist_ok=True)
+        self.index = SqliteStorage(os.path.join(root, "index.db"))
+        with self.index.transaction() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS objects ("
+                               "bucket_id INTEGER NOT NULL, "
+                               "key TEXT NOT NULL, "
+                               "size INTEGER NOT NULL, "
+                               "content_type TEXT NOT NULL, "
+                               "etag TEXT NOT NULL, "
+                               "chunks TEXT NOT NULL, "
+                               "created_on INTEGER NOT NULL, "
+                               "modified_on INTEGER NOT NULL, "
+                               "PRIMARY KEY (bucket_id, key)) WITHOUT ROWID")
+            connection.execute("CREATE TABLE IF NOT EXISTS chunks ("
+                               "digest TEXT PRIMARY KEY, "
+                               "size INTEGER NOT NULL, "
+                               "refs INTEGER NOT NULL) WITHOUT ROWID")
+
+    def put(self, bucket_id: int, key: str, stream: BinaryIO, content_type: str, max_size: int) -> dict:
+        """Streams ``stream`` into chunks of at most ``chunk_size`` bytes and stores it as ``key``, replacing
+        any existing object; at most one chunk is held on disk outside the chunk store at a time."""
+        chunks = []
+        size = 0
+        try:
+            while True:
+                chunk = self.write_chunk(stream, max_size - size)
+                if chunk is None:
+                    break
+                chunks.append(chunk)
+                size += chunk[1]
+
+            etag = hashlib.sha256("".join(digest for digest, _ in chunks).encode("ascii")).hexdigest()
+            now = int(time.time())
+            with self.index.transaction() as connection:
+                replaced = connection.execute("SELECT chunks FROM objects WHERE bucket_id = ? AND key = ?",
+                                              (bucket_id, key)).fetchone()
+                connection.execute("INSERT INTO objects "
+                                   "(bucket_id, key, size, content_type, etag, chunks, created_on, modified_on) "
+                                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                                   "ON CONFLICT (bucket_id, key) DO UPDATE SET "
+                                   "size = excluded.size, content_type = excluded.content_type, "
+                                   "etag = excluded.etag, chunks = excluded.chunks, "
+                                   "modified_on = excluded.modified_on",
+                                   (bucket_id, key, size, content_type, etag, fast_json.dumps(chunks), now, now))
+                if replaced:
+                    self.unreference(connection, [digest for digest, _ in fast_json.loads(replaced[0])])
+        except BaseException:
+            self.release(chunks)
+            raise
+
+        return {
+            "key": key,
+            "size": size,
+            "etag": etag,
+        }
+
+    def write_chunk(self, stream: BinaryIO, remaining: int) -> tuple[str, int] | None:
+        digest = hashlib.sha256()
+        size = 0
+        descriptor, temporary = tempfile.mkstemp(dir=self.uploads_path)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                while size < self.chunk_size:
+                    data = stream.read(min(READ_SIZE, self.chunk_size - size))
+                    if not data:
+                        break
+                    size += len(data)
+                    if size > remaining:
+                        raise RequestEntityTooLarge("Object is too large")
+                    digest.update(data)
+                    file.write(data)
+                if size == 0:
+                    return None
+
+                chunk = (digest.hexdigest(), size)
+                self.pin(*chunk)
+                try:
+                    path = self.chunk_path(chunk[0])
+                    if not os.path.exists(path):
+                        file.flush()
+                        os.fsync(file.fileno())
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        os.replace(temporary, path)
+                except BaseException:
+                    self.release([chunk])
+                    raise
+                return chunk
+        finally:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+
+    def pin(self, digest: str, size: int):
+        with self.index.transaction() as connection:
+            connection.execute("INSERT INTO chunks (digest, size, refs) VALUES (?, ?, 1) "
+                               "ON CONFLICT (digest) DO UPDATE SET refs = refs + 1", (digest, size))
+
+    def release(self, chunks: list[tuple[str, int]]):
+        if chunks:
+            with self.index.transaction() as connection:
+                self.unreference(connection, [digest for digest, _ in chunks])
+
+    def unreference(self, connection, digests: list[str]):
+        for digest in digests:
+            connection.execute("UPDATE chunks SET refs = refs - 1 WHERE digest = ?", (digest,))
+        unused = [digest for digest in set(digests) if connection.execute(
+            "SELECT refs FROM chunks WHERE digest = ?", (digest,)).fetchone()[0] <= 0]
+        for digest in unused:
+            connection.execute("DELETE FROM chunks WHERE digest = ?", (digest,))
+        # Files go last so that only the commit itself can fail after a chunk file is gone.
+        for digest in unused:
+            try:
+                os.unlink(self.chunk_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def segments(self, stored: dict, start: int, stop: int) -> list[tuple[str, int, int]]:
+        """Returns the ``(path, offset, length)`` pieces of chunk files that hold bytes ``start:stop``."""
+        segments = []
+        position = 0
+        for digest, size in stored["chunks"]:
+            if position + size > start and position < stop:
+                offset = max(start - position, 0)
+                segments.append((self.chunk_path(digest), offset, min(stop - position, size) - offset))
+            position += size
+        return segments
+
+    @staticmethod
+    def read(segments: list[tuple[str, int, int]]) -> Iterator[bytes]:
+        for path, offset, length in segments:
+            with open(path, "rb") as file:
+                file.seek(offset)
+                while length > 0:
+                    data = file.read(min(length, READ_SIZE))
+                    if not data:
+                        raise Exception(f"Chunk {os.path.basename(path)} is truncated")
+                    length -= len(data)
+                    yield data
+
+    def get(self, bucket_id: int, key: str) -> dict | None:
+        row = self.index.connection().execute(
+            "SELECT key, size, content_type, etag, chunks, created_on, modified_on FROM objects "
+            "WHERE bucket_id = ? AND key = ?", (bucket_id, key)).fetchone()
+        return self.to_dict(row, True) if row else None
+
+    def list(self, bucket_id: int, prefix: str = "", cursor: str = None, size: int = 50) -> dict:
+        conditions = ["bucket_id = ?", "key >= ?"]
+        parameters = [bucket_id, max(prefix, cursor or "")]
+        if cursor:
+            conditions.append("key != ?")
+            parameters.append(cursor)
+        bound = prefix_bound(prefix)
+        if bound is not None:
+            conditions.append("key < ?")
+            parameters.append(bound)
+        rows = self.index.connection().execute(
+            "SELECT key, size, content_type, etag, chunks, created_on, modified_on FROM objects WHERE %s "
+            "ORDER BY key LIMIT ?" % " AND ".join(conditions), (*parameters, size + 1)).fetchall()
+        return {
+            "results": [self.to_dict(row) for row in rows[:size]],
+            "next": rows[size - 1][0] if len(rows) > size else None,
+        }
+
+    def delete(self, bucket_id: int, key: str) -> bool:
+        with self.index.transaction() as connection:
+            row = connection.execute("SELECT chunks FROM objects WHERE bucket_id = ? AND key = ?",
+                                     (bucket_id, key)).fetchone()
+            if not row:
+                return False
+            connection.execute("DELETE FROM objects WHERE bucket_id = ? AND key = ?", (bucket_id, key))
+            self.unreference(connection, [digest for digest, _ in fast_json.loads(row[0])])
+        return True
+
+    def delete_bucket(self, bucket_id: int):
+        with self.index.transaction() as connection:
+            digests = [digest
+                       for row in connection.execute("SELECT chunks FROM objects WHERE bucket_id = ?", (bucket_id,))
+                       for digest, _ in fast_json.loads(row[0])]
+            connection.execute("DELETE FROM objects WHERE bucket_id = ?", (bucket_id,))
+            self.unreference(connection, digests)
+
+    def chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunks_path, digest[:2], digest)
+
+    def close(self):
+        self.index.close()
+
+    @staticmethod
+    def to_dict(row: tuple, chunks: bool = False) -> dict:
+        stored = {
+            "key": row[0],
+            "size": row[1],
+            "content_type": row[2],
+            "etag": row[3],
+            "created_on": row[5],
+            "modified_on": row[6],
+        }
+        if chunks:
+            stored["chunks"] = fast_json.loads(row[4])
+        return stored
@@ -0,0 +1,4 @@
+from .bundle_api import BundleApi
+from .bundle_manager import BundleManager
+from .bundle_store import BundleStore
+from .bundle_cache import BundleCache
@@ -0,0 +1,70 @@
+from flask import Flask, request, send_from_directory
+from utils.api import *
+
+from .bundle_manager import BundleManager
+
+
+class BundleApi:
+    def __init__(self, app: Flask, manager: BundleManager):
+        self.app = app
+        self.manager = manager
+
+    def register(self):
+        @self.app.post("/api/v1/nodes/<node_identifier>/bundles")
+        @authenticate_actor
+        def create_bundle(actor, node_identifier):
+            return self.manager.create(
+                node_identifier,
+                required_param("identifier"),
+                optional_param("description"),
+                actor["address"]
+            )
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/bundles")
+        @authenticate_actor
+        def list_bundles(actor, node_identifier):
+            if streamed():
+                return stream_results(self.manager.iterate(node_identifier, actor["address"], cursor()))
+            return self.manager.list(node_identifier, actor["address"], cursor(), size())
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/bundles/<identifier>")
+        @authenticate_actor
+        def get_bundle(actor, node_identifier, identifier: str):
+            return self.manager.get(node_identifier, identifier, actor["address"])
+
+        @self.app.put("/api/v1/nodes/<node_identifier>/bundles/<identifier>")
+        @authenticate_actor
+        def update_bundle(actor, node_identifier, identifier):
+            return self.manager.update(node_identifier, identifier, optional_param("description"), actor["address"])
+
+        @self.app.delete("/api/v1/nodes/<node_identifier>/bundles/<identifier>")
+        @authenticate_actor
+        def delete_bundle(actor, node_identifier, identifier):
+            return self.manager.delete(node_identifier, identifier, actor["address"])
+
+        @self.app.post("/api/v1/nodes/<node_identifier>/bundles/<identifier>/chunks/missing")
+        @authenticate_actor
+        def find_missing_chunks(actor, node_identifier, identifier):
+            return self.manager.missing_chunks(node_identifier, identifier, required_param("digests", list),
+                                               actor["address"])
+
+        @self.app.put("/api/v1/nodes/<node_identifier>/bundles/<identifier>/chunks/<digest>")
+        @authenticate_actor
+        def put_chunk(actor, node_identifier, identifier, digest):
+            return self.manager.put_chunk(node_identifier, identifier, digest, request.stream, request.content_length,
+                                          actor["address"])
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/bundles/<identifier>/manifest")
+        @authenticate_actor
+        def get_manifest(actor, node_identifier, identifier):
+            return self.manager.get_manifest(node_identifier, identifier, actor["address"])
+
+        @self.app.put("/api/v1/nodes/<node_identifier>/bundles/<identifier>/manifest")
+        @authenticate_actor
+        def deploy_bundle(actor, node_identifier, identifier):
+            return self.manager.deploy(node_identifier, identifier, required_param("files", list), actor["address"])
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/bundles/<identifier>/files/<path:path>")
+        @authenticate_actor
+        def get_file(actor, node_identifier, identifier, path):
+            return send_from_directory(self.manager.activate(node_identifier, identifier, actor["address"]), path)
@@ -0,0 +1,121 @@
+import os
+import shutil
+import tempfile
+import threading
+from typing import Callable
+
+from utils.metrics import registry
+
+ACTIVATIONS = registry.counter("vertex_bundle_activations_total", "Bundle activations by whether they were unpacked",
+                               ("result",))
+COPY_SIZE = 1024 * 1024
+
+
+class BundleCache:
+    """Keeps deployed bundles unpacked on disk, one directory per manifest digest.
+
+    The first activation of a manifest writes its files out; later ones find the directory and only mark it
+    as recently used through its modification time. Directories are completed under a temporary name and
+    renamed into place, so workers sharing ``root`` never see a partial bundle, and evicted ones are renamed
+    away before they are removed. Once the unpacked bundles take more than ``max_size`` bytes, the least
+    recently activated are evicted.
+    """
+
+    def __init__(self, root: str, max_size: int = 1024 * 1024 * 1024):
+        self.root = root
+        self.max_size = max_size
+        self.sizes = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def activate(self, digest: str, files: Callable[[], list[list]], chunk_path: Callable[[str], str]) -> str:
+        """Returns the directory holding the manifest ``digest``, unpacking the ``[path, chunks, executable]``
+        entries ``files()`` returns if it is not there yet."""
+        path = os.path.join(self.root, digest)
+        if self.touch(path):
+            ACTIVATIONS.inc(("hit",))
+            return path
+        with self.lock:
+            lock = self.locks.setdefault(digest, threading.Lock())
+        try:
+            with lock:
+                if self.touch(path):
+                    ACTIVATIONS.inc(("hit",))
+                    return path
+                self.sizes[digest] = self.unpack(path, files(), chunk_path)
+                ACTIVATIONS.inc(("unpacked",))
+        finally:
+            with self.lock:
+                self.locks.pop(digest, None)
+        self.evict(digest)
+        return path
+
+    @staticmethod
+    def touch(path: str) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def unpack(self, path: str, files: list[list], chunk_path: Callable[[str], str]) -> int:
+        temporary = tempfile.mkdtemp(dir=self.root, prefix=".unpack-")
+        size = 0
+        try:
+            for name, chunks, executable in files:
+                target = os.path.join(temporary, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "wb") as output:
+                    for chunk in chunks:
+                        with open(chunk_path(chunk), "rb") as source:
+                            shutil.copyfileobj(source, output, COPY_SIZE)
+                    size += output.tell()
+                os.chmod(target, 0o555 if executable else 0o444)
+            try:
+                os.rename(temporary, path)
+            except OSError:
+                # Another worker unpacked the same bundle first.
+                if not os.path.isdir(path):
+                    raise
+        finally:
+            if os.path.exists(temporary):
+                shutil.rmtree(temporary, ignore_errors=True)
+        return size
+
+    def evict(self, keep: str):
+        entries = []
+        with os.scandir(self.root) as scan:
+            for entry in scan:
+                if not entry.name.startswith(".") and entry.is_dir(follow_symlinks=False):
+                    try:
+                        entries.append((entry.stat(follow_symlinks=False).st_mtime, entry.name))
+                    except FileNotFoundError:
+                        pass
+        total = sum(self.size(digest) for _, digest in entries)
+        for _, digest in sorted(entries):
+            if total <= self.max_size:
+                break
+            if digest == keep:
+                continue
+            total -= self.size(digest)
+            self.remove(digest)
+
+    def size(self, digest: str) -> int:
+        size = self.sizes.get(digest)
+        if size is None:
+            # Bundles unpacked by another worker are measured once.
+            size = sum(os.path.getsize(os.path.join(directory, name))
+                       for directory, _, names in os.walk(os.path.join(self.root, digest)) for name in names)
+            self.sizes[digest] = size
+        return size
+
+    def remove(self, digest: str):
+        self.sizes.pop(digest, None)
+        temporary = tempfile.mkdtemp(dir=self.root, prefix=".evict-")
+        try:
+            os.rename(os.path.join(self.root, digest), temporary)
+        except OSError:
+            # Another worker evicted it first.
+            pass
+        shutil.rmtree(temporary, ignore_errors=True)
@@ -0,0 +1,220 @@
+import re
+import time
+from typing import BinaryIO, Iterator
+
+from storage import Table
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from node import NodeManager
+from schema import schemas
+from .bundle_cache import BundleCache
+from .bundle_store import BundleStore
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+FILES_SCHEMA = schemas.get("bundle_files", 1, {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "required": ["path", "chunks"],
+        "properties": {
+            "path": {"type": "string", "minLength": 1, "maxLength": 1024},
+            "chunks": {"type": "array", "items": {"type": "string", "pattern": DIGEST_PATTERN.pattern}},
+            "executable": {"type": "boolean"},
+        },
+        "additionalProperties": False,
+    },
+}, "files")
+
+
+def normalize_files(files: list, max_files: int) -> list[list]:
+    """Validates a manifest and returns its ``[path, chunks, executable]`` entries sorted by path."""
+    FILES_SCHEMA.check(files)
+    if len(files) > max_files:
+        raise Exception(f"A bundle can have at most {max_files} files")
+    paths = set()
+    for file in files:
+        path = file["path"]
+        if path in paths:
+            raise Exception(f"File {path} is listed twice")
+        if "\\" in path or "\0" in path or any(part in ("", ".", "..") for part in path.split("/")):
+            raise Exception(f"Invalid file path {path}")
+        paths.add(path)
+    for path in paths:
+        parts = path.split("/")
+        for end in range(1, len(parts)):
+            if "/".join(parts[:end]) in paths:
+                raise Exception(f"File {'/'.join(parts[:end])} is also a directory")
+    return sorted([file["path"], file["chunks"], file.get("executable", False)] for file in files)
+
+
+class BundleManager:
+    def __init__(self, db: Table, node_manager: NodeManager, bundle_store: BundleStore, bundle_cache: BundleCache,
+                 max_size: int = 256 * 1024 * 1024, max_files: int = 10000):
+        self.db = db
+        self.node_manager = node_manager
+        self.bundle_store = bundle_store
+        self.bundle_cache = bundle_cache
+        self.max_size = max_size
+        self.max_files = max_files
+
+    def create(self, node_identifier: str, identifier: str, description: str, creator_address: str) -> dict:
+        if not self.node_manager.identifier_exists(node_identifier):
+            raise Exception(f"Node {node_identifier} does not exist")
+        if self.identifier_exists(identifier, node_identifier):
+            raise Exception(f"Bundle {identifier} already exists on node {node_identifier}")
+
+        bundle_id = self.db.insert({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "description": description,
+            "creator_address": creator_address,
+            "created_on": int(time.time()),
+            "modified_on": int(time.time()),
+        })
+
+        return {
+            "id": bundle_id,
+            "identifier": identifier,
+        }
+
+    def missing_chunks(self, node_identifier: str, identifier: str, digests: list, actor_address: str) -> dict:
+        self.get_owned(node_identifier, identifier, actor_address)
+        if not all(isinstance(digest, str) and DIGEST_PATTERN.match(digest) for digest in digests):
+            raise Exception("Chunk digests must be SHA-256 hex digests")
+        return {
+            "missing": self.bundle_store.missing(node_identifier, actor_address, digests),
+        }
+
+    def put_chunk(self, node_identifier: str, identifier: str, digest: str, stream: BinaryIO,
+                  content_length: int | None, actor_address: str) -> dict:
+        self.get_owned(node_identifier, identifier, actor_address)
+        if not DIGEST_PATTERN.match(digest):
+            raise Exception("Chunk digest must be a SHA-256 hex digest")
+        if content_length is not None and content_length > self.bundle_store.max_chunk_size:
+            raise RequestEntityTooLarge("Chunk is too large")
+        return self.bundle_store.put_chunk(node_identifier, actor_address, digest, stream)
+
+    def deploy(self, node_identifier: str, identifier: str, files: list, actor_address: str) -> dict:
+        bundle = self.get_owned(node_identifier, identifier, actor_address)
+        result = self.bundle_store.deploy(node_identifier, actor_address, bundle.doc_id,
+                                          normalize_files(files, self.max_files), self.max_size)
+        if result["changed"]:
+            self.bundle_store.collect()
+        return dict(result, identifier=identifier)
+
+    def get_manifest(self, node_identifier: str, identifier: str, actor_address: str) -> dict:
+        deployment = self.get_deployment(node_identifier, identifier, actor_address)
+        return {
+            "digest": deployment["digest"],
+            "files": [{
+                "path": path,
+                "chunks": chunks,
+                "executable": executable,
+            } for path, chunks, executable in deployment["files"]],
+        }
+
+    def activate(self, node_identifier: str, identifier: str, actor_address: str) -> str:
+        """Returns the directory the deployed bundle is unpacked in."""
+        bundle = self.get_owned(node_identifier, identifier, actor_address)
+        digest = self.bundle_store.deployed(bundle.doc_id)
+        if digest is None:
+            raise Exception(f"Bundle {identifier} has not been deployed")
+
+        def files() -> list[list]:
+            # Only read when the bundle has to be unpacked, which keeps activating a cached one cheap.
+            manifest = self.bundle_store.manifest(digest)
+            if manifest is None:
+                raise Exception(f"Bundle {identifier} was redeployed while activating it")
+            return manifest
+
+        return self.bundle_cache.activate(digest, files, self.bundle_store.chunk_path)
+
+    def get_deployment(self, node_identifier: str, identifier: str, actor_address: str) -> dict:
+        bundle = self.get_owned(node_identifier, identifier, actor_address)
+        deployment = self.bundle_store.get(bundle.doc_id)
+        if deployment is None:
+            raise Exception(f"Bundle {identifier} has not been deployed")
+        return deployment
+
+    def get_owned(self, node_identifier: str, identifier: str, actor_address: str):
+        bundle = self.db.get({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
+        if not bundle:
+            raise Exception(f"Bundle {identifier} does not exist on node {node_identifier}")
+        return bundle
+
+    def list(self, node_identifier: str, actor_address: str, cursor: int = None, size: int = 50) -> dict:
+        bundles = self.db.page({
+            "node_identifier": node_identifier,
+            "creator_address": actor_address,
+        }, cursor, size + 1)
+        return {
+            "results": [self.to_dict(bundle) for bundle in bundles[:size]],
+            "next": str(bundles[size - 1].doc_id) if len(bundles) > size else None,
+        }
+
+    def iterate(self, node_identifier: str, actor_address: str, cursor: int = None) -> Iterator[dict]:
+        for bundle in self.db.iterate({
+            "node_identifier": node_identifier,
+            "creator_address": actor_address,
+        }, cursor):
+            yield self.to_dict(bundle)
+
+    def get(self, node_identifier: str, identifier: str, actor_address: str) -> dict:
+        bundle = self.get_owned(node_identifier, identifier, actor_address)
+        deployment = self.bundle_store.get(bundle.doc_id)
+        return dict(self.to_dict(bundle), deployment={
+            "digest": deployment["digest"],
+            "size": deployment["size"],
+            "files": len(deployment["files"]),
+            "deployed_on": deployment["deployed_on"],
+        } if deployment else None)
+
+    def update(self, node_identifier: str, identifier: str, description: str, actor_address: str) -> dict:
+        results = self.db.update({
+            "description": description,
+            "modified_on": int(time.time()),
+        }, {
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
+
+        if len(results) == 0:
+            raise Exception(f"Bundle {identifier} does not exist on node {node_identifier}")
+
+        return {
+            "identifier": identifier,
+        }
+
+    def delete(self, node_identifier: str, identifier: str, actor_address) -> dict:
+        results = self.db.remove({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
+        if len(results) == 0:
+            raise Exception(f"Bundle {identifier} does not exist on node {node_identifier}")
+        for bundle_id in results:
+            self.bundle_store.delete_bundle(bundle_id)
+        self.bundle_store.collect()
+        return {
+            "identifier": identifier,
+        }
+
+    def identifier_exists(self, identifier: str, node_identifier: str) -> bool:
+        return self.db.contains({"node_identifier": node_identifier, "identifier": identifier})
+
+    @staticmethod
+    def to_dict(self):
+        return {
+            "node_identifier": self["node_identifier"],
+            "identifier": self["identifier"],
+            "description": self["description"],
+            "creator_address": self["creator_address"],
+            "created_on": self["created_on"],
+            "modified_on": self["modified_on"],
+        }
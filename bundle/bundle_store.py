@@ -0,0 +1,238 @@
+import hashlib
+import os
+import tempfile
+import time
+from typing import BinaryIO
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from storage.sqlite_storage import SqliteStorage
+from utils import fast_json
+
+READ_SIZE = 256 * 1024
+
+
+def manifest_digest(files: list[list]) -> str:
+    """Returns the digest naming a manifest of ``[path, chunks, executable]`` entries sorted by path."""
+    return hashlib.sha256(fast_json.dumps_bytes(files)).hexdigest()
+
+
+class BundleStore:
+    """Stores bundles as manifests of files over content-addressed chunks shared by every bundle.
+
+    A deployed bundle points at a manifest, which is stored once per distinct content and referenced by
+    every bundle deployed with it; a manifest in turn references its chunks. Chunks are uploaded before the
+    manifest that uses them, so a chunk nothing references yet is kept for ``grace`` seconds after it was
+    last uploaded or released before ``collect`` removes it. Deploying takes its references in the same
+    transaction that checks the chunks exist, and collecting only removes files inside the transaction that
+    deletes their rows, so a chunk is never removed from under a deploy.
+
+    Chunks are shared between tenants, but each owner has to upload a chunk before its manifests can use it,
+    which proves they hold its content; otherwise knowing a digest would be enough to read someone else's
+    file. ``missing`` and ``deploy`` treat chunks the owner has not uploaded as missing.
+    """
+
+    def __init__(self, root: str, max_chunk_size: int = 4 * 1024 * 1024, grace: float = 3600):
+        self.root = root
+        self.max_chunk_size = max_chunk_size
+        self.grace = grace
+        self.chunks_path = os.path.join(root, "chunks")
+        self.uploads_path = os.path.join(root, "uploads")
+        os.makedirs(self.chunks_path, exist_ok=True)
+        os.makedirs(self.uploads_path, exist_ok=True)
+        self.index = SqliteStorage(os.path.join(root, "index.db"))
+        with self.index.transaction() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS deployments ("
+                               "bundle_id INTEGER PRIMARY KEY, "
+                               "digest TEXT NOT NULL, "
+                               "deployed_on INTEGER NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS manifests ("
+                               "digest TEXT PRIMARY KEY, "
+                               "files TEXT NOT NULL, "
+                               "size INTEGER NOT NULL, "
+                               "refs INTEGER NOT NULL) WITHOUT ROWID")
+            connection.execute("CREATE TABLE IF NOT EXISTS chunks ("
+                               "digest TEXT PRIMARY KEY, "
+                               "size INTEGER NOT NULL, "
+                               "refs INTEGER NOT NULL, "
+                               "touched_on INTEGER NOT NULL) WITHOUT ROWID")
+            connection.execute("CREATE INDEX IF NOT EXISTS chunks_unreferenced ON chunks (touched_on) "
+                               "WHERE refs <= 0")
+            connection.execute("CREATE TABLE IF NOT EXISTS uploads ("
+                               "node_identifier TEXT NOT NULL, "
+                               "creator_address TEXT NOT NULL, "
+                               "digest TEXT NOT NULL, "
+                               "PRIMARY KEY (node_identifier, creator_address, digest)) WITHOUT ROWID")
+            connection.execute("CREATE INDEX IF NOT EXISTS uploads_digest ON uploads (digest)")
+
+    def missing(self, node_identifier: str, creator_address: str, digests: list[str]) -> list[str]:
+        """Returns the chunks of ``digests`` the owner has to upload, in order and without repeats."""
+        connection = self.index.connection()
+        return [digest for digest in dict.fromkeys(digests)
+                if not self.uploaded(connection, node_identifier, creator_address, digest)
+                or not os.path.exists(self.chunk_path(digest))]
+
+    @staticmethod
+    def uploaded(connection, node_identifier: str, creator_address: str, digest: str) -> bool:
+        return connection.execute("SELECT 1 FROM uploads JOIN chunks ON chunks.digest = uploads.digest "
+                                  "WHERE node_identifier = ? AND creator_address = ? AND uploads.digest = ?",
+                                  (node_identifier, creator_address, digest)).fetchone() is not None
+
+    def put_chunk(self, node_identifier: str, creator_address: str, digest: str, stream: BinaryIO) -> dict:
+        """Stores the chunk read from ``stream`` once its content matches ``digest``, and records that the
+        owner uploaded it."""
+        hasher = hashlib.sha256()
+        size = 0
+        descriptor, temporary = tempfile.mkstemp(dir=self.uploads_path)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                while True:
+                    data = stream.read(READ_SIZE)
+                    if not data:
+                        break
+                    size += len(data)
+                    if size > self.max_chunk_size:
+                        raise RequestEntityTooLarge("Chunk is too large")
+                    hasher.update(data)
+                    file.write(data)
+                if hasher.hexdigest() != digest:
+                    raise Exception(f"Chunk content does not match {digest}")
+                file.flush()
+                os.fsync(file.fileno())
+
+            with self.index.transaction() as connection:
+                # Touching the row first holds off collect, which could otherwise remove the file we keep.
+                connection.execute("INSERT INTO chunks (digest, size, refs, touched_on) VALUES (?, ?, 0, ?) "
+                                   "ON CONFLICT (digest) DO UPDATE SET touched_on = excluded.touched_on",
+                                   (digest, size, int(time.time())))
+                connection.execute("INSERT OR IGNORE INTO uploads (node_identifier, creator_address, digest) "
+                                   "VALUES (?, ?, ?)", (node_identifier, creator_address, digest))
+                path = self.chunk_path(digest)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+
+        return {
+            "digest": digest,
+            "size": size,
+        }
+
+    def deploy(self, node_identifier: str, creator_address: str, bundle_id: int, files: list[list],
+               max_size: int) -> dict:
+        """Points the bundle at the manifest of ``files``, sorted ``[path, chunks, executable]`` entries.
+
+        Nothing changes if any chunk is missing or was not uploaded by the owner; the result lists those
+        chunks instead.
+        """
+        digest = manifest_digest(files)
+        unique = list(dict.fromkeys(chunk for _, chunks, _ in files for chunk in chunks))
+        with self.index.transaction() as connection:
+            # Updating first starts the write transaction, so every check below sees what it will commit with.
+            shared = connection.execute("UPDATE manifests SET refs = refs + 1 WHERE digest = ?",
+                                        (digest,)).rowcount > 0
+            # An existing manifest is checked too, or deploying someone else's would skip the ownership check.
+            missing = [chunk for chunk in unique
+                       if not self.uploaded(connection, node_identifier, creator_address, chunk)]
+            if not shared and not missing:
+                sizes = {}
+                for chunk in unique:
+                    rows = connection.execute("UPDATE chunks SET refs = refs + 1 WHERE digest = ? RETURNING size",
+                                              (chunk,)).fetchall()
+                    if not rows or not os.path.exists(self.chunk_path(chunk)):
+                        missing.append(chunk)
+                    else:
+                        sizes[chunk] = rows[0][0]
+            if missing:
+                connection.rollback()
+                return {
+                    "digest": None,
+                    "changed": False,
+                    "missing": missing,
+                }
+            if not shared:
+                size = sum(sizes[chunk] for _, chunks, _ in files for chunk in chunks)
+                if size > max_size:
+                    raise RequestEntityTooLarge("Bundle is too large")
+                connection.execute("INSERT INTO manifests (digest, files, size, refs) VALUES (?, ?, ?, 1)",
+                                   (digest, fast_json.dumps(files), size))
+
+            replaced = connection.execute("SELECT digest FROM deployments WHERE bundle_id = ?",
+                                          (bundle_id,)).fetchone()
+            connection.execute("INSERT INTO deployments (bundle_id, digest, deployed_on) VALUES (?, ?, ?) "
+                               "ON CONFLICT (bundle_id) DO UPDATE SET "
+                               "digest = excluded.digest, deployed_on = excluded.deployed_on",
+                               (bundle_id, digest, int(time.time())))
+            if replaced:
+                self.unreference(connection, replaced[0])
+
+        return {
+            "digest": digest,
+            "changed": not replaced or replaced[0] != digest,
+            "missing": [],
+        }
+
+    def unreference(self, connection, digest: str):
+        rows = connection.execute("UPDATE manifests SET refs = refs - 1 WHERE digest = ? RETURNING refs, files",
+                                  (digest,)).fetchall()
+        if not rows or rows[0][0] > 0:
+            return
+        connection.execute("DELETE FROM manifests WHERE digest = ?", (digest,))
+        now = int(time.time())
+        for chunk in dict.fromkeys(chunk for _, chunks, _ in fast_json.loads(rows[0][1]) for chunk in chunks):
+            # Released chunks get the same grace as uploaded ones, so redeploying them soon uploads nothing.
+            connection.execute("UPDATE chunks SET refs = refs - 1, touched_on = ? WHERE digest = ?", (now, chunk))
+
+    def collect(self) -> int:
+        """Removes chunks that nothing has referenced for ``grace`` seconds and returns how many."""
+        with self.index.transaction() as connection:
+            digests = [row[0] for row in connection.execute(
+                "DELETE FROM chunks WHERE refs <= 0 AND touched_on <= ? RETURNING digest",
+                (int(time.time() - self.grace),)).fetchall()]
+            for digest in digests:
+                connection.execute("DELETE FROM uploads WHERE digest = ?", (digest,))
+            # Files go last so that only the commit itself can fail after a chunk file is gone.
+            for digest in digests:
+                try:
+                    os.unlink(self.chunk_path(digest))
+                except FileNotFoundError:
+                    pass
+        return len(digests)
+
+    def get(self, bundle_id: int) -> dict | None:
+        row = self.index.connection().execute(
+            "SELECT deployments.digest, deployed_on, files, size FROM deployments "
+            "JOIN manifests ON manifests.digest = deployments.digest WHERE bundle_id = ?", (bundle_id,)).fetchone()
+        if not row:
+            return None
+        return {
+            "digest": row[0],
+            "deployed_on": row[1],
+            "files": fast_json.loads(row[2]),
+            "size": row[3],
+        }
+
+    def deployed(self, bundle_id: int) -> str | None:
+        """Returns the digest of the manifest the bundle is deployed with, without reading the manifest."""
+        row = self.index.connection().execute("SELECT digest FROM deployments WHERE bundle_id = ?",
+                                              (bundle_id,)).fetchone()
+        return row[0] if row else None
+
+    def manifest(self, digest: str) -> list[list] | None:
+        row = self.index.connection().execute("SELECT files FROM manifests WHERE digest = ?", (digest,)).fetchone()
+        return fast_json.loads(row[0]) if row else None
+
+    def delete_bundle(self, bundle_id: int):
+        with self.index.transaction() as connection:
+            rows = connection.execute("DELETE FROM deployments WHERE bundle_id = ? RETURNING digest",
+                                      (bundle_id,)).fetchall()
+            if rows:
+                self.unreference(connection, rows[0][0])
+
+    def chunk_path(self, digest: str) -> str:
+        return os.path.join(self.chunks_path, digest[:2], digest)
+
+    def close(self):
+        self.index.close()
@@ -0,0 +1,4 @@
+from .collection_api import CollectionApi
+from .collection_manager import CollectionManager
+from .column_store import ColumnStore
+from .document_store import DocumentStore
@@ -0,0 +1,97 @@
+from flask import Flask
+from utils.api import *
+
+from .collection_manager import CollectionManager
+
+
+class CollectionApi:
+    def __init__(self, app: Flask, manager: CollectionManager, bulk_max_items: int = 50000):
+        self.app = app
+        self.manager = manager
+        self.bulk_max_items = bulk_max_items
+
+    def register(self):
+        @self.app.post("/api/v1/nodes/<node_identifier>/collections")
+        @authenticate_actor
+        def create_collection(actor, node_identifier):
+            return self.manager.create(
+                node_identifier,
+                required_param("identifier"),
+                optional_param("description"),
+                optional_param("indexes", dict),
+                optional_param("schema", dict),
+                actor["address"]
+            )
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/collections")
+        @authenticate_actor
+        def list_collections(actor, node_identifier):
+            if streamed():
+                return stream_results(self.manager.iterate(node_identifier, actor["address"], cursor()))
+            return self.manager.list(node_identifier, actor["address"], cursor(), size())
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/collections/<identifier>")
+        @authenticate_actor
+        def get_collection(actor, node_identifier, identifier):
+            return self.manager.get(node_identifier, identifier, actor["address"])
+
+        @self.app.put("/api/v1/nodes/<node_identifier>/collections/<identifier>")
+        @authenticate_actor
+        def update_collection(actor, node_identifier, identifier):
+            return self.manager.update(node_identifier, identifier, optional_param("description"),
+                                       optional_param("indexes", dict), optional_param("schema", dict),
+                                       actor["address"])
+
+        @self.app.delete("/api/v1/nodes/<node_identifier>/collections/<identifier>")
+        @authenticate_actor
+        def delete_collection(actor, node_identifier, identifier):
+            return self.manager.delete(node_identifier, identifier, actor["address"])
+
+        @self.app.post("/api/v1/nodes/<node_identifier>/collections/<identifier>/documents")
+        @authenticate_actor
+        def insert_documents(actor, node_identifier, identifier):
+            return self.manager.insert_documents(node_identifier, identifier,
+                                                 bulk_param("documents", self.bulk_max_items), actor["address"])
+
+        @self.app.post("/api/v1/nodes/<node_identifier>/collections/<identifier>/query")
+        @authenticate_actor
+        def query_documents(actor, node_identifier, identifier):
+            return self.manager.query(
+                node_identifier,
+                identifier,
+                optional_param("where", dict),
+                optional_param("fields", list),
+                optional_param("order_by"),
+                min(max(optional_param("limit", int) or 50, 1), 1000),
+                optional_param("cursor"),
+                actor["address"]
+            )
+
+        @self.app.post("/api/v1/nodes/<node_identifier>/collections/<identifier>/aggregate")
+        @authenticate_actor
+        def aggregate_documents(actor, node_identifier, identifier):
+            return self.manager.aggregate(
+                node_identifier,
+                identifier,
+                optional_param("where", dict),
+                optional_param("group_by", list),
+                optional_param("histogram", dict),
+                optional_param("aggregates", dict),
+                actor["address"]
+            )
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/collections/<identifier>/documents/<int:document_id>")
+        @authenticate_actor
+        def get_document(actor, node_identifier, identifier, document_id):
+            return self.manager.get_document(node_identifier, identifier, document_id, actor["address"])
+
+        @self.app.put("/api/v1/nodes/<node_identifier>/collections/<identifier>/documents/<int:document_id>")
+        @authenticate_actor
+        def replace_document(actor, node_identifier, identifier, document_id):
+            return self.manager.replace_document(node_identifier, identifier, document_id,
+                                                 required_param("document", dict), actor["address"])
+
+        @self.app.delete("/api/v1/nodes/<node_identifier>/collections/<identifier>/documents/<int:document_id>")
+        @authenticate_actor
+        def delete_document(actor, node_identifier, identifier, document_id):
+            return self.manager.delete_document(node_identifier, identifier, document_id, actor["address"])
@@ -0,0 +1,231 @@
+import time
+from typing import Iterator
+
+from storage import Table
+
+from node import NodeManager
+from schema import Validator, compile_schema, schemas
+from .column_store import ColumnStore, normalize_aggregation
+from .document_store import DocumentStore
+from .query_planner import FIELD_PATTERN, INDEX_TYPES, normalize, plan
+
+MAX_INDEXES = 16
+
+
+class CollectionManager:
+    def __init__(self, db: Table, node_manager: NodeManager, document_store: DocumentStore,
+                 column_store: ColumnStore):
+        self.db = db
+        self.node_manager = node_manager
+        self.document_store = document_store
+        self.column_store = column_store
+
+    def create(self, node_identifier: str, identifier: str, description: str, indexes: dict | None,
+               schema: dict | None, creator_address: str) -> dict:
+        if not self.node_manager.identifier_exists(node_identifier):
+            raise Exception(f"Node {node_identifier} does not exist")
+        if self.identifier_exists(identifier, node_identifier):
+            raise Exception(f"Collection {identifier} already exists on node {node_identifier}")
+        indexes = self.validate_indexes(indexes or {})
+        schema = self.validate_schema(schema)
+
+        collection_id = self.db.insert({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "description": description,
+            "indexes": indexes,
+            "schema": schema,
+            "schema_version": time.time_ns() if schema else None,
+            "creator_address": creator_address,
+            "created_on": int(time.time()),
+            "modified_on": int(time.time()),
+        })
+        for field in indexes:
+            self.document_store.create_index(collection_id, field)
+
+        return {
+            "id": collection_id,
+            "identifier": identifier,
+        }
+
+    def insert_documents(self, node_identifier: str, identifier: str, documents: list,
+                         actor_address: str) -> dict:
+        collection = self.get_owned(node_identifier, identifier, actor_address)
+        if not all(isinstance(document, dict) for document in documents):
+            raise Exception("Documents must be objects")
+        validator = self.validator(collection)
+        if validator is not None:
+            for position, error in enumerate(validator.validate_many(documents)):
+                if error is not None:
+                    raise Exception(f"Document {position} is invalid: {error}")
+        return {
+            "ids": self.document_store.insert(collection.doc_id, documents),
+        }
+
+    def query(self, node_identifier: str, identifier: str, where: dict | None, fields: list | None,
+              order_by: str | None, limit: int, cursor: str | None, actor_address: str) -> dict:
+        collection = self.get_owned(node_identifier, identifier, actor_address)
+        if fields is not None and not all(isinstance(field, str) and FIELD_PATTERN.match(field)
+                                          for field in fields):
+            raise Exception("fields must be a list of field names")
+        conditions = normalize(where or {})
+        query_plan = plan(conditions, collection["indexes"], order_by)
+        return self.document_store.query(collection.doc_id, query_plan, conditions, fields, limit, cursor)
+
+    def aggregate(self, node_identifier: str, identifier: str, where: dict | None, group_by: list | None,
+                  histogram: dict | None, aggregates: dict | None, actor_address: str) -> dict:
+        collection = self.get_owned(node_identifier, identifier, actor_address)
+        conditions = normalize(where or {})
+        group_by, histogram, aggregates = normalize_aggregation(conditions, group_by, histogram, aggregates)
+        return self.column_store.aggregate(collection.doc_id, conditions, group_by, histogram, aggregates)
+
+    def get_document(self, node_identifier: str, identifier: str, document_id: int, actor_address: str) -> dict:
+        collection = self.get_owned(node_identifier, identifier, actor_address)
+        document = self.document_store.get(collection.doc_id, document_id)
+        if document is None:
+            raise Exception(f"Document {document_id} does not exist in collection {identifier}")
+        return {
+            "id": document_id,
+            "document": document,
+        }
+
+    def replace_document(self, node_identifier: str, identifier: str, document_id: int, document: dict,
+                         actor_address: str) -> dict:
+        collection = self.get_owned(node_identifier, identifier, actor_address)
+        validator = self.validator(collection)
+        if validator is not None:
+            validator.check(document)
+        if not self.document_store.replace(collection.doc_id, document_id, document):
+            raise Exception(f"Document {document_id} does not exist in collection {identifier}")
+        return {
+            "id": document_id,
+        }
+
+    def delete_document(self, node_identifier: str, identifier: str, document_id: int,
+                        actor_address: str) -> dict:
+        collection = self.get_owned(node_identifier, identifier, actor_address)
+        if not self.document_store.delete(collection.doc_id, document_id):
+            raise Exception(f"Document {document_id} does not exist in collection {identifier}")
+        return {
+            "id": document_id,
+        }
+
+    def get_owned(self, node_identifier: str, identifier: str, actor_address: str):
+        collection = self.db.get({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
+        if not collection:
+            raise Exception(f"Collection {identifier} does not exist on node {node_identifier}")
+        return collection
+
+    def list(self, node_identifier: str, actor_address: str, cursor: int = None, size: int = 50) -> dict:
+        collections = self.db.page({
+            "node_identifier": node_identifier,
+            "creator_address": actor_address,
+        }, cursor, size + 1)
+        return {
+            "results": [self.to_dict(collection) for collection in collections[:size]],
+            "next": str(collections[size - 1].doc_id) if len(collections) > size else None,
+        }
+
+    def iterate(self, node_identifier: str, actor_address: str, cursor: int = None) -> Iterator[dict]:
+        for collection in self.db.iterate({
+            "node_identifier": node_identifier,
+            "creator_address": actor_address,
+        }, cursor):
+            yield self.to_dict(collection)
+
+    def get(self, node_identifier: str, identifier: str, actor_address: str) -> dict:
+        return self.to_dict(self.get_owned(node_identifier, identifier, actor_address))
+
+    def update(self, node_identifier: str, identifier: str, description: str | None, indexes: dict | None,
+               schema: dict | None, actor_address: str) -> dict:
+        collection = self.get_owned(node_identifier, identifier, actor_address)
+        fields = {
+            "modified_on": int(time.time()),
+        }
+        if description is not None:
+            fields["description"] = description
+        if schema is not None:
+            # Only documents written from now on are held to the new schema.
+            fields["schema"] = self.validate_schema(schema)
+            fields["schema_version"] = time.time_ns() if fields["schema"] else None
+        if indexes is not None:
+            fields["indexes"] = self.validate_indexes(indexes)
+            # New indexes are built before queries can plan with them; dropped ones go once no plan uses them.
+            for field in fields["indexes"]:
+                self.document_store.create_index(collection.doc_id, field)
+
+        self.db.update(fields, {
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
+        if indexes is not None:
+            for field in collection["indexes"]:
+                if field not in fields["indexes"]:
+                    self.document_store.drop_index(collection.doc_id, field)
+
+        return {
+            "identifier": identifier,
+        }
+
+    def delete(self, node_identifier: str, identifier: str, actor_address) -> dict:
+        collection = self.get_owned(node_identifier, identifier, actor_address)
+        self.db.remove({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
+        self.document_store.drop(collection.doc_id)
+        return {
+            "identifier": identifier,
+        }
+
+    def identifier_exists(self, identifier: str, node_identifier: str) -> bool:
+        return self.db.contains({"node_identifier": node_identifier, "identifier": identifier})
+
+    @staticmethod
+    def validator(collection) -> Validator | None:
+        # The version is the time the schema was set, so a collection recreated under a reused id never
+        # picks up its predecessor's validator.
+        if not collection.get("schema"):
+            return None
+        return schemas.get("collection_%d" % collection.doc_id, collection["schema_version"], collection["schema"],
+                           "Document", patterns=False)
+
+    @staticmethod
+    def validate_schema(schema: dict | None) -> dict | None:
+        """Returns ``schema`` once it compiles; an empty schema means documents are not validated."""
+        if not schema:
+            return None
+        # Actors write these schemas, so they get no regular expressions to backtrack on.
+        compile_schema("collection", 0, schema, patterns=False)
+        return schema
+
+    @staticmethod
+    def validate_indexes(indexes: dict) -> dict:
+        if len(indexes) > MAX_INDEXES:
+            raise Exception(f"A collection can have at most {MAX_INDEXES} indexes")
+        for field, index_type in indexes.items():
+            if not FIELD_PATTERN.match(field):
+                raise Exception(f"Invalid field name {field}")
+            if index_type not in INDEX_TYPES:
+                raise Exception(f"Index type must be one of {', '.join(INDEX_TYPES)}")
+        return indexes
+
+    @staticmethod
+    def to_dict(self):
+        return {
+            "node_identifier": self["node_identifier"],
+            "identifier": self["identifier"],
+            "description": self["description"],
+            "indexes": self["indexes"],
+            "schema": self.get("schema"),
+            "schema_version": self.get("schema_version"),
+            "creator_address": self["creator_address"],
+            "created_on": self["created_on"],
+            "modified_on": self["modified_on"],
+        }
@@ -0,0 +1,300 @@
+import math
+import threading
+from collections import OrderedDict
+from itertools import repeat
+
+import numpy as np
+
+from utils import fast_json
+from .document_store import DocumentStore
+from .query_planner import FIELD_PATTERN, RANGE_OPERATORS
+
+AGGREGATE_OPERATORS = ("$count", "$sum", "$avg", "$min", "$max")
+COMPARISONS = {"$gt": np.greater, "$gte": np.greater_equal, "$lt": np.less, "$lte": np.less_equal}
+MAX_GROUP_BY = 4
+MAX_GROUPS = 100000
+DENSE_GROUPS = 1 << 20
+MISSING = -1
+
+
+def reserve(array: np.ndarray, size: int) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.empty(max(size, 2 * len(array), 1024), array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def field_values(documents: list[dict], field: str) -> list:
+    """Returns each document's scalar value of ``field``, with None where it is missing or not a scalar."""
+    keys = field.split(".")
+    values = [document.get(keys[0]) for document in documents]
+    for key in keys[1:]:
+        values = [value.get(key) if isinstance(value, dict) else None for value in values]
+    return [None if isinstance(value, (dict, list)) else value for value in values]
+
+
+def sort_key(value) -> tuple:
+    if value is None:
+        return 2, ""
+    if isinstance(value, str):
+        return 1, value
+    return 0, value
+
+
+class Column:
+    """One field of a collection as two arrays in document order: ``numbers``, with NaN where the value is
+    not a number, and ``codes``, indexes into ``values`` with ``MISSING`` where the field is absent or null.
+
+    Only the first ``size`` entries are live. Appending writes past them, so arrays sliced to an earlier
+    size stay valid for readers while the column grows.
+    """
+
+    def __init__(self):
+        self.numbers = np.empty(0, np.float64)
+        self.codes = np.empty(0, np.int32)
+        self.values = []
+        self.lookup = {}
+        self.size = 0
+
+    def append(self, values: list):
+        size = self.size + len(values)
+        self.numbers = reserve(self.numbers, size)
+        self.codes = reserve(self.codes, size)
+        if str in set(map(type, values)):
+            self.numbers[self.size:size] = [math.nan if value is None or isinstance(value, str) else value
+                                            for value in values]
+        else:
+            # NumPy turns None into NaN itself, but would also parse numeric strings, hence the check above.
+            self.numbers[self.size:size] = np.array(values, np.float64)
+        for value in dict.fromkeys(values):
+            if value is not None and value not in self.lookup:
+                self.lookup[value] = len(self.values)
+                self.values.append(value)
+        self.codes[self.size:size] = np.fromiter(map(self.lookup.get, values, repeat(MISSING)), np.int32,
+                                                 len(values))
+        self.size = size
+
+    def code(self, value) -> int:
+        if value is None:
+            return MISSING
+        # A value no document has gets a code no row has.
+        return self.lookup.get(value, MISSING - 1)
+
+    def decode(self, code: int):
+        return None if code == MISSING else self.values[code]
+
+
+class Columns:
+    """The columns loaded for one collection, current as of ``generation`` and document ``last_id``."""
+
+    def __init__(self, generation: int, fields: set[str]):
+        self.generation = generation
+        self.fields = tuple(sorted(fields))
+        self.columns = {field: Column() for field in fields}
+        self.last_id = 0
+        self.size = 0
+
+    def append(self, rows: list[tuple[int, str]]):
+        if not rows:
+            return
+        documents = [fast_json.loads(document) for _, document in rows]
+        for field in self.fields:
+            self.columns[field].append(field_values(documents, field))
+        self.last_id = rows[-1][0]
+        self.size += len(rows)
+
+
+class LoadedCollection:
+    """A collection's columns, if loaded yet, and the lock that loading and updating them takes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.columns = None
+
+
+class ColumnStore:
+    """Keeps collections' fields as NumPy arrays for aggregations.
+
+    Columns are loaded on the first aggregation that needs them, then brought up to date before each one
+    by appending the documents inserted since. A replaced or deleted document changes the collection's
+    generation in the document store, which makes the next aggregation reload. At most
+    ``max_collections`` collections are kept, least recently aggregated first out. Loading and updating
+    only hold the collection's own lock, so aggregations on other collections go on meanwhile.
+    """
+
+    def __init__(self, document_store: DocumentStore, max_collections: int = 16):
+        self.document_store = document_store
+        self.max_collections = max_collections
+        self.loaded = OrderedDict()
+        self.lock = threading.Lock()
+
+    def snapshot(self, collection_id: int, fields: set[str]) -> tuple[int, dict[str, Column]]:
+        """Returns the collection's document count and a column per field, as of now."""
+        with self.lock:
+            loaded = self.loaded.get(collection_id)
+            if loaded is None:
+                loaded = LoadedCollection()
+                self.loaded[collection_id] = loaded
+            self.loaded.move_to_end(collection_id)
+            while len(self.loaded) > self.max_collections:
+                self.loaded.popitem(last=False)
+
+        with loaded.lock:
+            # The generation is read before the documents: a change in between makes the next call reload,
+            # where the other order could keep a stale copy for good.
+            generation = self.document_store.generation(collection_id)
+            columns = loaded.columns
+            if columns is None or columns.generation != generation or not fields.issubset(columns.fields):
+                columns = Columns(generation, fields.union(columns.fields if columns is not None else ()))
+                loaded.columns = columns
+            columns.append(self.document_store.scan(collection_id, columns.last_id))
+            return columns.size, {field: columns.columns[field] for field in fields}
+
+    def aggregate(self, collection_id: int, conditions: dict[str, dict], group_by: list[str],
+                  histogram: dict | None, aggregates: dict[str, dict]) -> dict:
+        fields = set(conditions) | set(group_by) | {field for operation in aggregates.values()
+                                                    for field in operation.values()}
+        if histogram is not None:
+            fields.add(histogram["field"])
+        size, columns = self.snapshot(collection_id, fields)
+        return aggregate(size, columns, conditions, group_by, histogram, aggregates)
+
+    def close(self):
+        with self.lock:
+            self.loaded.clear()
+
+
+def aggregate(size: int, columns: dict[str, Column], conditions: dict[str, dict], group_by: list[str],
+              histogram: dict | None, aggregates: dict[str, dict]) -> dict:
+    """Filters, groups and reduces ``size`` rows of ``columns`` with array operations."""
+    mask = np.ones(size, bool)
+    for field, condition in conditions.items():
+        column = columns[field]
+        for operator, value in condition.items():
+            if operator == "$eq":
+                mask &= column.codes[:size] == column.code(value)
+            elif operator == "$in":
+                mask &= np.isin(column.codes[:size], [column.code(item) for item in value])
+            else:
+                mask &= COMPARISONS[operator](column.numbers[:size], value)
+    if histogram is not None:
+        mask &= ~np.isnan(columns[histogram["field"]].numbers[:size])
+    rows = np.flatnonzero(mask)
+
+    # Every grouping dimension is a dense code per row: a value's dictionary code, or a bucket's offset
+    # from the first bucket.
+    dimensions = []
+    for field in group_by:
+        column = columns[field]
+        dimensions.append((field, column.codes[rows].astype(np.int64) - MISSING, len(column.values) + 1,
+                           lambda code, column=column: column.decode(code + MISSING)))
+    if histogram is not None and len(rows):
+        interval = histogram["interval"]
+        buckets = np.floor(columns[histogram["field"]].numbers[rows] / interval).astype(np.int64)
+        first_bucket = int(buckets.min())
+        dimensions.append((histogram["field"], buckets - first_bucket, int(buckets.max()) - first_bucket + 1,
+                           lambda code: (code + first_bucket) * interval))
+
+    if not dimensions:
+        count = 1
+        inverse = np.zeros(len(rows), np.int64)
+        counts = np.array([len(rows)])
+        group_codes = []
+    elif not len(rows):
+        count = 0
+        inverse = np.zeros(0, np.int64)
+        counts = np.zeros(0, np.int64)
+        group_codes = [np.zeros(0, np.int64) for _ in dimensions]
+    else:
+        shape = tuple(extent for _, _, extent, _ in dimensions)
+        if math.prod(shape) <= max(len(rows), DENSE_GROUPS):
+            # Small key spaces are counted directly, which avoids sorting the rows.
+            keys = np.ravel_multi_index([codes for _, codes, _, _ in dimensions], shape)
+            counts = np.bincount(keys, minlength=math.prod(shape))
+            present = np.flatnonzero(counts)
+            position = np.zeros(len(counts), np.int64)
+            position[present] = np.arange(len(present))
+            inverse = position[keys]
+            counts = counts[present]
+            group_codes = np.unravel_index(present, shape)
+        else:
+            unique, inverse = np.unique(np.column_stack([codes for _, codes, _, _ in dimensions]), axis=0,
+                                        return_inverse=True)
+            inverse = inverse.reshape(-1)
+            counts = np.bincount(inverse, minlength=len(unique))
+            group_codes = unique.T
+        count = len(counts)
+        if count > MAX_GROUPS:
+            raise Exception(f"Aggregation produced more than {MAX_GROUPS} groups")
+
+    groups = [{"key": {}, "count": rows_in_group} for rows_in_group in counts.tolist()]
+    for (field, _, _, decode), codes in zip(dimensions, group_codes):
+        for group, code in zip(groups, codes.tolist()):
+            group["key"][field] = decode(code)
+
+    for name, operation in aggregates.items():
+        (operator, field), = operation.items()
+        numbers = columns[field].numbers[rows]
+        present = ~np.isnan(numbers)
+        if operator in ("$min", "$max"):
+            values = np.full(count, np.nan)
+            # fmin and fmax skip NaN, so documents without a number leave the result alone.
+            (np.fmin if operator == "$min" else np.fmax).at(values, inverse, numbers)
+            results = [None if math.isnan(value) else value for value in values.tolist()]
+        else:
+            counts = np.bincount(inverse, weights=present, minlength=count)
+            if operator == "$count":
+                results = counts.astype(np.int64).tolist()
+            else:
+                sums = np.bincount(inverse, weights=np.where(present, numbers, 0), minlength=count)
+                if operator == "$sum":
+                    results = sums.tolist()
+                else:
+                    results = [total / present_count if present_count else None
+                               for total, present_count in zip(sums.tolist(), counts.tolist())]
+        for group, result in zip(groups, results):
+            group[name] = result
+
+    groups.sort(key=lambda group: [sort_key(group["key"][field]) for field, _, _, _ in dimensions])
+    return {
+        "groups": groups,
+        "rows": len(rows),
+    }
+
+
+def normalize_aggregation(conditions: dict[str, dict], group_by: list | None, histogram: dict | None,
+                          aggregates: dict | None) -> tuple[list[str], dict | None, dict[str, dict]]:
+    """Validates an aggregation request; ``conditions`` are expected to be normalized already."""
+    for field, condition in conditions.items():
+        for operator, value in condition.items():
+            if operator in RANGE_OPERATORS and isinstance(value, str):
+                raise Exception(f"{operator} on {field} takes a number in aggregations")
+
+    group_by = group_by or []
+    if len(group_by) > MAX_GROUP_BY or not all(isinstance(field, str) and FIELD_PATTERN.match(field)
+                                               for field in group_by):
+        raise Exception(f"group_by must be a list of at most {MAX_GROUP_BY} field names")
+    if histogram is not None:
+        field = histogram.get("field")
+        interval = histogram.get("interval")
+        if not isinstance(field, str) or not FIELD_PATTERN.match(field):
+            raise Exception("histogram field must be a field name")
+        if field in group_by:
+            raise Exception(f"{field} cannot be both grouped and bucketed")
+        if isinstance(interval, bool) or not isinstance(interval, (int, float)) or not interval > 0:
+            raise Exception("histogram interval must be a positive number")
+        histogram = {"field": field, "interval": interval}
+
+    aggregates = aggregates or {}
+    for name, operation in aggregates.items():
+        if name in ("key", "count"):
+            raise Exception(f"{name} cannot be used as an aggregate name")
+        if not isinstance(operation, dict) or len(operation) != 1:
+            raise Exception(f"Aggregate {name} must be a single operator")
+        (operator, field), = operation.items()
+        if operator not in AGGREGATE_OPERATORS:
+            raise Exception(f"Aggregate operator must be one of {', '.join(AGGREGATE_OPERATORS)}")
+        if not isinstance(field, str) or not FIELD_PATTERN.match(field):
+            raise Exception(f"Aggregate {name} must name a field")
+    return group_by, histogram, aggregates
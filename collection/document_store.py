@@ -0,0 +1,237 @@
+import base64
+import os
+import re
+import sqlite3
+
+from storage.sqlite_storage import SqliteStorage
+from utils import fast_json
+from .query_planner import QueryPlan, compile_conditions, field_path
+
+# Indexes used to be partial indexes on the documents table, one per collection and field.
+LEGACY_INDEX_PATTERN = re.compile(r"json_extract\(document, '\$\.([^']+)'\)\) WHERE collection_id = (\d+)$")
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(fast_json.dumps_bytes(values)).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        return fast_json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise Exception("Invalid cursor")
+
+
+def project(document: dict, fields: list[str]) -> dict:
+    projected = {}
+    for field in fields:
+        value = document
+        for key in field.split("."):
+            if not isinstance(value, dict) or key not in value:
+                break
+            value = value[key]
+        else:
+            target = projected
+            *parents, last = field.split(".")
+            for key in parents:
+                target = target.setdefault(key, {})
+            target[last] = value
+    return projected
+
+
+class DocumentStore:
+    """Keeps the documents of every collection in one SQLite table.
+
+    Declared indexes of every collection share the ``entries`` table, keyed by collection, field, the field's
+    value and the document id; documents without the field, or with null in it, have no entry. Writes only maintain the entries of their own collection's indexes, so the
+    cost of a write does not grow with the number of collections. Queries page through the entries of the
+    field their plan picked in ``(value, id)`` order, so a page costs a seek and ``limit`` row reads however
+    large the collection is.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.storage = SqliteStorage(path)
+        with self.storage.transaction() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS documents ("
+                               "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                               "collection_id INTEGER NOT NULL, "
+                               "document TEXT NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS documents_collection ON documents (collection_id)")
+            connection.execute("CREATE TABLE IF NOT EXISTS generations ("
+                               "collection_id INTEGER PRIMARY KEY, "
+                               "generation INTEGER NOT NULL)")
+            connection.execute("CREATE TABLE IF NOT EXISTS indexes ("
+                               "collection_id INTEGER NOT NULL, "
+                               "field TEXT NOT NULL, "
+                               "PRIMARY KEY (collection_id, field)) WITHOUT ROWID")
+            connection.execute("CREATE TABLE IF NOT EXISTS entries ("
+                               "collection_id INTEGER NOT NULL, "
+                               "field TEXT NOT NULL, "
+                               "value, "
+                               "document_id INTEGER NOT NULL, "
+                               "PRIMARY KEY (collection_id, field, value, document_id)) WITHOUT ROWID")
+            for name, sql in connection.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND "
+                                                "tbl_name = 'documents' AND name LIKE 'collection_%'").fetchall():
+                match = LEGACY_INDEX_PATTERN.search(sql)
+                if match:
+                    self.build_index(connection, int(match.group(2)), match.group(1))
+                connection.execute('DROP INDEX "%s"' % name)
+
+    def create_index(self, collection_id: int, field: str):
+        with self.storage.transaction() as connection:
+            self.build_index(connection, collection_id, field)
+
+    @staticmethod
+    def build_index(connection: sqlite3.Connection, collection_id: int, field: str):
+        if connection.execute("INSERT OR IGNORE INTO indexes (collection_id, field) VALUES (?, ?)",
+                              (collection_id, field)).rowcount == 0:
+            return
+        connection.execute("INSERT INTO entries (collection_id, field, value, document_id) "
+                           "SELECT collection_id, ?, json_extract(document, ?) AS value, id FROM documents "
+                           "WHERE collection_id = ? AND value IS NOT NULL", (field, field_path(field), collection_id))
+
+    def drop_index(self, collection_id: int, field: str):
+        with self.storage.transaction() as connection:
+            connection.execute("DELETE FROM indexes WHERE collection_id = ? AND field = ?", (collection_id, field))
+            connection.execute("DELETE FROM entries WHERE collection_id = ? AND field = ?", (collection_id, field))
+
+    def drop(self, collection_id: int):
+        with self.storage.transaction() as connection:
+            connection.execute("DELETE FROM indexes WHERE collection_id = ?", (collection_id,))
+            connection.execute("DELETE FROM entries WHERE collection_id = ?", (collection_id,))
+            connection.execute("DELETE FROM documents WHERE collection_id = ?", (collection_id,))
+            self.touch(connection, collection_id)
+
+    @staticmethod
+    def indexed_fields(connection: sqlite3.Connection, collection_id: int) -> list[str]:
+        return [row[0] for row in connection.execute("SELECT field FROM indexes WHERE collection_id = ?",
+                                                     (collection_id,)).fetchall()]
+
+    @staticmethod
+    def add_entries(connection: sqlite3.Connection, collection_id: int, fields: list[str], document_id: int,
+                    document: str):
+        for field in fields:
+            connection.execute("INSERT INTO entries (collection_id, field, value, document_id) "
+                               "SELECT ?, ?, value, ? FROM (SELECT json_extract(?, ?) AS value) "
+                               "WHERE value IS NOT NULL",
+                               (collection_id, field, document_id, document, field_path(field)))
+
+    @staticmethod
+    def remove_entries(connection: sqlite3.Connection, collection_id: int, fields: list[str], document_id: int,
+                       document: str):
+        for field in fields:
+            connection.execute("DELETE FROM entries WHERE collection_id = ? AND field = ? AND "
+                               "value = json_extract(?, ?) AND document_id = ?",
+                               (collection_id, field, document, field_path(field), document_id))
+
+    def insert(self, collection_id: int, documents: list[dict]) -> list[int]:
+        with self.storage.transaction() as connection:
+            fields = self.indexed_fields(connection, collection_id)
+            ids = []
+            for document in documents:
+                document = fast_json.dumps(document)
+                document_id = connection.execute("INSERT INTO documents (collection_id, document) VALUES (?, ?)",
+                                                 (collection_id, document)).lastrowid
+                self.add_entries(connection, collection_id, fields, document_id, document)
+                ids.append(document_id)
+            return ids
+
+    def get(self, collection_id: int, document_id: int) -> dict | None:
+        row = self.storage.connection().execute("SELECT document FROM documents WHERE id = ? AND collection_id = ?",
+                                                (document_id, collection_id)).fetchone()
+        return fast_json.loads(row[0]) if row else None
+
+    def replace(self, collection_id: int, document_id: int, document: dict) -> bool:
+        document = fast_json.dumps(document)
+        with self.storage.transaction() as connection:
+            # Reading the old document through a write starts the write transaction, so no other writer can
+            # replace it before its entries are removed.
+            rows = connection.execute("UPDATE documents SET document = document WHERE id = ? AND collection_id = ? "
+                                      "RETURNING document", (document_id, collection_id)).fetchall()
+            if not rows:
+                return False
+            connection.execute("UPDATE documents SET document = ? WHERE id = ?", (document, document_id))
+            fields = self.indexed_fields(connection, collection_id)
+            self.remove_entries(connection, collection_id, fields, document_id, rows[0][0])
+            self.add_entries(connection, collection_id, fields, document_id, document)
+            self.touch(connection, collection_id)
+            return True
+
+    def delete(self, collection_id: int, document_id: int) -> bool:
+        with self.storage.transaction() as connection:
+            rows = connection.execute("DELETE FROM documents WHERE id = ? AND collection_id = ? RETURNING document",
+                                      (document_id, collection_id)).fetchall()
+            if not rows:
+                return False
+            self.remove_entries(connection, collection_id, self.indexed_fields(connection, collection_id),
+                                document_id, rows[0][0])
+            self.touch(connection, collection_id)
+            return True
+
+    @staticmethod
+    def touch(connection: sqlite3.Connection, collection_id: int):
+        # Inserts only ever append ids, so readers that keep copies of documents only need to hear about
+        # changes to documents they may already have.
+        connection.execute("INSERT INTO generations (collection_id, generation) VALUES (?, 1) "
+                           "ON CONFLICT (collection_id) DO UPDATE SET generation = generation + 1", (collection_id,))
+
+    def generation(self, collection_id: int) -> int:
+        row = self.storage.connection().execute(
+            "SELECT generation FROM generations WHERE collection_id = ?", (collection_id,)).fetchone()
+        return row[0] if row else 0
+
+    def scan(self, collection_id: int, after_id: int = 0) -> list[tuple[int, str]]:
+        """Returns ``(id, document)`` for the collection's documents after ``after_id``, in id order."""
+        return self.storage.connection().execute(
+            "SELECT id, document FROM documents INDEXED BY documents_collection "
+            "WHERE collection_id = ? AND id > ? ORDER BY id", (collection_id, after_id)).fetchall()
+
+    def query(self, collection_id: int, query_plan: QueryPlan, conditions: dict[str, dict], fields: list | None,
+              limit: int, cursor: str | None) -> dict:
+        if query_plan.field is None:
+            clauses, parameters = compile_conditions(conditions)
+            clauses.insert(0, "collection_id = ?")
+            parameters.insert(0, collection_id)
+            source = "documents INDEXED BY documents_collection"
+            order = ("id",)
+        else:
+            clauses, parameters = compile_conditions(conditions, {query_plan.field: "entries.value"})
+            clauses[:0] = ["entries.collection_id = ?", "entries.field = ?"]
+            parameters[:0] = [collection_id, query_plan.field]
+            # CROSS JOIN keeps SQLite reading the entries in order and looking documents up by id.
+            source = "entries CROSS JOIN documents ON documents.id = entries.document_id"
+            if "$eq" in conditions.get(query_plan.field, {}):
+                # One value's entries are in id order; naming the value in ORDER BY makes SQLite sort.
+                order = ("entries.document_id",)
+            else:
+                order = ("entries.value", "entries.document_id")
+            if query_plan.field not in conditions:
+                # Ordering alone leaves out documents without the field, which have no place in the order.
+                clauses.append("entries.value IS NOT NULL")
+        if cursor is not None:
+            values = decode_cursor(cursor)
+            if not isinstance(values, list) or len(values) != len(order):
+                raise Exception("Invalid cursor")
+            clauses.append("(%s) > (%s)" % (", ".join(order), ", ".join("?" * len(order))))
+            parameters.extend(values)
+
+        rows = self.storage.connection().execute(
+            "SELECT %s, document FROM %s WHERE %s ORDER BY %s LIMIT ?" % (
+                ", ".join(order), source, " AND ".join(clauses), ", ".join(order)),
+            (*parameters, limit + 1)).fetchall()
+
+        results = []
+        for row in rows[:limit]:
+            document = fast_json.loads(row[-1])
+            if fields is not None:
+                document = project(document, fields)
+            results.append({"id": row[-2], "document": document})
+        return {
+            "results": results,
+            "next": encode_cursor(list(rows[limit - 1][:-1])) if len(rows) > limit else None,
+            "plan": query_plan.to_dict(),
+        }
+
+    def close(self):
+        self.storage.close()
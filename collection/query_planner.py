@@ -0,0 +1,122 @@
+import re
+
+FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+INDEX_TYPES = ("equality", "range")
+EQUALITY_OPERATORS = ("$eq", "$in")
+RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+SQL_OPERATORS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+MAX_IN_VALUES = 1000
+
+
+def field_path(field: str) -> str:
+    if not FIELD_PATTERN.match(field):
+        raise Exception(f"Invalid field name {field}")
+    return "$.%s" % field
+
+
+def field_expression(field: str) -> str:
+    return "json_extract(document, '%s')" % field_path(field)
+
+
+def is_scalar(value) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+
+def normalize(where: dict) -> dict[str, dict]:
+    """Validates ``where`` and rewrites bare values as ``$eq`` conditions."""
+    conditions = {}
+    for field, condition in where.items():
+        field_expression(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator == "$in":
+                if not isinstance(value, list) or not 0 < len(value) <= MAX_IN_VALUES or \
+                        not all(is_scalar(item) and item is not None for item in value):
+                    raise Exception(f"$in on {field} takes 1 to {MAX_IN_VALUES} non-null scalar values")
+            elif operator in RANGE_OPERATORS:
+                if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                    raise Exception(f"{operator} on {field} takes a number or a string")
+            elif operator == "$eq":
+                if not is_scalar(value):
+                    raise Exception(f"$eq on {field} takes a scalar value")
+            else:
+                raise Exception(f"Unknown operator {operator}")
+        conditions[field] = condition
+    return conditions
+
+
+def is_null(condition: dict) -> bool:
+    return "$eq" in condition and condition["$eq"] is None
+
+
+class QueryPlan:
+    """How a query reads a collection: through the index on ``field``, or by scanning in id order."""
+
+    def __init__(self, field: str | None, strategy: str):
+        self.field = field
+        self.strategy = strategy
+
+    def to_dict(self) -> dict:
+        return {
+            "index": self.field,
+            "strategy": self.strategy,
+        }
+
+
+def plan(conditions: dict[str, dict], indexes: dict[str, str], order_by: str | None = None) -> QueryPlan:
+    """Picks the index to read through for ``conditions`` given the collection's ``{field: index type}``.
+
+    Without statistics the planner prefers, in order: an equality condition on an indexed field, a range
+    condition bounded on both sides, a range condition bounded on one side, an index that provides
+    ``order_by``, and finally a scan. Indexes leave out nulls, so a field compared with null is never read
+    through its index.
+    """
+    candidates = []
+    for field, condition in conditions.items():
+        index_type = indexes.get(field)
+        if index_type is None or is_null(condition):
+            continue
+        if any(operator in condition for operator in EQUALITY_OPERATORS):
+            candidates.append((0, field, "equality"))
+        elif index_type == "range":
+            bounds = sum(1 for operator in condition if operator in RANGE_OPERATORS)
+            candidates.append((1 if bounds > 1 else 2, field, "range"))
+    if order_by is not None:
+        if indexes.get(order_by) != "range":
+            raise Exception("Results can only be ordered by a field with a range index")
+        if is_null(conditions.get(order_by, {})):
+            # Every result has the same null value, so id order is the order asked for.
+            return QueryPlan(None, "scan")
+        return QueryPlan(order_by, "equality" if any(
+            operator in conditions.get(order_by, {}) for operator in EQUALITY_OPERATORS) else "range")
+    if candidates:
+        _, field, strategy = min(candidates)
+        return QueryPlan(field, strategy)
+    return QueryPlan(None, "scan")
+
+
+def compile_conditions(conditions: dict[str, dict], expressions: dict[str, str] = None) -> tuple[list[str], list]:
+    """Translates ``conditions`` into SQL terms over ``document`` with their parameters; ``expressions``
+    replaces the extraction of some fields, such as the one read from an index.
+
+    SQLite orders every number before every string, so a numeric bound is paired with ``< ''`` and a string
+    bound with ``>= ''``; that keeps range conditions to values of the bound's type while leaving them
+    answerable from the index.
+    """
+    clauses = []
+    parameters = []
+    for field, condition in conditions.items():
+        expression = (expressions or {}).get(field) or field_expression(field)
+        for operator, value in condition.items():
+            if operator == "$eq":
+                clauses.append("%s IS ?" % expression)
+                parameters.append(value)
+            elif operator == "$in":
+                clauses.append("%s IN (%s)" % (expression, ", ".join("?" * len(value))))
+                parameters.extend(value)
+            else:
+                clauses.append("%s %s ?" % (expression, SQL_OPERATORS[operator]))
+                parameters.append(value)
+                clauses.append("%s %s ''" % (expression, ">=" if isinstance(value, str) else "<"))
+    return clauses, parameters
@@ -0,0 +1,3 @@
+from .function_api import FunctionApi
+from .function_manager import FunctionManager
+from .function_pool import FunctionPool
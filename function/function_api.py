@@ -0,0 +1,68 @@
+from flask import Flask
+from utils.api import *
+
+from .function_manager import FunctionManager
+
+
+class FunctionApi:
+    def __init__(self, app: Flask, manager: FunctionManager):
+        self.app = app
+        self.manager = manager
+
+    def register(self):
+        @self.app.post("/api/v1/nodes/<node_identifier>/functions")
+        @authenticate_admin
+        def create_function(admin, node_identifier):
+            return self.manager.create(
+                node_identifier,
+                required_param("identifier"),
+                optional_param("description"),
+                required_param("source"),
+                optional_param("handler"),
+                optional_param("timeout", (int, float)),
+                optional_param("memory_limit", int),
+                admin["username"]
+            )
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/functions")
+        @authenticate_admin
+        def list_functions(_, node_identifier):
+            if streamed():
+                return stream_results(self.manager.iterate(node_identifier, cursor()))
+            return self.manager.list(node_identifier, cursor(), size())
+
+        @self.app.get("/api/v1/functions/stats")
+        @authenticate_admin
+        def get_function_stats(_):
+            return self.manager.pool.stats()
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/functions/<identifier>")
+        @authenticate_admin
+        def get_function(_, node_identifier, identifier):
+            return self.manager.get(node_identifier, identifier)
+
+        @self.app.put("/api/v1/nodes/<node_identifier>/functions/<identifier>")
+        @authenticate_admin
+        def update_function(_, node_identifier, identifier):
+            return self.manager.update(
+                node_identifier,
+                identifier,
+                optional_param("description"),
+                optional_param("source"),
+                optional_param("handler"),
+                optional_param("timeout", (int, float)),
+                optional_param("memory_limit", int),
+            )
+
+        @self.app.delete("/api/v1/nodes/<node_identifier>/functions/<identifier>")
+        @authenticate_admin
+        def delete_function(_, node_identifier, identifier):
+            return self.manager.delete(node_identifier, identifier)
+
+        @self.app.post("/api/v1/nodes/<node_identifier>/functions/<identifier>/invoke")
+        @authenticate_actor
+        def invoke_function(actor, node_identifier, identifier):
+            if not check_node_is_home(actor, node_identifier):
+                raise Exception(f"Only actors of node {node_identifier} can invoke its functions")
+            return self.manager.invoke(node_identifier, identifier, optional_param("payload", object),
+                                       actor["address"])
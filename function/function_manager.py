@@ -0,0 +1,144 @@
+import time
+from typing import Iterator
+
+from storage import Table
+
+from node import NodeManager
+from .function_pool import FunctionPool
+
+
+class FunctionManager:
+    def __init__(self, db: Table, node_manager: NodeManager, pool: FunctionPool, max_timeout: float = 30,
+                 max_memory_limit: int = 512):
+        self.db = db
+        self.node_manager = node_manager
+        self.pool = pool
+        self.max_timeout = max_timeout
+        self.max_memory_limit = max_memory_limit
+
+    def create(self, node_identifier: str, identifier: str, description: str, source: str, handler: str | None,
+               timeout: float | None, memory_limit: int | None, creator: str) -> dict:
+        if not self.node_manager.identifier_exists(node_identifier):
+            raise Exception(f"Node {node_identifier} does not exist")
+        if self.identifier_exists(identifier, node_identifier):
+            raise Exception(f"Function {identifier} already exists on node {node_identifier}")
+
+        function_id = self.db.insert({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "description": description,
+            "source": self.validate_source(identifier, source),
+            "handler": handler or "handle",
+            "timeout": self.validate_timeout(timeout or min(10, self.max_timeout)),
+            "memory_limit": self.validate_memory_limit(memory_limit or min(128, self.max_memory_limit)),
+            "creator": creator,
+            "created_on": int(time.time()),
+            "modified_on": int(time.time()),
+            "modified_on_ns": time.time_ns(),
+        })
+
+        return {
+            "id": function_id,
+            "identifier": identifier,
+        }
+
+    def invoke(self, node_identifier: str, identifier: str, payload, caller_address: str) -> dict:
+        function = self.db.get({"node_identifier": node_identifier, "identifier": identifier})
+        if not function:
+            raise Exception(f"Function {identifier} does not exist on node {node_identifier}")
+
+        # Keyed by version so that an update is loaded fresh instead of reusing the old module.
+        return self.pool.invoke(node_identifier, "%d_%d" % (function.doc_id, function["modified_on_ns"]),
+                                function["source"], function["handler"], payload, {
+                                    "node_identifier": node_identifier,
+                                    "function_identifier": identifier,
+                                    "caller_address": caller_address,
+                                }, function["timeout"], function["memory_limit"] * 1024 * 1024)
+
+    def list(self, node_identifier: str, cursor: int = None, size: int = 50) -> dict:
+        functions = self.db.page({"node_identifier": node_identifier}, cursor, size + 1)
+        return {
+            "results": [self.to_dict(function) for function in functions[:size]],
+            "next": str(functions[size - 1].doc_id) if len(functions) > size else None,
+        }
+
+    def iterate(self, node_identifier: str, cursor: int = None) -> Iterator[dict]:
+        for function in self.db.iterate({"node_identifier": node_identifier}, cursor):
+            yield self.to_dict(function)
+
+    def get(self, node_identifier: str, identifier: str) -> dict:
+        function = self.db.get({"node_identifier": node_identifier, "identifier": identifier})
+        if not function:
+            raise Exception(f"Function {identifier} does not exist on node {node_identifier}")
+        return self.to_dict(function, True)
+
+    def update(self, node_identifier: str, identifier: str, description: str | None, source: str | None,
+               handler: str | None, timeout: float | None, memory_limit: int | None) -> dict:
+        fields = {
+            "modified_on": int(time.time()),
+            "modified_on_ns": time.time_ns(),
+        }
+        if description is not None:
+            fields["description"] = description
+        if source is not None:
+            fields["source"] = self.validate_source(identifier, source)
+        if handler is not None:
+            fields["handler"] = handler
+        if timeout is not None:
+            fields["timeout"] = self.validate_timeout(timeout)
+        if memory_limit is not None:
+            fields["memory_limit"] = self.validate_memory_limit(memory_limit)
+
+        results = self.db.update(fields, {"node_identifier": node_identifier, "identifier": identifier})
+        if len(results) == 0:
+            raise Exception(f"Function {identifier} does not exist on node {node_identifier}")
+
+        return {
+            "identifier": identifier,
+        }
+
+    def delete(self, node_identifier: str, identifier: str) -> dict:
+        results = self.db.remove({"node_identifier": node_identifier, "identifier": identifier})
+        if len(results) == 0:
+            raise Exception(f"Function {identifier} does not exist on node {node_identifier}")
+        return {
+            "identifier": identifier,
+        }
+
+    def identifier_exists(self, identifier: str, node_identifier: str) -> bool:
+        return self.db.contains({"node_identifier": node_identifier, "identifier": identifier})
+
+    @staticmethod
+    def validate_source(identifier: str, source: str) -> str:
+        try:
+            compile(source, "<function %s>" % identifier, "exec")
+        except SyntaxError as e:
+            raise Exception(f"Invalid source for function {identifier}: {e}")
+        return source
+
+    def validate_timeout(self, timeout: float) -> float:
+        if not 0 < timeout <= self.max_timeout:
+            raise Exception(f"timeout must be between 0 and {self.max_timeout} seconds")
+        return timeout
+
+    def validate_memory_limit(self, memory_limit: int) -> int:
+        if not 0 < memory_limit <= self.max_memory_limit:
+            raise Exception(f"memory_limit must be between 1 and {self.max_memory_limit} MiB")
+        return memory_limit
+
+    @staticmethod
+    def to_dict(self, source: bool = False):
+        function = {
+            "node_identifier": self["node_identifier"],
+            "identifier": self["identifier"],
+            "description": self["description"],
+            "handler": self["handler"],
+            "timeout": self["timeout"],
+            "memory_limit": self["memory_limit"],
+            "creator": self["creator"],
+            "created_on": self["created_on"],
+            "modified_on": self["modified_on"],
+        }
+        if source:
+            function["source"] = self["source"]
+        return function
@@ -0,0 +1,308 @@
+import hashlib
+import importlib
+import json
+import os
+import signal
+import socket
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.connection import Connection
+
+from werkzeug.exceptions import GatewayTimeout, ServiceUnavailable, TooManyRequests
+
+from storage.file_lock import FileSlots
+from utils.metrics import registry
+from .function_worker import FORK_REPLY, FORK_REQUEST, zygote
+
+START_SECONDS = registry.histogram("vertex_function_start_seconds",
+                                   "Time from dispatching an invocation until its handler starts", ("start",))
+RUN_SECONDS = registry.histogram("vertex_function_run_seconds", "Time spent in function handlers", ("status",))
+
+
+class Zygote:
+    """Child process forked once from the app that forks function workers on request.
+
+    Workers start with everything the app had imported, without forking a process that is running request
+    threads, and without re-importing the main module as the spawn and forkserver start methods do. The
+    zygote replaces its own forking process if that dies, so the app never has to fork another.
+    """
+
+    def __init__(self, timeout: float = 10):
+        self.control, child = socket.socketpair()
+        # A forking process that dies with a request drops it; the next one answers the requests after it.
+        self.control.settimeout(timeout)
+        self.pid = os.fork()
+        if self.pid == 0:
+            try:
+                self.control.close()
+                zygote(child)
+            finally:
+                os._exit(0)
+        child.close()
+
+    def fork(self, max_loaded: int) -> tuple[Connection, int]:
+        self.control.sendall(FORK_REQUEST.pack(max_loaded))
+        reply, descriptors, _, _ = socket.recv_fds(self.control, FORK_REPLY.size, 1)
+        if len(reply) < FORK_REPLY.size or not descriptors:
+            raise ConnectionError("Function zygote exited")
+        return Connection(descriptors[0]), FORK_REPLY.unpack(reply)[0]
+
+    def close(self):
+        self.control.close()
+        try:
+            os.waitpid(self.pid, 0)
+        except ChildProcessError:
+            pass
+
+
+class Worker:
+    def __init__(self, connection: Connection, pid: int, max_loaded: int):
+        self.connection = connection
+        self.pid = pid
+        self.loaded = OrderedDict()
+        self.max_loaded = max_loaded
+        self.invocations = 0
+
+    def load(self, key: str) -> bool:
+        """Records that ``key`` is loaded after this invocation, mirroring the worker's own eviction; returns
+        whether it was loaded already."""
+        warm = key in self.loaded
+        self.loaded[key] = None
+        self.loaded.move_to_end(key)
+        while len(self.loaded) > self.max_loaded:
+            self.loaded.popitem(last=False)
+        return warm
+
+    def kill(self):
+        self.connection.close()
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+class FunctionPool:
+    """Runs function invocations in a pool of forked worker processes that stay up between invocations.
+
+    Workers are forked through a :class:`Zygote` after ``preload`` has been imported, and ``workers`` of them
+    are started ahead of the first invocation. An invocation goes to an idle worker that already has the function loaded
+    when there is one, then to the least recently used idle worker, and only then to a newly started worker.
+    Workers that time out, run out of memory, crash or reach ``max_invocations`` are replaced in the
+    background.
+
+    Every app process has a pool of its own. With ``slots_path`` the ``max_workers`` and ``max_per_node``
+    limits on running invocations hold across all the processes sharing that directory rather than per pool.
+    """
+
+    def __init__(self, workers: int = 2, max_workers: int = 8, max_per_node: int = 4, max_loaded: int = 64,
+                 max_invocations: int = 1000, queue_timeout: float = 5, preload: tuple[str, ...] = (),
+                 slots_path: str | None = None):
+        self.workers = workers
+        self.max_workers = max(max_workers, workers)
+        self.max_per_node = max_per_node
+        self.worker_slots = FileSlots(os.path.join(slots_path, "workers"), self.max_workers) if slots_path else None
+        self.node_slots = FileSlots(os.path.join(slots_path, "nodes"), max_per_node) if slots_path else None
+        self.max_loaded = max_loaded
+        self.max_invocations = max_invocations
+        self.queue_timeout = queue_timeout
+        for module in preload:
+            importlib.import_module(module)
+        self.zygote = None
+        self.zygote_lock = threading.Lock()
+        self.condition = threading.Condition()
+        self.idle = []
+        self.size = 0
+        self.running = {}
+        self.starts = {}
+        self.pid = None
+
+    def start(self):
+        """Starts the zygote and the first workers. Call it before the process starts any threads; nothing
+        forks the zygote later, from a process that is serving requests."""
+        with self.condition:
+            self.check_pid()
+        with self.zygote_lock:
+            if self.zygote is None:
+                self.zygote = Zygote()
+        self.replenish()
+
+    def invoke(self, node_identifier: str, key: str, source: str, handler: str, payload, context: dict,
+               timeout: float, memory_limit: int) -> dict:
+        dispatched_on = time.perf_counter()
+        slots = self.hold(node_identifier)
+        try:
+            worker = self.acquire(node_identifier, key)
+            try:
+                warm = worker.load(key)
+                worker.invocations += 1
+                try:
+                    worker.connection.send((key, source, handler, payload, context, memory_limit))
+                    if not worker.connection.poll(timeout):
+                        raise GatewayTimeout(f"Function did not finish within {timeout} seconds")
+                    status, value, load_seconds, run_seconds = worker.connection.recv()
+                except BaseException as e:
+                    worker.kill()
+                    worker = None
+                    if isinstance(e, (EOFError, OSError)):
+                        raise Exception("Function worker exited unexpectedly") from e
+                    raise
+                if status == "memory":
+                    worker.kill()
+                    worker = None
+            finally:
+                self.release(node_identifier, worker)
+        finally:
+            for slot in slots:
+                FileSlots.release(slot)
+
+        start = "warm" if warm else "cold"
+        start_seconds = time.perf_counter() - dispatched_on - run_seconds
+        START_SECONDS.observe((start,), start_seconds)
+        RUN_SECONDS.observe((status,), run_seconds)
+        self.record(start, start_seconds)
+        if status != "ok":
+            raise Exception(value)
+        return {
+            "result": json.loads(value),
+            "start": start,
+            "start_ms": start_seconds * 1000,
+            "load_ms": load_seconds * 1000,
+            "run_ms": run_seconds * 1000,
+        }
+
+    def hold(self, node_identifier: str) -> list[int]:
+        """Takes one of the node's slots and a worker slot shared with the pools of other processes."""
+        if self.worker_slots is None:
+            return []
+        node_slot = self.node_slots.acquire("node-" + hashlib.blake2b(node_identifier.encode("utf-8"),
+                                                                      digest_size=16).hexdigest())
+        if node_slot is None:
+            raise TooManyRequests(f"Too many functions running on node {node_identifier}")
+        deadline = time.monotonic() + self.queue_timeout
+        while (worker_slot := self.worker_slots.acquire("worker")) is None:
+            if time.monotonic() >= deadline:
+                FileSlots.release(node_slot)
+                raise ServiceUnavailable("All function workers are busy, retry later", retry_after=1)
+            time.sleep(0.01)
+        return [node_slot, worker_slot]
+
+    def acquire(self, node_identifier: str, key: str) -> Worker:
+        with self.condition:
+            self.check_pid()
+            if self.running.get(node_identifier, 0) >= self.max_per_node:
+                raise TooManyRequests(f"Too many functions running on node {node_identifier}")
+            self.running[node_identifier] = self.running.get(node_identifier, 0) + 1
+            try:
+                if not self.condition.wait_for(lambda: self.idle or self.size < self.max_workers,
+                                               self.queue_timeout):
+                    raise ServiceUnavailable("All function workers are busy, retry later", retry_after=1)
+                if self.idle:
+                    return self.take(key)
+                self.size += 1
+            except BaseException:
+                self.finish(node_identifier)
+                raise
+
+        try:
+            return self.spawn()
+        except BaseException:
+            with self.condition:
+                self.size -= 1
+                self.finish(node_identifier)
+                self.condition.notify()
+            raise
+
+    def take(self, key: str) -> Worker:
+        # Idle workers are kept least recently used first.
+        for position in range(len(self.idle) - 1, -1, -1):
+            if key in self.idle[position].loaded:
+                return self.idle.pop(position)
+        return self.idle.pop(0)
+
+    def release(self, node_identifier: str, worker: Worker | None):
+        if worker is not None and worker.invocations >= self.max_invocations:
+            worker.kill()
+            worker = None
+        with self.condition:
+            self.finish(node_identifier)
+            if worker is None:
+                self.size -= 1
+            else:
+                self.idle.append(worker)
+            self.condition.notify()
+        if worker is None:
+            threading.Thread(target=self.replenish, daemon=True).start()
+
+    def finish(self, node_identifier: str):
+        if self.running[node_identifier] == 1:
+            del self.running[node_identifier]
+        else:
+            self.running[node_identifier] -= 1
+
+    def replenish(self):
+        while True:
+            with self.condition:
+                if self.size >= self.workers:
+                    return
+                self.size += 1
+            try:
+                worker = self.spawn()
+            except BaseException:
+                with self.condition:
+                    self.size -= 1
+                raise
+            with self.condition:
+                self.idle.insert(0, worker)
+                self.condition.notify()
+
+    def spawn(self) -> Worker:
+        with self.zygote_lock:
+            if self.zygote is None:
+                raise ServiceUnavailable("Function workers are not started", retry_after=1)
+            for attempt in range(2):
+                try:
+                    return Worker(*self.zygote.fork(self.max_loaded), self.max_loaded)
+                except OSError:
+                    if attempt:
+                        raise ServiceUnavailable("Function workers cannot be started, retry later", retry_after=1)
+
+    def check_pid(self):
+        # Workers and their pipes belong to the process that started them; a forked child starts its own.
+        if self.pid != os.getpid():
+            self.idle = []
+            self.size = 0
+            self.running = {}
+            self.zygote = None
+            self.pid = os.getpid()
+
+    def record(self, start: str, duration: float):
+        with self.condition:
+            count, total, maximum = self.starts.get(start, (0, 0.0, 0.0))
+            self.starts[start] = (count + 1, total + duration, max(maximum, duration))
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {
+                "workers": self.size,
+                "idle": len(self.idle),
+                "running": dict(self.running),
+                "starts": {
+                    start: {
+                        "count": count,
+                        "average_ms": total / count * 1000,
+                        "max_ms": maximum * 1000,
+                    } for start, (count, total, maximum) in self.starts.items()
+                }
+            }
+
+    def close(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.size -= len(idle)
+        for worker in idle:
+            worker.kill()
+        with self.zygote_lock:
+            if self.zygote is not None and self.pid == os.getpid():
+                self.zygote.close()
+            self.zygote = None
@@ -0,0 +1,113 @@
+import json
+import os
+import resource
+import signal
+import socket
+import struct
+import time
+from collections import OrderedDict
+from multiprocessing.connection import Connection
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+FORK_REQUEST = struct.Struct(">I")
+FORK_REPLY = struct.Struct(">I")
+
+
+def address_space() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[0]) * PAGE_SIZE
+
+
+def zygote(control: socket.socket):
+    """Keeps a :func:`forker` serving ``control`` until it is closed, starting another whenever one dies.
+
+    The app never forks a replacement itself, since by then it is running request threads; this process has
+    none, so it can.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        started_on = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                forker(control)
+                code = 0
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        if os.waitstatus_to_exitcode(status) == 0:
+            return
+        # Do not spin on a forker that dies straight away.
+        time.sleep(max(0.0, 1 - (time.monotonic() - started_on)))
+
+
+def forker(control: socket.socket):
+    """Forks a worker for every request read from ``control`` and sends back its pid and its end of a
+    socket pair. Runs until ``control`` is closed, without threads, so the forks are safe."""
+    # Workers are reaped by the kernel; the pool notices a dead worker from its closed socket.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    while True:
+        request = control.recv(FORK_REQUEST.size)
+        if len(request) < FORK_REQUEST.size:
+            return
+        max_loaded, = FORK_REQUEST.unpack(request)
+        ours, theirs = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                control.close()
+                ours.close()
+                signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                serve(Connection(theirs.detach()), max_loaded)
+            finally:
+                os._exit(0)
+        theirs.close()
+        socket.send_fds(control, [FORK_REPLY.pack(pid)], [ours.fileno()])
+        ours.close()
+
+
+def serve(connection: Connection, max_loaded: int):
+    """Runs invocations sent over ``connection`` until it closes.
+
+    Each request is ``(key, source, handler, payload, context, memory_limit)``. Modules are kept by ``key``
+    so later invocations of the same function version skip compiling it. The reply is ``(status, value,
+    load_seconds, run_seconds)``; after a ``memory`` reply the worker exits, since an interrupted allocation
+    may have left the interpreter in a state that should not serve further requests.
+    """
+    modules = OrderedDict()
+    _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+    while True:
+        try:
+            key, source, handler, payload, context, memory_limit = connection.recv()
+        except EOFError:
+            return
+
+        started_on = time.perf_counter()
+        loaded_on = started_on
+        try:
+            namespace = modules.get(key)
+            if namespace is None:
+                namespace = {"__name__": "function_%s" % key}
+                exec(compile(source, "<function %s>" % key, "exec"), namespace)
+                modules[key] = namespace
+                while len(modules) > max_loaded:
+                    modules.popitem(last=False)
+            else:
+                modules.move_to_end(key)
+            loaded_on = time.perf_counter()
+
+            resource.setrlimit(resource.RLIMIT_AS, (address_space() + memory_limit, hard_limit))
+            try:
+                result = namespace[handler](payload, context)
+            finally:
+                resource.setrlimit(resource.RLIMIT_AS, (hard_limit, hard_limit))
+            reply = ("ok", json.dumps(result), loaded_on - started_on, time.perf_counter() - loaded_on)
+        except MemoryError:
+            connection.send(("memory", "Function exceeded its memory limit", loaded_on - started_on,
+                             time.perf_counter() - loaded_on))
+            return
+        except BaseException as e:
+            reply = ("error", "%s: %s" % (type(e).__name__, e), loaded_on - started_on,
+                     time.perf_counter() - loaded_on)
+        connection.send(reply)
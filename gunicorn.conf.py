@@ -0,0 +1,37 @@
+import glob
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = "%s:%s" % (os.getenv("HOST", "0.0.0.0"), os.getenv("PORT", "5000"))
+workers = int(os.getenv("WORKERS", "0")) or multiprocessing.cpu_count()
+# Inbox streams hold a thread for as long as the client stays connected. INBOX_MAX_READERS caps them per
+# worker, by default at two fewer than this, and further readers get 503.
+threads = int(os.getenv("THREADS", "8"))
+
+# A commit window buffers TinyDB writes in one process, which claims the file for itself.
+if os.getenv("STORAGE_BACKEND", "tinydb") == "tinydb" and float(os.getenv("STORAGE_COMMIT_WINDOW_MS", "0")) > 0 \
+        and workers > 1:
+    raise RuntimeError("STORAGE_COMMIT_WINDOW_MS needs WORKERS=1 with the tinydb storage backend")
+worker_class = "gthread"
+keepalive = 5
+graceful_timeout = 30
+accesslog = "-"
+
+
+def on_starting(server):
+    # Workers add up the metrics every process has written there; those of an earlier run would count too.
+    data_path = os.getenv("DATA_PATH")
+    if data_path:
+        for path in glob.glob(os.path.join(data_path, "metrics", "*.json")):
+            os.remove(path)
+
+
+def post_worker_init(worker):
+    # Start function workers ahead of the first invocation rather than in every process that imports main.
+    from main import function_pool, rpc_server
+    function_pool.start()
+    rpc_server.start()
@@ -1 +1,2 @@
 from .health_api import HealthAPI
+from .metrics_api import MetricsAPI
@@ -0,0 +1,51 @@
+import time
+
+from flask import Flask, Response, g, request
+from huey import Huey
+
+from node.node_key_manager import NodeKeyManager
+from utils.metrics import registry
+from utils.token_cache import TokenCache
+
+REQUEST_SECONDS = registry.histogram("vertex_http_request_seconds", "Time spent handling HTTP requests",
+                                     ("endpoint", "method", "status"))
+
+
+class MetricsAPI:
+    def __init__(self, app: Flask, huey: Huey, token_cache: TokenCache, node_key_manager: NodeKeyManager):
+        self.app = app
+        self.huey = huey
+        self.caches = {
+            "token": token_cache.stats,
+            "node_key": node_key_manager.cache_stats,
+        }
+
+    def register(self):
+        registry.gauge("vertex_huey_pending_tasks", "Tasks waiting in the huey queue", (),
+                       lambda: {(): self.huey.pending_count()}, shared=True)
+        registry.gauge("vertex_cache_entries", "Entries held by in-process caches", ("cache",),
+                       lambda: self.cache_stats("size"))
+        registry.gauge("vertex_cache_hits_total", "In-process cache hits", ("cache",),
+                       lambda: self.cache_stats("hits"), "counter")
+        registry.gauge("vertex_cache_misses_total", "In-process cache misses", ("cache",),
+                       lambda: self.cache_stats("misses"), "counter")
+
+        @self.app.before_request
+        def start_timer():
+            g.request_started_on = time.perf_counter()
+
+        @self.app.after_request
+        def observe_request(response):
+            started_on = g.get("request_started_on")
+            if started_on is not None:
+                REQUEST_SECONDS.observe((request.endpoint or "unmatched", request.method, str(response.status_code)),
+                                        time.perf_counter() - started_on)
+            registry.write_if_due()
+            return response
+
+        @self.app.get("/metrics")
+        def metrics():
+            return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+    def cache_stats(self, key: str) -> dict:
+        return {(name,): stats()[key] for name, stats in self.caches.items()}
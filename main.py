@@ -2,7 +2,7 @@ import os
 
 from dotenv import *
 from flask import Flask, request, jsonify, g
-from tinydb import TinyDB
+from werkzeug.exceptions import HTTPException
 from huey import SqliteHuey
 
 from health import *
@@ -10,42 +10,187 @@ from admin import *
 from node import *
 from actor import *
 from messaging import *
+from bucket import *
+from bundle import *
+from function import *
+from collection import *
+from rpc import *
+from storage import open_storage
+from utils.federation import FederationClient
+from utils.token_cache import TokenCache
+from utils.invalidation import InvalidationBoard
+from utils.password_hasher import PasswordHasher
+from utils.profiler import Profiler
+from utils.fast_json import FastJSONProvider
+from utils.ed25519 import string_to_private_key
+from utils.metrics import registry
 
 load_dotenv()
 jwt_signing_key = os.getenv("JWT_SIGNING_KEY")
 vertex_endpoint = os.getenv("VERTEX_ENDPOINT")
 data_path = os.getenv("DATA_PATH")
 federation_protocol = os.getenv("FEDERATION_PROTOCOL")
+storage_backend = os.getenv("STORAGE_BACKEND", "tinydb")
+storage_commit_window = float(os.getenv("STORAGE_COMMIT_WINDOW_MS", "0")) / 1000
+storage_commit_batch = int(os.getenv("STORAGE_COMMIT_BATCH", "100"))
+storage_durability = os.getenv("STORAGE_DURABILITY", "buffered")
+federation_connect_timeout = float(os.getenv("FEDERATION_CONNECT_TIMEOUT", "3"))
+federation_read_timeout = float(os.getenv("FEDERATION_READ_TIMEOUT", "10"))
+federation_pool_size = int(os.getenv("FEDERATION_POOL_SIZE", "10"))
+password_hasher_workers = int(os.getenv("PASSWORD_HASHER_WORKERS", "0"))
+password_hasher_max_pending = int(os.getenv("PASSWORD_HASHER_MAX_PENDING", "64"))
+delivery_batch_size = int(os.getenv("DELIVERY_BATCH_SIZE", "1000"))
+delivery_retries = int(os.getenv("DELIVERY_RETRIES", "8"))
+delivery_retry_delay = float(os.getenv("DELIVERY_RETRY_DELAY", "5"))
+message_log_segment_size = int(os.getenv("MESSAGE_LOG_SEGMENT_SIZE", str(16 * 1024 * 1024)))
+message_log_index_interval = int(os.getenv("MESSAGE_LOG_INDEX_INTERVAL", "4096"))
+inbox_stream_heartbeat = float(os.getenv("INBOX_STREAM_HEARTBEAT", "15"))
+inbox_stream_max_wait = float(os.getenv("INBOX_STREAM_MAX_WAIT", "60"))
+inbox_notify_poll_interval = float(os.getenv("INBOX_NOTIFY_POLL_INTERVAL", "1"))
+# Waiting readers hold a server thread each; leave a couple of threads per worker for everything else.
+inbox_max_readers = int(os.getenv("INBOX_MAX_READERS", "0")) or max(int(os.getenv("THREADS", "8")) - 2, 1)
+token_cache_size = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+token_cache_ttl = float(os.getenv("TOKEN_CACHE_TTL", "60"))
+profiler_max_seconds = float(os.getenv("PROFILER_MAX_SECONDS", "60"))
+json_backend = os.getenv("JSON_BACKEND", "orjson")
+bulk_max_items = int(os.getenv("BULK_MAX_ITEMS", "50000"))
+bucket_chunk_size = int(os.getenv("BUCKET_CHUNK_SIZE", str(4 * 1024 * 1024)))
+bucket_max_object_size = int(os.getenv("BUCKET_MAX_OBJECT_SIZE", str(1024 * 1024 * 1024)))
+bundle_max_chunk_size = int(os.getenv("BUNDLE_MAX_CHUNK_SIZE", str(4 * 1024 * 1024)))
+bundle_max_size = int(os.getenv("BUNDLE_MAX_SIZE", str(256 * 1024 * 1024)))
+bundle_max_files = int(os.getenv("BUNDLE_MAX_FILES", "10000"))
+bundle_chunk_grace = float(os.getenv("BUNDLE_CHUNK_GRACE", "3600"))
+bundle_cache_size = int(os.getenv("BUNDLE_CACHE_SIZE", str(1024 * 1024 * 1024)))
+function_workers = int(os.getenv("FUNCTION_WORKERS", "2"))
+function_max_workers = int(os.getenv("FUNCTION_MAX_WORKERS", "8"))
+function_max_per_node = int(os.getenv("FUNCTION_MAX_PER_NODE", "4"))
+function_max_timeout = float(os.getenv("FUNCTION_MAX_TIMEOUT", "30"))
+function_max_memory_limit = int(os.getenv("FUNCTION_MAX_MEMORY_LIMIT", "512"))
+function_preload = tuple(module for module in os.getenv("FUNCTION_PRELOAD", "").split(",") if module)
+collection_column_cache_size = int(os.getenv("COLLECTION_COLUMN_CACHE_SIZE", "16"))
+node_key_cache_size = int(os.getenv("NODE_KEY_CACHE_SIZE", "10000"))
+node_key_cache_ttl = float(os.getenv("NODE_KEY_CACHE_TTL", "300"))
+node_key_cache_negative_ttl = float(os.getenv("NODE_KEY_CACHE_NEGATIVE_TTL", "30"))
+rpc_host = os.getenv("RPC_HOST", "0.0.0.0")
+rpc_port = int(os.getenv("RPC_PORT", "0"))
+rpc_workers = int(os.getenv("RPC_WORKERS", "8"))
+rpc_max_in_flight = int(os.getenv("RPC_MAX_IN_FLIGHT", "64"))
+rpc_call_timeout = float(os.getenv("RPC_CALL_TIMEOUT", "10"))
+rpc_discovery_ttl = float(os.getenv("RPC_DISCOVERY_TTL", "300"))
+rpc_max_connections = int(os.getenv("RPC_MAX_CONNECTIONS", "256"))
+rpc_handshake_timeout = float(os.getenv("RPC_HANDSHAKE_TIMEOUT", "10"))
+rpc_idle_timeout = float(os.getenv("RPC_IDLE_TIMEOUT", "300"))
+rpc_client_enabled = os.getenv("RPC_CLIENT_ENABLED", "false").lower() == "true"
+rpc_tls_cert = os.getenv("RPC_TLS_CERT")
+rpc_tls_key = os.getenv("RPC_TLS_KEY")
 
 if not os.path.exists(data_path):
     os.makedirs(data_path)
 
+# RPC carries what federation otherwise sends over HTTPS, so it is encrypted and verified whenever HTTPS is.
+rpc_tls = federation_protocol == "https"
+if rpc_tls and rpc_port > 0 and not (rpc_tls_cert and rpc_tls_key):
+    raise Exception("RPC_TLS_CERT and RPC_TLS_KEY are required to serve RPC when FEDERATION_PROTOCOL is https")
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app, json_backend)
 huey = SqliteHuey("worker", filename= os.path.join(data_path, "huey.db"))
-meta_db = TinyDB(os.path.join(data_path, 'meta.json'))
+meta_db = open_storage(storage_backend, data_path, storage_commit_window, storage_commit_batch,
+                       storage_durability)
+password_hasher = PasswordHasher(password_hasher_workers, password_hasher_max_pending)
+invalidation_board = InvalidationBoard(os.path.join(data_path, "invalidation"))
+registry.share(os.path.join(data_path, "metrics"))
 
-admin_manager = AdminManager(meta_db.table("admins"), jwt_signing_key, vertex_endpoint)
-node_manager = NodeManager(meta_db.table("nodes"))
-actor_manager = ActorManager(meta_db.table("actors"), node_manager, vertex_endpoint)
-remote_node_manager = RemoteNodeManager(federation_protocol)
-node_key_manager = NodeKeyManager(node_manager, remote_node_manager, vertex_endpoint)
-outbox_manager = OutboxManager(meta_db.table("outboxes"), node_manager)
-inbox_manager = InboxManager(meta_db.table("inboxes"), node_manager)
+admin_manager = AdminManager(meta_db.table("admins", unique=(("username",),)), jwt_signing_key, vertex_endpoint,
+                             password_hasher)
+node_manager = NodeManager(meta_db.table("nodes", unique=(("identifier",),)))
+actor_manager = ActorManager(meta_db.table("actors", unique=(("node_identifier", "identifier"),)),
+                             node_manager, vertex_endpoint, password_hasher)
+federation_client = FederationClient(federation_protocol, federation_connect_timeout, federation_read_timeout,
+                                     federation_pool_size)
+rpc_client = RpcClient(federation_client,
+                       lambda identifier: string_to_private_key(
+                           node_manager.get_signing_private_key(identifier)["signing_private_key"]),
+                       vertex_endpoint, federation_connect_timeout, rpc_call_timeout, rpc_discovery_ttl,
+                       rpc_client_enabled, client_context() if rpc_tls else None)
+remote_node_manager = RemoteNodeManager(federation_client, rpc_client=rpc_client)
+node_key_manager = NodeKeyManager(node_manager, remote_node_manager, vertex_endpoint,
+                                  node_key_cache_size, node_key_cache_ttl, node_key_cache_negative_ttl,
+                                  invalidation_board)
+rpc_server = RpcServer(node_key_manager.get_signing_public_key, vertex_endpoint, rpc_host, rpc_port, rpc_workers,
+                       rpc_max_in_flight,
+                       server_context(rpc_tls_cert, rpc_tls_key) if rpc_tls and rpc_port > 0 else None,
+                       rpc_max_connections, rpc_handshake_timeout, rpc_idle_timeout)
+outbox_manager = OutboxManager(meta_db.table("outboxes",
+                                             unique=(("node_identifier", "identifier"),),
+                                             indexes=(("node_identifier", "creator_address"),)), node_manager)
+inbox_manager = InboxManager(meta_db.table("inboxes",
+                                           unique=(("node_identifier", "identifier"),),
+                                           indexes=(("node_identifier", "creator_address"),)), node_manager,
+                             MessageLogStore(os.path.join(data_path, "inboxes"), message_log_segment_size,
+                                             message_log_index_interval),
+                             InboxNotifier(invalidation_board, inbox_notify_poll_interval or None,
+                                           inbox_max_readers))
+bucket_manager = BucketManager(meta_db.table("buckets",
+                                             unique=(("node_identifier", "identifier"),),
+                                             indexes=(("node_identifier", "creator_address"),)), node_manager,
+                               ObjectStore(os.path.join(data_path, "buckets"), bucket_chunk_size),
+                               bucket_max_object_size)
+bundle_manager = BundleManager(meta_db.table("bundles",
+                                             unique=(("node_identifier", "identifier"),),
+                                             indexes=(("node_identifier", "creator_address"),)), node_manager,
+                               BundleStore(os.path.join(data_path, "bundles"), bundle_max_chunk_size,
+                                           bundle_chunk_grace),
+                               BundleCache(os.path.join(data_path, "bundles", "unpacked"), bundle_cache_size),
+                               bundle_max_size, bundle_max_files)
+function_pool = FunctionPool(function_workers, function_max_workers, function_max_per_node,
+                             preload=function_preload, slots_path=os.path.join(data_path, "functions"))
+function_manager = FunctionManager(meta_db.table("functions", unique=(("node_identifier", "identifier"),)),
+                                   node_manager, function_pool, function_max_timeout, function_max_memory_limit)
+document_store = DocumentStore(os.path.join(data_path, "collections", "documents.db"))
+collection_manager = CollectionManager(meta_db.table("collections",
+                                                     unique=(("node_identifier", "identifier"),),
+                                                     indexes=(("node_identifier", "creator_address"),)),
+                                       node_manager,
+                                       document_store,
+                                       ColumnStore(document_store, collection_column_cache_size))
+receiver = Receiver(inbox_manager)
+sender = Sender(huey, outbox_manager, node_manager, receiver, federation_client, vertex_endpoint,
+                delivery_batch_size, delivery_retries, delivery_retry_delay, rpc_client)
+token_cache = TokenCache(token_cache_size, token_cache_ttl, invalidation_board)
+admin_manager.add_listener(lambda username: token_cache.invalidate("admin:%s" % username))
+node_manager.add_listener(
+    lambda identifier: token_cache.invalidate("node:%s/%s" % (vertex_endpoint, identifier)))
+actor_manager.add_listener(
+    lambda node_identifier, identifier: token_cache.invalidate(
+        "actor:%s/%s/%s" % (vertex_endpoint, node_identifier, identifier)))
 
 HealthAPI(app).register()
-AdminAPI(app, admin_manager).register()
+MetricsAPI(app, huey, token_cache, node_key_manager).register()
+profiler = Profiler(profiler_max_seconds)
+AdminAPI(app, admin_manager, profiler).register()
 NodeApi(app, node_manager).register()
-ActorApi(app, actor_manager).register()
-OutboxApi(app, outbox_manager).register()
-InboxApi(app, inbox_manager).register()
+ActorApi(app, actor_manager, bulk_max_items).register()
+OutboxApi(app, outbox_manager, sender, bulk_max_items).register()
+InboxApi(app, inbox_manager, receiver, inbox_stream_heartbeat, inbox_stream_max_wait, bulk_max_items).register()
+BucketApi(app, bucket_manager).register()
+BundleApi(app, bundle_manager).register()
+FunctionApi(app, function_manager).register()
+CollectionApi(app, collection_manager, bulk_max_items).register()
+RpcApi(app, rpc_server).register()
+NodeRpc(rpc_server, node_manager).register()
+InboxRpc(rpc_server, receiver).register()
+profiler.install(app)
 
 
 @app.before_request
 def before_request():
-    g.request_body = request.get_json(force=True, silent=True)
     g.jwt_signing_key = jwt_signing_key
     g.vertex_endpoint = vertex_endpoint
     g.node_key_manager = node_key_manager
+    g.token_cache = token_cache
+    g.admin_manager = admin_manager
+    g.actor_manager = actor_manager
 
 
 @app.errorhandler(404)
@@ -56,6 +201,18 @@ def handle_404_error(e):
     }), 404
 
 
+@app.errorhandler(HTTPException)
+def handle_http_error(e):
+    response = jsonify({
+        "success": False,
+        "message": str(e)
+    })
+    for key, value in e.get_headers():
+        if key != "Content-Type":
+            response.headers[key] = value
+    return response, e.code
+
+
 @app.errorhandler(Exception)
 def handle_all_errors(e):
     return jsonify({
@@ -65,4 +222,6 @@ def handle_all_errors(e):
 
 
 if __name__ == '__main__':
+    function_pool.start()
+    rpc_server.start()
     app.run(host=os.getenv("HOST"), port=int(os.getenv("PORT")), debug=os.getenv("ENV") != "PROD")
@@ -1,4 +1,9 @@
 from .outbox_api import OutboxApi
 from .outbox_manager import OutboxManager
 from .inbox_api import InboxApi
+from .inbox_rpc import InboxRpc
 from .inbox_manager import InboxManager
+from .message_log import MessageLogStore
+from .inbox_notifier import InboxNotifier
+from .receiver import Receiver
+from .sender import Sender
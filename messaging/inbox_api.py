@@ -1,13 +1,22 @@
-from flask import Flask
+from typing import Iterator
+
+from flask import Flask, Response, request
+from utils import fast_json
 from utils.api import *
 
 from .inbox_manager import InboxManager
+from .receiver import Receiver
 
 
 class InboxApi:
-    def __init__(self, app: Flask, manager: InboxManager):
+    def __init__(self, app: Flask, manager: InboxManager, receiver: Receiver, heartbeat: float = 15,
+                 max_wait: float = 60, bulk_max_items: int = 50000):
         self.app = app
         self.manager = manager
+        self.receiver = receiver
+        self.heartbeat = heartbeat
+        self.max_wait = max_wait
+        self.bulk_max_items = bulk_max_items
 
     def register(self):
         @self.app.post("/api/v1/nodes/<node_identifier>/messaging/inboxes")
@@ -20,16 +29,63 @@ class InboxApi:
                 actor["address"]
             )
 
+        @self.app.post("/api/v1/nodes/<node_identifier>/messaging/inboxes/bulk")
+        @authenticate_actor
+        def create_inboxes(actor, node_identifier):
+            return {
+                "results": self.manager.create_many(node_identifier,
+                                                    bulk_param("inboxes", self.bulk_max_items),
+                                                    actor["address"])
+            }
+
+        @self.app.post("/api/v1/nodes/<node_identifier>/messaging/inboxes/messages")
+        @authenticate_node
+        def receive_messages(node, node_identifier):
+            return self.receiver.receive(node_identifier, node["address"], required_param("messages", list))
+
         @self.app.get("/api/v1/nodes/<node_identifier>/messaging/inboxes")
         @authenticate_actor
         def list_inboxes(actor, node_identifier):
-            return self.manager.list(node_identifier, actor["address"])
+            if streamed():
+                return stream_results(self.manager.iterate(node_identifier, actor["address"], cursor()))
+            return self.manager.list(node_identifier, actor["address"], cursor(), size())
 
         @self.app.get("/api/v1/nodes/<node_identifier>/messaging/inboxes/<identifier>")
         @authenticate_actor
         def get_inbox(actor, node_identifier, identifier: str):
             return self.manager.get(node_identifier, identifier, actor["address"])
 
+        @self.app.get("/api/v1/nodes/<node_identifier>/messaging/inboxes/<identifier>/messages")
+        @authenticate_actor
+        def read_inbox_messages(actor, node_identifier, identifier: str):
+            return self.manager.read_messages(node_identifier, identifier, actor["address"], offset(), size())
+
+        @self.app.get("/api/v1/nodes/<node_identifier>/messaging/inboxes/<identifier>/stream")
+        @authenticate_actor
+        def stream_inbox_messages(actor, node_identifier, identifier: str):
+            if "text/event-stream" not in request.headers.get("Accept", ""):
+                return self.manager.read_messages(node_identifier, identifier, actor["address"], offset(), size(),
+                                                  min(request.args.get("timeout", self.max_wait, float),
+                                                      self.max_wait))
+
+            start = offset()
+            if request.headers.get("Last-Event-ID", "").isdigit():
+                start = int(request.headers["Last-Event-ID"]) + 1
+            # A stream holds its server thread until the client goes away, so it takes a reader slot up front.
+            self.manager.notifier.acquire()
+            try:
+                messages = self.manager.stream_messages(node_identifier, identifier, actor["address"], start,
+                                                        self.heartbeat)
+            except Exception:
+                self.manager.notifier.release()
+                raise
+            response = Response(self.events(messages), mimetype="text/event-stream", headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no",
+            })
+            response.call_on_close(self.manager.notifier.release)
+            return response
+
         @self.app.put("/api/v1/nodes/<node_identifier>/messaging/inboxes/<identifier>")
         @authenticate_actor
         def update_inbox(actor, node_identifier, identifier):
@@ -39,3 +95,12 @@ class InboxApi:
         @authenticate_actor
         def delete_inbox(actor, node_identifier, identifier):
             return self.manager.delete(node_identifier, identifier, actor["address"])
+
+    @staticmethod
+    def events(messages: Iterator[dict | None]) -> Iterator[str]:
+        yield ": connected\n\n"
+        for message in messages:
+            if message is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield "id: %d\ndata: %s\n\n" % (message["offset"], fast_json.dumps(message))
@@ -1,15 +1,43 @@
+import threading
 import time
+import uuid
+from collections import OrderedDict
+from typing import Iterator
 
-from tinydb.table import Table
-from tinydb import Query
+from storage import Table
+from utils import fast_json
 
 from node import NodeManager
+from schema import schemas
+from .inbox_notifier import InboxNotifier
+from .message_log import MessageLog, MessageLogStore
+
+INBOX_SCHEMA = schemas.get("inbox", 1, {
+    "type": "object",
+    "required": ["identifier"],
+    "properties": {
+        "identifier": {"type": "string"},
+        "description": {"type": ["string", "null"]},
+    },
+}, "Inbox")
 
 
 class InboxManager:
-    def __init__(self, db: Table, node_manager: NodeManager):
+    def __init__(self, db: Table, node_manager: NodeManager, message_logs: MessageLogStore,
+                 notifier: InboxNotifier, dedupe_window: int = 1000):
         self.db = db
         self.node_manager = node_manager
+        self.message_logs = message_logs
+        self.notifier = notifier
+        self.dedupe_window = dedupe_window
+        self.recent_ids = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def log_id(inbox) -> str:
+        # Document ids are reused once the highest one is deleted, so every inbox gets its own log id.
+        # Inboxes created before log ids existed keep the log named after their document id.
+        return inbox.get("log_id") or str(inbox.doc_id)
 
     def create(self, node_identifier: str, identifier: str, description: str, creator_address: str) -> dict:
         if not self.node_manager.identifier_exists(node_identifier):
@@ -22,6 +50,7 @@ class InboxManager:
             "identifier": identifier,
             "description": description,
             "creator_address": creator_address,
+            "log_id": uuid.uuid4().hex,
             "created_on": int(time.time()),
             "modified_on": int(time.time()),
         })
@@ -31,32 +60,170 @@ class InboxManager:
             "identifier": identifier,
         }
 
-    def list(self, node_identifier: str, actor_address: str) -> list[dict]:
-        query = Query()
-        inboxes = self.db.search((query.creator_address == actor_address) &
-                                 (query.node_identifier == node_identifier))
+    def create_many(self, node_identifier: str, inboxes: list, creator_address: str) -> list[dict]:
+        """Creates ``inboxes`` with a single write and returns one result per inbox, in order."""
+        if not self.node_manager.identifier_exists(node_identifier):
+            raise Exception(f"Node {node_identifier} does not exist")
+
+        results = [None] * len(inboxes)
+        accepted = []
+        seen = set()
+        for position, (inbox, error) in enumerate(zip(inboxes, INBOX_SCHEMA.validate_many(inboxes))):
+            identifier = inbox.get("identifier") if isinstance(inbox, dict) else None
+            if error is None and (identifier in seen or self.identifier_exists(identifier, node_identifier)):
+                error = f"Inbox {identifier} already exists on node {node_identifier}"
+            if error is None:
+                seen.add(identifier)
+                accepted.append(position)
+                continue
+            results[position] = {"identifier": identifier, "success": False, "message": error}
+
+        now = int(time.time())
+        inbox_ids = self.db.insert_multiple([{
+            "node_identifier": node_identifier,
+            "identifier": inboxes[position]["identifier"],
+            "description": inboxes[position].get("description"),
+            "creator_address": creator_address,
+            "log_id": uuid.uuid4().hex,
+            "created_on": now,
+            "modified_on": now,
+        } for position in accepted]) if accepted else []
+
+        for position, inbox_id in zip(accepted, inbox_ids):
+            results[position] = {"identifier": inboxes[position]["identifier"], "success": True, "id": inbox_id}
+        return results
+
+    def append_messages(self, node_identifier: str, identifier: str, messages: list[dict]) -> list[int | None]:
+        inbox = self.db.get({"node_identifier": node_identifier, "identifier": identifier})
+        if not inbox:
+            raise Exception(f"Inbox {identifier} does not exist on node {node_identifier}")
+
+        log_id = self.log_id(inbox)
+        log = self.message_logs.get(log_id)
+        with self.lock:
+            recent_ids = self.recent_ids.get(log_id)
+            if recent_ids is None:
+                recent_ids = self.load_recent_ids(log)
+                self.recent_ids[log_id] = recent_ids
+            self.recent_ids.move_to_end(log_id)
+            while len(self.recent_ids) > self.message_logs.max_open:
+                self.recent_ids.popitem(last=False)
+
+            records = []
+            appended = []
+            for message in messages:
+                if message["id"] in recent_ids:
+                    appended.append(False)
+                    continue
+                recent_ids[message["id"]] = None
+                records.append(fast_json.dumps_bytes(message))
+                appended.append(True)
+            while len(recent_ids) > self.dedupe_window:
+                recent_ids.popitem(last=False)
+
+            offsets = iter(log.append(records) if records else [])
+
+        if records:
+            self.notifier.notify(log_id)
+        return [next(offsets) if is_appended else None for is_appended in appended]
+
+    def read_messages(self, node_identifier: str, identifier: str, actor_address: str, offset: int,
+                      limit: int, timeout: float = 0) -> dict:
+        inbox = self.get_owned(node_identifier, identifier, actor_address)
+        log_id = self.log_id(inbox)
+        log = self.message_logs.get(log_id)
+        if timeout > 0:
+            self.notifier.acquire()
+            try:
+                self.notifier.wait(log_id, lambda: log.deleted or log.next_offset > offset, timeout)
+            finally:
+                self.notifier.release()
+
+        results = self.decode(log.read(offset, limit))
+        return {
+            "results": results,
+            "next": results[-1]["offset"] + 1 if results else offset,
+        }
+
+    def stream_messages(self, node_identifier: str, identifier: str, actor_address: str, offset: int,
+                        heartbeat: float) -> Iterator[dict | None]:
+        """Follows the inbox from ``offset``. The caller holds a reader slot of the notifier for the stream."""
+        inbox = self.get_owned(node_identifier, identifier, actor_address)
+        return self.follow(self.log_id(inbox), offset, heartbeat)
+
+    def follow(self, log_id: str, offset: int, heartbeat: float) -> Iterator[dict | None]:
+        log = self.message_logs.get(log_id)
+        while not log.deleted:
+            results = self.decode(log.read(offset, 100))
+            if results:
+                yield from results
+                offset = results[-1]["offset"] + 1
+                continue
+
+            if not self.notifier.wait(log_id, lambda: log.deleted or log.next_offset > offset, heartbeat):
+                yield None
+
+    def get_owned(self, node_identifier: str, identifier: str, actor_address: str):
+        inbox = self.db.get({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
+        if not inbox:
+            raise Exception(f"Inbox {identifier} does not exist on node {node_identifier}")
+        return inbox
+
+    @staticmethod
+    def decode(records: list[(int, bytes)]) -> list[dict]:
         results = []
-        for inbox in inboxes:
-            results.append(self.to_dict(inbox))
+        for record_offset, record in records:
+            message = fast_json.loads(record)
+            message["offset"] = record_offset
+            results.append(message)
         return results
 
+    def load_recent_ids(self, log: MessageLog) -> OrderedDict:
+        recent_ids = OrderedDict()
+        for _, record in log.read(max(log.next_offset - self.dedupe_window, 0), self.dedupe_window):
+            recent_ids[fast_json.loads(record)["id"]] = None
+        return recent_ids
+
+    def list(self, node_identifier: str, actor_address: str, cursor: int = None, size: int = 50) -> dict:
+        inboxes = self.db.page({
+            "node_identifier": node_identifier,
+            "creator_address": actor_address,
+        }, cursor, size + 1)
+        return {
+            "results": [self.to_dict(inbox) for inbox in inboxes[:size]],
+            "next": str(inboxes[size - 1].doc_id) if len(inboxes) > size else None,
+        }
+
+    def iterate(self, node_identifier: str, actor_address: str, cursor: int = None) -> Iterator[dict]:
+        for inbox in self.db.iterate({
+            "node_identifier": node_identifier,
+            "creator_address": actor_address,
+        }, cursor):
+            yield self.to_dict(inbox)
+
     def get(self, node_identifier: str, identifier: str, actor_address: str) -> dict:
-        query = Query()
-        inbox = self.db.get((query.node_identifier == node_identifier) &
-                            (query.identifier == identifier) &
-                            (query.creator_address == actor_address))
+        inbox = self.db.get({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
         if not inbox:
             raise Exception(f"Inbox {identifier} does not exist on node {node_identifier}")
         return self.to_dict(inbox)
 
     def update(self, node_identifier: str, identifier: str, description: str, actor_address: str) -> dict:
-        query = Query()
         results = self.db.update({
             "description": description,
             "modified_on": int(time.time()),
-        }, (query.node_identifier == node_identifier) &
-           (query.identifier == identifier) &
-           (query.creator_address == actor_address))
+        }, {
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
 
         if len(results) == 0:
             raise Exception(f"Inbox {identifier} does not exist on node {node_identifier}")
@@ -66,19 +233,28 @@ class InboxManager:
         }
 
     def delete(self, node_identifier: str, identifier: str, actor_address) -> dict:
-        query = Query()
-        results = self.db.remove((query.node_identifier == node_identifier) &
-                                 (query.identifier == identifier) &
-                                 (query.creator_address == actor_address))
-        if len(results) == 0:
+        where = {
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        }
+        inbox = self.db.get(where)
+        if inbox and "log_id" in inbox:
+            # Only remove the inbox that was read, not one recreated under the same identifier since.
+            where["log_id"] = inbox["log_id"]
+        if not inbox or len(self.db.remove(where)) == 0:
             raise Exception(f"Inbox {identifier} does not exist on node {node_identifier}")
+        log_id = self.log_id(inbox)
+        with self.lock:
+            self.recent_ids.pop(log_id, None)
+        self.message_logs.delete(log_id)
+        self.notifier.notify(log_id)
         return {
             "identifier": identifier,
         }
 
     def identifier_exists(self, identifier: str, node_identifier: str) -> bool:
-        query = Query()
-        return self.db.contains((query.identifier == identifier) & (query.node_identifier == node_identifier))
+        return self.db.contains({"node_identifier": node_identifier, "identifier": identifier})
 
     @staticmethod
     def to_dict(self):
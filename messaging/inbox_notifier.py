@@ -0,0 +1,102 @@
+import os
+import threading
+import time
+from typing import Callable
+
+from werkzeug.exceptions import ServiceUnavailable
+
+from utils.invalidation import InvalidationBoard
+
+
+class Waiters:
+    def __init__(self, generation: int):
+        self.condition = threading.Condition()
+        self.count = 0
+        self.generation = generation
+
+
+class InboxNotifier:
+    """Wakes readers waiting on an inbox when messages are appended to it.
+
+    Every inbox with readers waiting on it has a condition of its own, so an append only wakes the readers of
+    that inbox. Appends also bump the inbox's counter on ``board``; one dispatcher thread per process checks
+    the counters of the inboxes it has readers for every ``poll_interval`` seconds, which is how appends made
+    by other processes reach them. Each waiting reader holds a server thread, so at most ``max_readers`` may
+    wait at once; more are turned away with 503.
+    """
+
+    def __init__(self, board: InvalidationBoard | None = None, poll_interval: float | None = None,
+                 max_readers: int = 0):
+        self.board = board
+        self.poll_interval = poll_interval
+        self.max_readers = max_readers
+        self.lock = threading.Lock()
+        self.waiters = {}
+        self.readers = 0
+        self.dispatcher = None
+        self.dispatcher_pid = None
+
+    @staticmethod
+    def tag(inbox_id: str) -> str:
+        return "inbox:" + inbox_id
+
+    def acquire(self):
+        """Takes a reader slot, to be given back with ``release`` once the reader stops waiting."""
+        with self.lock:
+            if self.max_readers and self.readers >= self.max_readers:
+                raise ServiceUnavailable("Too many readers are waiting for messages, retry later", retry_after=1)
+            self.readers += 1
+
+    def release(self):
+        with self.lock:
+            self.readers -= 1
+
+    def notify(self, inbox_id: str):
+        if self.board is not None:
+            self.board.bump(self.tag(inbox_id))
+        with self.lock:
+            entry = self.waiters.get(inbox_id)
+        if entry is not None:
+            with entry.condition:
+                entry.condition.notify_all()
+
+    def wait(self, inbox_id: str, predicate: Callable[[], bool], timeout: float) -> bool:
+        with self.lock:
+            entry = self.waiters.get(inbox_id)
+            if entry is None:
+                # Appends after this point move the generation, so the dispatcher cannot miss them.
+                entry = Waiters(self.board.generation(self.tag(inbox_id)) if self.board is not None else 0)
+                self.waiters[inbox_id] = entry
+            entry.count += 1
+            self.start()
+        try:
+            with entry.condition:
+                return entry.condition.wait_for(predicate, timeout)
+        finally:
+            with self.lock:
+                entry.count -= 1
+                if entry.count == 0:
+                    del self.waiters[inbox_id]
+
+    def start(self):
+        if self.board is None or self.poll_interval is None:
+            return
+        if self.dispatcher is None or self.dispatcher_pid != os.getpid():
+            self.dispatcher = threading.Thread(target=self.dispatch, name="inbox-notifier", daemon=True)
+            self.dispatcher_pid = os.getpid()
+            self.dispatcher.start()
+
+    def dispatch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            with self.lock:
+                if not self.waiters:
+                    self.dispatcher = None
+                    return
+                entries = list(self.waiters.items())
+            for inbox_id, entry in entries:
+                generation = self.board.generation(self.tag(inbox_id))
+                if generation != entry.generation:
+                    entry.generation = generation
+                    with entry.condition:
+                        entry.condition.notify_all()
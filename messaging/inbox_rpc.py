@@ -0,0 +1,24 @@
+from rpc import RpcServer
+from schema import schemas
+from .receiver import Receiver
+
+RECEIVE_SCHEMA = schemas.get("rpc_inboxes_receive", 1, {
+    "type": "object",
+    "required": ["node_identifier", "messages"],
+    "properties": {
+        "node_identifier": {"type": "string"},
+        "messages": {"type": "array"},
+    },
+}, "params")
+
+
+class InboxRpc:
+    def __init__(self, server: RpcServer, receiver: Receiver):
+        self.server = server
+        self.receiver = receiver
+
+    def register(self):
+        @self.server.method("inboxes.receive", authenticated=True)
+        def receive_messages(node, params):
+            params = RECEIVE_SCHEMA.check(params)
+            return self.receiver.receive(params["node_identifier"], node["address"], params["messages"])
@@ -0,0 +1,257 @@
+import bisect
+import mmap
+import os
+import shutil
+import struct
+import threading
+from collections import OrderedDict
+
+from storage.file_lock import FileLock
+
+RECORD_HEADER = struct.Struct(">QI")
+INDEX_ENTRY = struct.Struct(">QQ")
+
+
+class Segment:
+    def __init__(self, directory: str, base_offset: int, index_interval: int):
+        self.base_offset = base_offset
+        self.index_interval = index_interval
+        self.log_path = os.path.join(directory, "%020d.log" % base_offset)
+        self.index_path = os.path.join(directory, "%020d.index" % base_offset)
+        self.log_file = open(self.log_path, "ab")
+        self.index_file = open(self.index_path, "ab")
+        self.map = None
+        self.offsets = []
+        self.positions = []
+        self.size = 0
+        self.next_offset = base_offset
+        self.indexed_on = -index_interval
+        self.refresh()
+
+    def refresh(self, truncate: bool = False):
+        """Picks up records appended since the last refresh, possibly by another process.
+
+        A torn tail is only cut off when ``truncate`` is set, which callers do while holding the log's file
+        lock; otherwise it may be a record another process is still writing.
+        """
+        size = os.path.getsize(self.log_path)
+        if size == self.size:
+            return
+        self.load_index()
+        while self.positions and self.positions[-1] >= size:
+            self.positions.pop()
+            self.offsets.pop()
+        if self.positions and self.positions[-1] > self.size:
+            position, next_offset = self.positions[-1], self.offsets[-1]
+        else:
+            position, next_offset = self.size, self.next_offset
+        with open(self.log_path, "rb") as log_file:
+            log_file.seek(position)
+            while position + RECORD_HEADER.size <= size:
+                offset, length = RECORD_HEADER.unpack(log_file.read(RECORD_HEADER.size))
+                if position + RECORD_HEADER.size + length > size:
+                    break
+                log_file.seek(length, os.SEEK_CUR)
+                position += RECORD_HEADER.size + length
+                next_offset = offset + 1
+        if truncate:
+            self.index_file.truncate(len(self.positions) * INDEX_ENTRY.size)
+            if position != size:
+                self.log_file.truncate(position)
+        self.size, self.next_offset = position, next_offset
+        self.indexed_on = self.positions[-1] if self.positions else -self.index_interval
+
+    def load_index(self):
+        with open(self.index_path, "rb") as index_file:
+            index_file.seek(len(self.offsets) * INDEX_ENTRY.size)
+            data = index_file.read()
+        for start in range(0, len(data) - len(data) % INDEX_ENTRY.size, INDEX_ENTRY.size):
+            offset, position = INDEX_ENTRY.unpack_from(data, start)
+            self.offsets.append(offset)
+            self.positions.append(position)
+
+    def append(self, records: list[bytes]) -> list[int]:
+        offsets = []
+        chunks = []
+        entries = []
+        for record in records:
+            if self.size - self.indexed_on >= self.index_interval:
+                entries.append(INDEX_ENTRY.pack(self.next_offset, self.size))
+                self.offsets.append(self.next_offset)
+                self.positions.append(self.size)
+                self.indexed_on = self.size
+            chunks.append(RECORD_HEADER.pack(self.next_offset, len(record)))
+            chunks.append(record)
+            offsets.append(self.next_offset)
+            self.size += RECORD_HEADER.size + len(record)
+            self.next_offset += 1
+        self.log_file.write(b"".join(chunks))
+        self.log_file.flush()
+        if entries:
+            self.index_file.write(b"".join(entries))
+            self.index_file.flush()
+        return offsets
+
+    def read(self, offset: int, limit: int) -> list[(int, bytes)]:
+        if offset >= self.next_offset or limit <= 0:
+            return []
+        if self.map is None or len(self.map) < self.size:
+            if self.map is not None:
+                self.map.close()
+            with open(self.log_path, "rb") as log_file:
+                self.map = mmap.mmap(log_file.fileno(), self.size, access=mmap.ACCESS_READ)
+
+        slot = bisect.bisect_right(self.offsets, offset) - 1
+        position = self.positions[slot] if slot >= 0 else 0
+        results = []
+        while position < self.size and len(results) < limit:
+            record_offset, length = RECORD_HEADER.unpack_from(self.map, position)
+            position += RECORD_HEADER.size
+            if record_offset >= offset:
+                results.append((record_offset, self.map[position:position + length]))
+            position += length
+        return results
+
+    def sync(self):
+        os.fsync(self.log_file.fileno())
+        os.fsync(self.index_file.fileno())
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.log_file.close()
+        self.index_file.close()
+
+
+class MessageLog:
+    def __init__(self, directory: str, segment_size: int, index_interval: int):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.index_interval = index_interval
+        self.lock = threading.Lock()
+        self.segments = None
+        self.base_offsets = None
+        self.file_lock = None
+        self.deleted = False
+
+    def open(self):
+        if self.segments is not None:
+            return
+        if self.deleted:
+            raise Exception("Message log has been deleted")
+        os.makedirs(self.directory, exist_ok=True)
+        base_offsets = sorted(int(name[:-4]) for name in os.listdir(self.directory) if name.endswith(".log"))
+        self.segments = [Segment(self.directory, base_offset, self.index_interval)
+                         for base_offset in base_offsets or [0]]
+        self.base_offsets = [segment.base_offset for segment in self.segments]
+        self.file_lock = FileLock(os.path.join(self.directory, ".lock"))
+
+    def refresh(self, truncate: bool = False):
+        # Other processes may append to, roll or delete the same log.
+        active = self.segments[-1]
+        try:
+            active.refresh(truncate)
+            while active.size >= self.segment_size and \
+                    os.path.exists(os.path.join(self.directory, "%020d.log" % active.next_offset)):
+                active = self.add_segment(active.next_offset)
+                active.refresh(truncate)
+        except FileNotFoundError:
+            self.deleted = True
+
+    def add_segment(self, base_offset: int) -> Segment:
+        segment = Segment(self.directory, base_offset, self.index_interval)
+        self.segments.append(segment)
+        self.base_offsets.append(base_offset)
+        return segment
+
+    @property
+    def next_offset(self) -> int:
+        with self.lock:
+            self.open()
+            self.refresh()
+            return self.segments[-1].next_offset
+
+    def append(self, records: list[bytes], sync: bool = False) -> list[int]:
+        with self.lock:
+            self.open()
+            with self.file_lock.hold():
+                self.refresh(truncate=True)
+                if self.deleted:
+                    raise Exception("Message log has been deleted")
+                active = self.segments[-1]
+                if active.size >= self.segment_size:
+                    active = self.add_segment(active.next_offset)
+                offsets = active.append(records)
+                if sync:
+                    active.sync()
+                return offsets
+
+    def read(self, offset: int, limit: int) -> list[(int, bytes)]:
+        with self.lock:
+            self.open()
+            self.refresh()
+            slot = max(bisect.bisect_right(self.base_offsets, offset) - 1, 0)
+            results = []
+            for segment in self.segments[slot:]:
+                if len(results) >= limit:
+                    break
+                results.extend(segment.read(max(offset, segment.base_offset), limit - len(results)))
+            return results
+
+    def close(self):
+        with self.lock:
+            for segment in self.segments or []:
+                segment.close()
+            if self.file_lock is not None:
+                self.file_lock.close()
+            self.segments = None
+            self.base_offsets = None
+            self.file_lock = None
+
+    def delete(self):
+        self.close()
+        with self.lock:
+            self.deleted = True
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class MessageLogStore:
+    """Hands out the message log of each inbox, keeping at most ``max_open`` of them cached.
+
+    Logs are named by the inbox's log id, which is never reused, so a log cached here never stands in for
+    the log of another inbox. Evicted logs are closed; a caller still holding one reopens it on next use.
+    """
+
+    def __init__(self, root: str, segment_size: int = 16 * 1024 * 1024, index_interval: int = 4096,
+                 max_open: int = 1024):
+        self.root = root
+        self.segment_size = segment_size
+        self.index_interval = index_interval
+        self.max_open = max_open
+        self.logs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, log_id: str) -> MessageLog:
+        with self.lock:
+            log = self.logs.get(log_id)
+            if log is None:
+                log = MessageLog(os.path.join(self.root, log_id), self.segment_size, self.index_interval)
+                self.logs[log_id] = log
+            self.logs.move_to_end(log_id)
+            while len(self.logs) > self.max_open:
+                self.logs.popitem(last=False)[1].close()
+            return log
+
+    def delete(self, log_id: str):
+        with self.lock:
+            log = self.logs.pop(log_id, None)
+        if log is not None:
+            log.delete()
+        shutil.rmtree(os.path.join(self.root, log_id), ignore_errors=True)
+
+    def close(self):
+        with self.lock:
+            for log in self.logs.values():
+                log.close()
+            self.logs.clear()
@@ -2,12 +2,15 @@ from flask import Flask
 from utils.api import *
 
 from messaging.outbox_manager import OutboxManager
+from messaging.sender import Sender
 
 
 class OutboxApi:
-    def __init__(self, app: Flask, manager: OutboxManager):
+    def __init__(self, app: Flask, manager: OutboxManager, sender: Sender, bulk_max_items: int = 50000):
         self.app = app
         self.manager = manager
+        self.sender = sender
+        self.bulk_max_items = bulk_max_items
 
     def register(self):
         @self.app.post("/api/v1/nodes/<node_identifier>/messaging/outboxes")
@@ -20,10 +23,21 @@ class OutboxApi:
                 actor["address"]
             )
 
+        @self.app.post("/api/v1/nodes/<node_identifier>/messaging/outboxes/bulk")
+        @authenticate_actor
+        def create_outboxes(actor, node_identifier):
+            return {
+                "results": self.manager.create_many(node_identifier,
+                                                    bulk_param("outboxes", self.bulk_max_items),
+                                                    actor["address"])
+            }
+
         @self.app.get("/api/v1/nodes/<node_identifier>/messaging/outboxes")
         @authenticate_actor
         def list_outboxes(actor, node_identifier):
-            return self.manager.list(node_identifier, actor["address"])
+            if streamed():
+                return stream_results(self.manager.iterate(node_identifier, actor["address"], cursor()))
+            return self.manager.list(node_identifier, actor["address"], cursor(), size())
 
         @self.app.get("/api/v1/nodes/<node_identifier>/messaging/outboxes/<identifier>")
         @authenticate_actor
@@ -39,3 +53,16 @@ class OutboxApi:
         @authenticate_actor
         def delete_outbox(actor, node_identifier, identifier):
             return self.manager.delete(node_identifier, identifier, actor["address"])
+
+        @self.app.post("/api/v1/nodes/<node_identifier>/messaging/outboxes/<identifier>/messages")
+        @authenticate_actor
+        def send_message(actor, node_identifier, identifier):
+            if not check_node_is_home(actor, node_identifier):
+                raise Exception("Messages can only be sent from the actor's home node")
+            self.manager.get(node_identifier, identifier, actor["address"])
+            return self.sender.send(
+                node_identifier,
+                identifier,
+                required_param("inbox_addresses", list),
+                required_param("message", object)
+            )
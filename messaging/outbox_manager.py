@@ -1,9 +1,19 @@
 import time
+from typing import Iterator
 
-from tinydb.table import Table
-from tinydb import Query
+from storage import Table
 
 from node import NodeManager
+from schema import schemas
+
+OUTBOX_SCHEMA = schemas.get("outbox", 1, {
+    "type": "object",
+    "required": ["identifier"],
+    "properties": {
+        "identifier": {"type": "string"},
+        "description": {"type": ["string", "null"]},
+    },
+}, "Outbox")
 
 
 class OutboxManager:
@@ -31,32 +41,74 @@ class OutboxManager:
             "identifier": identifier,
         }
 
-    def list(self, node_identifier: str, actor_address: str) -> list[dict]:
-        query = Query()
-        outboxes = self.db.search((query.creator_address == actor_address) &
-                                  (query.node_identifier == node_identifier))
-        results = []
-        for outbox in outboxes:
-            results.append(self.to_dict(outbox))
+    def create_many(self, node_identifier: str, outboxes: list, creator_address: str) -> list[dict]:
+        """Creates ``outboxes`` with a single write and returns one result per outbox, in order."""
+        if not self.node_manager.identifier_exists(node_identifier):
+            raise Exception(f"Node {node_identifier} does not exist")
+
+        results = [None] * len(outboxes)
+        accepted = []
+        seen = set()
+        for position, (outbox, error) in enumerate(zip(outboxes, OUTBOX_SCHEMA.validate_many(outboxes))):
+            identifier = outbox.get("identifier") if isinstance(outbox, dict) else None
+            if error is None and (identifier in seen or self.identifier_exists(identifier, node_identifier)):
+                error = f"Outbox {identifier} already exists on node {node_identifier}"
+            if error is None:
+                seen.add(identifier)
+                accepted.append(position)
+                continue
+            results[position] = {"identifier": identifier, "success": False, "message": error}
+
+        now = int(time.time())
+        outbox_ids = self.db.insert_multiple([{
+            "node_identifier": node_identifier,
+            "identifier": outboxes[position]["identifier"],
+            "description": outboxes[position].get("description"),
+            "creator_address": creator_address,
+            "created_on": now,
+            "modified_on": now,
+        } for position in accepted]) if accepted else []
+
+        for position, outbox_id in zip(accepted, outbox_ids):
+            results[position] = {"identifier": outboxes[position]["identifier"], "success": True, "id": outbox_id}
         return results
 
+    def list(self, node_identifier: str, actor_address: str, cursor: int = None, size: int = 50) -> dict:
+        outboxes = self.db.page({
+            "node_identifier": node_identifier,
+            "creator_address": actor_address,
+        }, cursor, size + 1)
+        return {
+            "results": [self.to_dict(outbox) for outbox in outboxes[:size]],
+            "next": str(outboxes[size - 1].doc_id) if len(outboxes) > size else None,
+        }
+
+    def iterate(self, node_identifier: str, actor_address: str, cursor: int = None) -> Iterator[dict]:
+        for outbox in self.db.iterate({
+            "node_identifier": node_identifier,
+            "creator_address": actor_address,
+        }, cursor):
+            yield self.to_dict(outbox)
+
     def get(self, node_identifier: str, identifier: str, actor_address: str) -> dict:
-        query = Query()
-        outbox = self.db.get((query.node_identifier == node_identifier) &
-                             (query.identifier == identifier) &
-                             (query.creator_address == actor_address))
+        outbox = self.db.get({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
         if not outbox:
             raise Exception(f"Outbox {identifier} does not exist on node {node_identifier}")
         return self.to_dict(outbox)
 
     def update(self, node_identifier: str, identifier: str, description: str, actor_address: str) -> dict:
-        query = Query()
         results = self.db.update({
             "description": description,
             "modified_on": int(time.time()),
-        }, (query.node_identifier == node_identifier) &
-           (query.identifier == identifier) &
-           (query.creator_address == actor_address))
+        }, {
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
 
         if len(results) == 0:
             raise Exception(f"Outbox {identifier} does not exist on node {node_identifier}")
@@ -66,10 +118,11 @@ class OutboxManager:
         }
 
     def delete(self, node_identifier: str, identifier: str, actor_address) -> dict:
-        query = Query()
-        results = self.db.remove((query.node_identifier == node_identifier) &
-                                 (query.identifier == identifier) &
-                                 (query.creator_address == actor_address))
+        results = self.db.remove({
+            "node_identifier": node_identifier,
+            "identifier": identifier,
+            "creator_address": actor_address,
+        })
         if len(results) == 0:
             raise Exception(f"Outbox {identifier} does not exist on node {node_identifier}")
         return {
@@ -77,8 +130,7 @@ class OutboxManager:
         }
 
     def identifier_exists(self, identifier: str, node_identifier: str) -> bool:
-        query = Query()
-        return self.db.contains((query.identifier == identifier) & (query.node_identifier == node_identifier))
+        return self.db.contains({"node_identifier": node_identifier, "identifier": identifier})
 
     @staticmethod
     def to_dict(self):
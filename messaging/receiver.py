@@ -0,0 +1,69 @@
+import time
+
+from schema import schemas
+from .inbox_manager import InboxManager
+
+MESSAGE_SCHEMA = schemas.get("message", 1, {
+    "type": "object",
+    "required": ["id", "inbox_identifiers", "sender_address"],
+    "properties": {
+        "id": {"type": "string"},
+        "inbox_identifiers": {"type": "array", "items": {"type": "string"}},
+        "sender_address": {"type": "string"},
+    },
+}, "Message")
+
+
+class Receiver:
+    def __init__(self, inbox_manager: InboxManager):
+        self.inbox_manager = inbox_manager
+
+    def receive(self, node_identifier: str, sender_node_address: str, messages: list) -> dict:
+        if not self.inbox_manager.node_manager.identifier_exists(node_identifier):
+            raise Exception(f"Node {node_identifier} does not exist")
+
+        received_on = int(time.time())
+        results = []
+        batches = {}
+        sender_prefix = sender_node_address + "/"
+        for message, error in zip(messages, MESSAGE_SCHEMA.validate_many(messages)):
+            if error is None and not message["sender_address"].startswith(sender_prefix):
+                error = "Invalid sender address"
+            if error:
+                results.append({
+                    "id": message.get("id") if isinstance(message, dict) else None,
+                    "success": False,
+                    "message": error,
+                })
+                continue
+
+            for inbox_identifier in message["inbox_identifiers"]:
+                result = {
+                    "id": message["id"],
+                    "inbox_identifier": inbox_identifier,
+                    "success": True,
+                }
+                results.append(result)
+                batches.setdefault(inbox_identifier, []).append((result, {
+                    "id": message["id"],
+                    "sender_address": message["sender_address"],
+                    "body": message.get("body"),
+                    "sent_on": message.get("sent_on"),
+                    "received_on": received_on,
+                }))
+
+        for inbox_identifier, entries in batches.items():
+            try:
+                offsets = self.inbox_manager.append_messages(node_identifier, inbox_identifier,
+                                                             [record for _, record in entries])
+            except Exception as e:
+                for result, _ in entries:
+                    result["success"] = False
+                    result["message"] = str(e)
+                continue
+            for (result, _), offset in zip(entries, offsets):
+                result["offset"] = offset
+
+        return {
+            "results": results,
+        }
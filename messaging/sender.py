@@ -1,9 +1,90 @@
-from messaging import OutboxManager
+import time
+import uuid
+
+import jwt
+from huey import Huey
+
+import utils.ed25519
+from node import NodeManager
+from rpc import RpcClient
+from utils.federation import FederationClient
+from .outbox_manager import OutboxManager
+from .receiver import Receiver
 
 
 class Sender:
-    def __init__(self, outbox_manager: OutboxManager):
+    def __init__(self, huey: Huey, outbox_manager: OutboxManager, node_manager: NodeManager, receiver: Receiver,
+                 federation_client: FederationClient, vertex_endpoint: str,
+                 batch_size: int = 1000, retries: int = 8, retry_delay: float = 5, rpc_client: RpcClient = None):
         self.outbox_manager = outbox_manager
+        self.node_manager = node_manager
+        self.receiver = receiver
+        self.federation_client = federation_client
+        self.vertex_endpoint = vertex_endpoint
+        self.rpc_client = rpc_client
+        self.batch_size = batch_size
+        self.deliver_task = huey.task(retries=retries, retry_delay=retry_delay, retry_backoff=2,
+                                      name="messaging.deliver")(self.deliver)
+
+    def send(self, node_identifier: str, outbox_identifier: str, inbox_addresses: list[str], message: object) -> dict:
+        destinations = {}
+        for inbox_address in dict.fromkeys(inbox_addresses):
+            components = inbox_address.rsplit("/", 2)
+            if len(components) != 3 or not all(components):
+                raise Exception(f"Invalid inbox address {inbox_address}")
+            destinations.setdefault((components[0], components[1]), []).append(components[2])
+
+        message_id = uuid.uuid4().hex
+        sent_on = int(time.time())
+        batches = 0
+        for (vertex_endpoint, destination_node_identifier), inbox_identifiers in destinations.items():
+            for start in range(0, len(inbox_identifiers), self.batch_size):
+                self.deliver_task(node_identifier, vertex_endpoint, destination_node_identifier, {
+                    "messages": [{
+                        "id": message_id,
+                        "sender_address": "%s/%s/%s" % (self.vertex_endpoint, node_identifier, outbox_identifier),
+                        "inbox_identifiers": inbox_identifiers[start:start + self.batch_size],
+                        "body": message,
+                        "sent_on": sent_on,
+                    }]
+                })
+                batches += 1
+
+        return {
+            "id": message_id,
+            "batches": batches,
+        }
+
+    def deliver(self, node_identifier: str, vertex_endpoint: str, destination_node_identifier: str, payload: dict):
+        if vertex_endpoint == self.vertex_endpoint:
+            return self.receiver.receive(destination_node_identifier,
+                                         "%s/%s" % (self.vertex_endpoint, node_identifier),
+                                         payload["messages"])
+        if self.rpc_client is not None and self.rpc_client.available(vertex_endpoint):
+            return self.rpc_client.call(vertex_endpoint, "inboxes.receive", {
+                "node_identifier": destination_node_identifier,
+                "messages": payload["messages"],
+            }, node_identifier)
+        return self.federation_client.post(
+            vertex_endpoint,
+            "/api/v1/nodes/%s/messaging/inboxes/messages" % destination_node_identifier,
+            payload,
+            headers={
+                "Authorization": "Bearer %s" % self.get_token(node_identifier, vertex_endpoint,
+                                                              destination_node_identifier)
+            })
 
-    def send(self, node_identifier: str, outbox_identifier: str, inbox_addresses: list[str], message: object):
-        pass
+    def get_token(self, node_identifier: str, vertex_endpoint: str, destination_node_identifier: str) -> str:
+        node = self.node_manager.get_signing_private_key(node_identifier)
+        issuer = "%s/%s" % (self.vertex_endpoint, node_identifier)
+        issued_on = int(time.time())
+        return jwt.encode({
+            "sub": node_identifier,
+            "type": "node",
+            "aud": "%s/%s" % (vertex_endpoint, destination_node_identifier),
+            "iss": issuer,
+            "iat": issued_on,
+            "exp": issued_on + 300,
+        }, headers={
+            "kid": issuer
+        }, key=utils.ed25519.string_to_private_key(node["signing_private_key"]), algorithm='EdDSA')
@@ -2,3 +2,4 @@ from .node_manager import NodeManager
 from .node_api import NodeApi
 from .node_key_manager import NodeKeyManager
 from .remote_node_manager import RemoteNodeManager
+from .node_rpc import NodeRpc
@@ -1,4 +1,4 @@
-from flask import Flask
+from flask import Flask, request
 from .node_manager import NodeManager
 from utils.api import *
 
@@ -20,7 +20,15 @@ class NodeApi:
 
         @self.app.get("/api/v1/nodes")
         def list_nodes():
-            return self.manager.list()
+            identifiers = request.args.get("identifiers")
+            if identifiers is not None:
+                identifiers = [identifier for identifier in identifiers.split(",") if identifier]
+                if len(identifiers) > 1000:
+                    raise Exception("Too many identifiers")
+                return self.manager.get_many(identifiers)
+            if streamed():
+                return stream_results(self.manager.iterate(cursor()))
+            return self.manager.list(cursor(), size())
 
         @self.app.get("/api/v1/nodes/<identifier>")
         def get_node(identifier):
@@ -2,14 +2,21 @@ import cryptography.hazmat.primitives.asymmetric.ed25519
 
 from .node_manager import NodeManager
 from .remote_node_manager import RemoteNodeManager
+from utils.cache import TTLCache
 from utils.ed25519 import *
+from utils.invalidation import InvalidationBoard
 
 
 class NodeKeyManager:
-    def __init__(self, node_manager: NodeManager, remote_node_manager: RemoteNodeManager, vertex_endpoint: str):
+    def __init__(self, node_manager: NodeManager, remote_node_manager: RemoteNodeManager, vertex_endpoint: str,
+                 cache_size: int = 10000, cache_ttl: float = 300, cache_negative_ttl: float = 30,
+                 board: InvalidationBoard = None):
         self.vertex_endpoint = vertex_endpoint
         self.node_manager = node_manager
         self.remote_node_manager = remote_node_manager
+        # Local keys change in whichever process resets them, so the board carries that to the others.
+        self.cache = TTLCache(cache_size, cache_ttl, cache_negative_ttl, board)
+        self.node_manager.add_listener(self.invalidate_local)
 
     def get_signing_public_key(self, kid: str) ->\
             (str, str, cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PublicKey):
@@ -18,8 +25,18 @@ class NodeKeyManager:
         if len(components) != 2:
             raise Exception("Invalid key id")
 
-        if components[0] == self.vertex_endpoint:
-            return components[0], components[1], string_to_public_key(self.node_manager.get(components[1])["signing_public_key"])
+        return self.cache.get(kid, lambda: self.load_signing_public_key(components[0], components[1]))
+
+    def load_signing_public_key(self, vertex_endpoint: str, identifier: str) ->\
+            (str, str, cryptography.hazmat.primitives.asymmetric.ed25519.Ed25519PublicKey):
+        if vertex_endpoint == self.vertex_endpoint:
+            return vertex_endpoint, identifier, string_to_public_key(self.node_manager.get(identifier)["signing_public_key"])
         else:
-            return components[0], components[1], string_to_public_key(
-                self.remote_node_manager.get(components[0], components[1])["signing_public_key"])
+            return vertex_endpoint, identifier, string_to_public_key(
+                self.remote_node_manager.get(vertex_endpoint, identifier)["signing_public_key"])
+
+    def invalidate_local(self, identifier: str):
+        self.cache.invalidate("%s/%s" % (self.vertex_endpoint, identifier))
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats()
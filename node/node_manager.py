@@ -1,7 +1,9 @@
 import time
+from typing import Callable, Iterator
 
-from tinydb.table import Table
-from tinydb import Query
+from werkzeug.exceptions import NotFound
+
+from storage import DURABLE, Table
 
 import utils.ed25519
 
@@ -9,6 +11,7 @@ import utils.ed25519
 class NodeManager:
     def __init__(self, db: Table):
         self.db = db
+        self.listeners = []
 
     def add(self, identifier: str, description: str, creator: str) -> dict:
         if self.identifier_exists(identifier):
@@ -26,28 +29,40 @@ class NodeManager:
             "modified_on": int(time.time()),
         })
 
+        self.notify(identifier)
+
         return {
             "id": node_id,
             "identifier": identifier,
         }
 
-    def list(self) -> list:
-        nodes = self.db.all()
+    def get_many(self, identifiers: list[str]) -> list:
         results = []
-        for node in nodes:
-            results.append(self.to_dict(node))
+        for identifier in dict.fromkeys(identifiers):
+            node = self.db.get({"identifier": identifier})
+            if node:
+                results.append(self.to_dict(node))
         return results
 
+    def list(self, cursor: int = None, size: int = 50) -> dict:
+        nodes = self.db.page({}, cursor, size + 1)
+        return {
+            "results": [self.to_dict(node) for node in nodes[:size]],
+            "next": str(nodes[size - 1].doc_id) if len(nodes) > size else None,
+        }
+
+    def iterate(self, cursor: int = None) -> Iterator[dict]:
+        for node in self.db.iterate({}, cursor):
+            yield self.to_dict(node)
+
     def get(self, identifier: str) -> dict:
-        query = Query()
-        node = self.db.get(query.identifier == identifier)
+        node = self.db.get({"identifier": identifier})
         if not node:
-            raise Exception(f"Node {identifier} not found")
+            raise NotFound(f"Node {identifier} not found")
         return self.to_dict(node)
 
     def get_signing_private_key(self, identifier: str) -> dict:
-        query = Query()
-        node = self.db.get(query.identifier == identifier)
+        node = self.db.get({"identifier": identifier})
         if not node:
             raise Exception(f"Node {identifier} not found")
         return {
@@ -55,11 +70,10 @@ class NodeManager:
         }
 
     def update(self, identifier: str, description: str) -> dict:
-        query = Query()
         result = self.db.update({
             "description": description,
             "modified_on": int(time.time()),
-        }, query.identifier == identifier)
+        }, {"identifier": identifier})
 
         if len(result) == 0:
             raise Exception(f"Node {identifier} not found")
@@ -69,10 +83,10 @@ class NodeManager:
         }
 
     def delete(self, identifier: str) -> dict:
-        query = Query()
-        result = self.db.remove(query.identifier == identifier)
+        result = self.db.remove({"identifier": identifier})
         if len(result) == 0:
             raise Exception(f"Node {identifier} not found")
+        self.notify(identifier)
         return {
             "identifier": identifier
         }
@@ -80,23 +94,29 @@ class NodeManager:
     def reset_signing_keys(self, identifier: str) -> dict:
         signing_private_key, signing_public_key = utils.ed25519.generate_ed25519_keys()
         signing_public_key_str = utils.ed25519.public_key_to_string(signing_public_key)
-        query = Query()
         result = self.db.update({
             "signing_private_key": utils.ed25519.private_key_to_string(signing_private_key),
             "signing_public_key": signing_public_key_str,
             "modified_on": int(time.time()),
-        }, query.identifier == identifier)
+        }, {"identifier": identifier}, durability=DURABLE)
 
         if len(result) == 0:
             raise Exception(f"Node {identifier} not found")
+        self.notify(identifier)
         return {
             "identifier": identifier,
             "signing_public_key": signing_public_key_str,
         }
 
+    def add_listener(self, listener: Callable[[str], None]):
+        self.listeners.append(listener)
+
+    def notify(self, identifier: str):
+        for listener in self.listeners:
+            listener(identifier)
+
     def identifier_exists(self, identifier: str) -> bool:
-        query = Query()
-        return self.db.contains(query.identifier == identifier)
+        return self.db.contains({"identifier": identifier})
 
     @staticmethod
     def to_dict(self):
@@ -0,0 +1,39 @@
+from werkzeug.exceptions import NotFound
+
+from rpc import RpcServer
+from schema import schemas
+from .node_manager import NodeManager
+
+GET_SCHEMA = schemas.get("rpc_nodes_get", 1, {
+    "type": "object",
+    "required": ["identifier"],
+    "properties": {
+        "identifier": {"type": "string"},
+    },
+}, "params")
+GET_MANY_SCHEMA = schemas.get("rpc_nodes_get_many", 1, {
+    "type": "object",
+    "required": ["identifiers"],
+    "properties": {
+        "identifiers": {"type": "array", "items": {"type": "string"}, "maxItems": 1000},
+    },
+}, "params")
+
+
+class NodeRpc:
+    def __init__(self, server: RpcServer, manager: NodeManager) -> None:
+        self.server = server
+        self.manager = manager
+
+    def register(self):
+        @self.server.method("nodes.get")
+        def get_node(params):
+            # Errors only reach the caller as a message, so a missing node is told apart as None.
+            try:
+                return self.manager.get(GET_SCHEMA.check(params)["identifier"])
+            except NotFound:
+                return None
+
+        @self.server.method("nodes.get_many")
+        def get_nodes(params):
+            return self.manager.get_many(GET_MANY_SCHEMA.check(params)["identifiers"])
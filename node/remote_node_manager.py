@@ -1,14 +1,58 @@
-import requests
+import time
+
+from werkzeug.exceptions import NotFound
+
+from rpc import RpcClient
+from utils.federation import FederationClient
+from utils.metrics import registry
+
+FETCH_SECONDS = registry.histogram("vertex_remote_node_fetch_seconds", "Time spent fetching nodes from remote vertices",
+                                   ("operation", "result"))
 
 
 class RemoteNodeManager:
-    def __init__(self, federation_protocol: str):
-        self.federation_protocol = federation_protocol
+    def __init__(self, federation_client: FederationClient, batch_size: int = 100, rpc_client: RpcClient = None):
+        self.federation_client = federation_client
+        self.batch_size = batch_size
+        self.rpc_client = rpc_client
 
     def get(self, vertex_endpoint: str, identifier: str) -> dict:
-        response = requests.get("%s://%s/api/v1/nodes/%s", (self.federation_protocol, vertex_endpoint, identifier)).json()
+        response = self.fetch("get", vertex_endpoint, "/api/v1/nodes/%s" % identifier, {"identifier": identifier})
+        if response is None:
+            raise NotFound(f"Node {identifier} not found on vertex {vertex_endpoint}")
+        return self.to_dict(response)
+
+    def get_many(self, vertex_endpoint: str, identifiers: list[str]) -> dict[str, dict]:
+        results = {}
+        for start in range(0, len(identifiers), self.batch_size):
+            batch = identifiers[start:start + self.batch_size]
+            response = self.fetch("get_many", vertex_endpoint, "/api/v1/nodes", {"identifiers": batch}, params={
+                "identifiers": ",".join(batch)
+            })
+            for node in response:
+                results[node["identifier"]] = self.to_dict(node)
+        return results
+
+    def fetch(self, operation: str, vertex_endpoint: str, path: str, rpc_params: dict, **kwargs):
+        started_on = time.perf_counter()
+        result = "error"
+        try:
+            # Node records carry the keys other vertices' tokens are verified with, so they only go over RPC
+            # when it authenticates the peer as HTTPS would.
+            if (self.rpc_client is not None and self.rpc_client.secure() and
+                    self.rpc_client.available(vertex_endpoint)):
+                response = self.rpc_client.call(vertex_endpoint, "nodes." + operation, rpc_params)
+            else:
+                response = self.federation_client.get(vertex_endpoint, path, **kwargs)
+            result = "ok"
+            return response
+        finally:
+            FETCH_SECONDS.observe((operation, result), time.perf_counter() - started_on)
+
+    @staticmethod
+    def to_dict(response: dict) -> dict:
         return {
-            "identifier": identifier,
+            "identifier": response["identifier"],
             "signing_public_key": response["signing_public_key"],
             "description": response["description"],
             "creator": response["creator"],
@@ -0,0 +1,5 @@
+from .rpc_api import RpcApi
+from .rpc_channel import client_context, server_context
+from .rpc_client import RpcClient, RpcConnection
+from .rpc_protocol import RpcError
+from .rpc_server import RpcServer
@@ -0,0 +1,17 @@
+from flask import Flask
+
+from .rpc_server import RpcServer
+
+
+class RpcApi:
+    def __init__(self, app: Flask, server: RpcServer):
+        self.app = app
+        self.server = server
+
+    def register(self):
+        @self.app.get("/api/v1/rpc")
+        def get_rpc():
+            return {
+                "port": self.server.port if self.server.enabled() else None,
+                "tls": self.server.tls_context is not None,
+            }
@@ -0,0 +1,128 @@
+import os
+import socket
+import ssl
+import threading
+
+from requests.utils import DEFAULT_CA_BUNDLE_PATH
+
+READ_SIZE = 64 * 1024
+
+
+def server_context(certificate: str, key: str) -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(certificate, key)
+    return context
+
+
+def client_context() -> ssl.SSLContext:
+    """Verifies servers against the CA bundle the HTTPS federation client uses, honouring the same
+    REQUESTS_CA_BUNDLE and CURL_CA_BUNDLE overrides as requests."""
+    context = ssl.create_default_context(cafile=os.environ.get("REQUESTS_CA_BUNDLE") or
+                                         os.environ.get("CURL_CA_BUNDLE") or DEFAULT_CA_BUNDLE_PATH)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    return context
+
+
+class SocketChannel:
+    """A plain TCP connection that one thread reads from while any number of threads write to it."""
+
+    def __init__(self, connection: socket.socket):
+        self.connection = connection
+        self.stream = connection.makefile("rb")
+        self.send_lock = threading.Lock()
+
+    def handshake(self):
+        pass
+
+    def read(self, size: int) -> bytes:
+        return self.stream.read(size)
+
+    def sendall(self, data: bytes):
+        with self.send_lock:
+            self.connection.sendall(data)
+
+    def settimeout(self, timeout: float | None):
+        self.connection.settimeout(timeout)
+
+    def close(self):
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        if self.stream is not None:
+            self.stream.close()
+        self.connection.close()
+
+
+class TlsChannel(SocketChannel):
+    """A TLS connection that one thread reads from while any number of threads write to it.
+
+    An ``SSLSocket`` must not be read and written from two threads at once, so TLS runs on an ``SSLObject``
+    over memory buffers instead: only encrypting and decrypting hold ``ssl_lock``, and socket writes happen
+    in the order their records were encrypted under ``send_lock``. Records the reader produces, such as
+    handshake replies, wait in the outgoing buffer for the next write; nothing this protocol does after the
+    handshake needs one sooner.
+    """
+
+    def __init__(self, connection: socket.socket, context: ssl.SSLContext, server_side: bool,
+                 server_hostname: str | None = None):
+        self.connection = connection
+        self.stream = None
+        self.send_lock = threading.Lock()
+        self.incoming = ssl.MemoryBIO()
+        self.outgoing = ssl.MemoryBIO()
+        self.tls = context.wrap_bio(self.incoming, self.outgoing, server_side, server_hostname)
+        self.ssl_lock = threading.Lock()
+        self.buffer = bytearray()
+
+    def handshake(self):
+        while True:
+            try:
+                with self.ssl_lock:
+                    self.tls.do_handshake()
+                self.flush()
+                return
+            except ssl.SSLWantReadError:
+                self.flush()
+                if not self.receive():
+                    raise ConnectionError("Connection closed during the TLS handshake")
+
+    def receive(self) -> bool:
+        data = self.connection.recv(READ_SIZE)
+        if not data:
+            return False
+        with self.ssl_lock:
+            self.incoming.write(data)
+        return True
+
+    def flush(self):
+        with self.send_lock:
+            with self.ssl_lock:
+                data = self.outgoing.read()
+            if data:
+                self.connection.sendall(data)
+
+    def read(self, size: int) -> bytes:
+        while len(self.buffer) < size:
+            try:
+                with self.ssl_lock:
+                    data = self.tls.read(READ_SIZE)
+                if not data:
+                    break
+                self.buffer += data
+            except ssl.SSLWantReadError:
+                if not self.receive():
+                    break
+            except ssl.SSLZeroReturnError:
+                break
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def sendall(self, data: bytes):
+        with self.send_lock:
+            with self.ssl_lock:
+                self.tls.write(data)
+                data = self.outgoing.read()
+            self.connection.sendall(data)
@@ -0,0 +1,225 @@
+import itertools
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from typing import Callable
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from werkzeug.exceptions import NotFound
+
+from utils.cache import TTLCache
+from utils.federation import FederationClient
+from utils.metrics import registry
+from .rpc_channel import SocketChannel, TlsChannel
+from .rpc_protocol import CHALLENGE, NOT_AUTHENTICATED, REQUEST, RESPONSE, RpcError, challenge_payload, \
+    encode_frame, read_frame
+
+CLIENT_SECONDS = registry.histogram("vertex_rpc_client_seconds", "Time spent on RPC calls to other vertices",
+                                    ("method", "result"))
+CONNECTIONS = registry.counter("vertex_rpc_connections_total", "RPC connections opened to other vertices")
+
+
+class RpcConnection:
+    """A connection to one vertex that any number of threads can call through at once.
+
+    Requests are written as they are made and a reader thread hands each response to the caller waiting
+    on its request id, so calls overlap instead of queueing behind one another.
+    """
+
+    def __init__(self, vertex_endpoint: str, address: tuple[str, int], connect_timeout: float,
+                 tls_context: ssl.SSLContext | None = None):
+        self.vertex_endpoint = vertex_endpoint
+        connection = socket.create_connection(address, connect_timeout)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if tls_context is not None:
+            self.channel = TlsChannel(connection, tls_context, False, address[0])
+        else:
+            self.channel = SocketChannel(connection)
+        try:
+            self.channel.handshake()
+            challenge = read_frame(self.channel)
+        except ssl.SSLCertVerificationError:
+            self.channel.close()
+            raise
+        except Exception:
+            challenge = None
+        if not isinstance(challenge, list) or len(challenge) != 2 or challenge[0] != CHALLENGE:
+            self.channel.close()
+            raise Exception(f"Vertex {vertex_endpoint} did not open an RPC session")
+        self.channel.settimeout(None)
+        self.nonce = challenge[1]
+        self.authenticated = set()
+        self.authenticating = threading.Lock()
+        self.request_ids = itertools.count(1)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.closed = False
+        CONNECTIONS.inc()
+        threading.Thread(target=self.read, name="rpc-client", daemon=True).start()
+
+    def read(self):
+        try:
+            while True:
+                message = read_frame(self.channel)
+                if message is None:
+                    break
+                _, request_id, error, result = message
+                with self.lock:
+                    future = self.pending.pop(request_id, None)
+                if future is None:
+                    continue
+                if error is not None:
+                    future.set_exception(RpcError(error))
+                else:
+                    future.set_result(result)
+        except Exception:
+            pass
+        finally:
+            self.close()
+
+    def call(self, method: str, params, caller: str | None, timeout: float):
+        future = Future()
+        with self.lock:
+            if self.closed:
+                raise ConnectionError(f"RPC connection to {self.vertex_endpoint} is closed")
+            request_id = next(self.request_ids)
+            self.pending[request_id] = future
+            try:
+                self.channel.sendall(encode_frame([REQUEST, request_id, method, params, caller]))
+            except Exception:
+                del self.pending[request_id]
+                raise
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            with self.lock:
+                self.pending.pop(request_id, None)
+            raise TimeoutError(f"RPC call {method} to {self.vertex_endpoint} timed out")
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            pending, self.pending = self.pending, {}
+        self.channel.close()
+        for future in pending.values():
+            future.set_exception(ConnectionError(f"RPC connection to {self.vertex_endpoint} was closed"))
+
+
+class RpcClient:
+    """Calls methods on other vertices' RPC servers, keeping one connection per vertex.
+
+    A vertex's RPC port is discovered over HTTP and remembered for ``discovery_ttl`` seconds, as is a vertex
+    answering that it has none, so callers can ask ``available`` before every call and fall back to HTTP
+    cheaply. A vertex that cannot be asked is asked again on the next call. Calls
+    on behalf of a local node authenticate it on the connection first, signing with
+    ``private_key(node_identifier)``.
+
+    Nothing goes over RPC unless ``enabled``. With a ``tls_context`` connections are encrypted and the peer's
+    certificate is verified for its host name, and only vertices advertising TLS are used; without one, only
+    vertices serving plain TCP are, and ``secure`` tells callers not to send anything they would not send
+    over unauthenticated HTTP.
+    """
+
+    def __init__(self, federation_client: FederationClient, private_key: Callable[[str], Ed25519PrivateKey],
+                 vertex_endpoint: str, connect_timeout: float = 3, call_timeout: float = 10,
+                 discovery_ttl: float = 300, enabled: bool = False, tls_context: ssl.SSLContext | None = None):
+        self.federation_client = federation_client
+        self.private_key = private_key
+        self.vertex_endpoint = vertex_endpoint
+        self.enabled = enabled
+        self.tls_context = tls_context
+        self.connect_timeout = connect_timeout
+        self.call_timeout = call_timeout
+        self.addresses = TTLCache(10000, discovery_ttl, discovery_ttl)
+        self.connections = {}
+        self.connecting = {}
+        self.lock = threading.Lock()
+
+    def secure(self) -> bool:
+        return self.tls_context is not None
+
+    def available(self, vertex_endpoint: str) -> bool:
+        if not self.enabled:
+            return False
+        try:
+            self.address(vertex_endpoint)
+            return True
+        except Exception:
+            return False
+
+    def address(self, vertex_endpoint: str) -> tuple[str, int]:
+        return self.addresses.get(vertex_endpoint, lambda: self.discover(vertex_endpoint))
+
+    def discover(self, vertex_endpoint: str) -> tuple[str, int]:
+        response = self.federation_client.get(vertex_endpoint, "/api/v1/rpc")
+        port = response.get("port")
+        if not isinstance(port, int) or port <= 0:
+            raise NotFound(f"Vertex {vertex_endpoint} does not serve RPC")
+        if response.get("tls") is not self.secure():
+            raise NotFound(f"Vertex {vertex_endpoint} does not serve RPC over %s" %
+                           ("TLS" if self.secure() else "plain TCP"))
+        return vertex_endpoint.rsplit(":", 1)[0], port
+
+    def connection(self, vertex_endpoint: str) -> RpcConnection:
+        connection = self.connections.get(vertex_endpoint)
+        if connection is not None and not connection.closed:
+            return connection
+        with self.lock:
+            connecting = self.connecting.setdefault(vertex_endpoint, threading.Lock())
+        with connecting:
+            connection = self.connections.get(vertex_endpoint)
+            if connection is None or connection.closed:
+                connection = RpcConnection(vertex_endpoint, self.address(vertex_endpoint), self.connect_timeout,
+                                           self.tls_context)
+                self.connections[vertex_endpoint] = connection
+            return connection
+
+    def call(self, vertex_endpoint: str, method: str, params, node_identifier: str | None = None):
+        """Calls ``method`` on ``vertex_endpoint``, on behalf of the local node ``node_identifier`` if given."""
+        started_on = time.perf_counter()
+        result = "error"
+        try:
+            connection = self.connection(vertex_endpoint)
+            if node_identifier is None:
+                value = connection.call(method, params, None, self.call_timeout)
+            else:
+                caller = "%s/%s" % (self.vertex_endpoint, node_identifier)
+                self.authenticate(connection, caller, node_identifier)
+                try:
+                    value = connection.call(method, params, caller, self.call_timeout)
+                except RpcError as e:
+                    if str(e) != NOT_AUTHENTICATED:
+                        raise
+                    # The server ends a session once the node's key changes; sign again with the current one.
+                    connection.authenticated.discard(caller)
+                    self.authenticate(connection, caller, node_identifier)
+                    value = connection.call(method, params, caller, self.call_timeout)
+            result = "ok"
+            return value
+        finally:
+            CLIENT_SECONDS.observe((method, result), time.perf_counter() - started_on)
+
+    def authenticate(self, connection: RpcConnection, kid: str, node_identifier: str):
+        if kid in connection.authenticated:
+            return
+        with connection.authenticating:
+            if kid in connection.authenticated:
+                return
+            signature = self.private_key(node_identifier).sign(
+                challenge_payload(connection.nonce, connection.vertex_endpoint, kid))
+            connection.call("authenticate", {
+                "kid": kid,
+                "signature": signature,
+            }, None, self.call_timeout)
+            connection.authenticated.add(kid)
+
+    def close(self):
+        with self.lock:
+            connections, self.connections = list(self.connections.values()), {}
+        for connection in connections:
+            connection.close()
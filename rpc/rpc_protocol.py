@@ -0,0 +1,45 @@
+import struct
+
+import msgpack
+
+HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+# Until a node authenticates, a connection can only make small calls such as authenticate itself.
+PRE_AUTH_FRAME_SIZE = 64 * 1024
+NOT_AUTHENTICATED = "Node is not authenticated on this connection"
+
+# Every frame is a msgpack array whose first element is its kind.
+REQUEST = 0  # [REQUEST, request_id, method, params, caller]
+RESPONSE = 1  # [RESPONSE, request_id, error, result]
+CHALLENGE = 2  # [CHALLENGE, nonce], sent by the server when a connection opens
+
+
+class RpcError(Exception):
+    """An error returned by the remote method, as opposed to a failure to reach it."""
+
+
+def encode_frame(message) -> bytes:
+    data = msgpack.packb(message, use_bin_type=True)
+    if len(data) > MAX_FRAME_SIZE:
+        raise Exception(f"RPC frame of {len(data)} bytes exceeds {MAX_FRAME_SIZE} bytes")
+    return HEADER.pack(len(data)) + data
+
+
+def read_frame(stream, max_size: int = MAX_FRAME_SIZE):
+    """Reads one frame from a buffered binary ``stream``; returns None once the peer has closed it."""
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    size, = HEADER.unpack(header)
+    if size > max_size:
+        raise Exception(f"RPC frame of {size} bytes exceeds {max_size} bytes")
+    data = stream.read(size)
+    if len(data) < size:
+        return None
+    return msgpack.unpackb(data, raw=False)
+
+
+def challenge_payload(nonce: bytes, vertex_endpoint: str, kid: str) -> bytes:
+    """What a node signs to authenticate a connection: the server's nonce, the vertex it meant to reach and
+    the node's key id, so a signature cannot be replayed on another connection or vertex."""
+    return b"vertex-rpc\n" + nonce + b"\n" + vertex_endpoint.encode("utf-8") + b"\n" + kid.encode("utf-8")
@@ -0,0 +1,209 @@
+import os
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+from utils.metrics import registry
+from .rpc_channel import SocketChannel, TlsChannel
+from .rpc_protocol import CHALLENGE, NOT_AUTHENTICATED, PRE_AUTH_FRAME_SIZE, REQUEST, RESPONSE, RpcError, \
+    challenge_payload, encode_frame, read_frame
+
+SERVER_SECONDS = registry.histogram("vertex_rpc_server_seconds", "Time spent serving RPC requests",
+                                    ("method", "result"))
+REJECTED = registry.counter("vertex_rpc_rejected_connections_total",
+                            "RPC connections closed on accept because too many were open")
+
+
+class RpcSession:
+    """One client connection and the nodes that have authenticated on it."""
+
+    def __init__(self, channel: SocketChannel, max_in_flight: int):
+        self.channel = channel
+        self.nonce = os.urandom(32)
+        self.nodes = {}
+        self.in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    def send(self, message):
+        self.channel.sendall(encode_frame(message))
+
+
+class RpcServer:
+    """Serves methods to other vertices over long-lived TCP connections.
+
+    A connection opens with a challenge nonce. A node authenticates once per connection by signing it with
+    its Ed25519 key, which ``public_key(kid)`` looks up; after that, requests made on its behalf carry only
+    its address, and each is refused once ``public_key(kid)`` returns another key, so a rotated key ends the
+    sessions it opened. Requests are read as they arrive and run on a shared pool, so one connection can have
+    up to ``max_in_flight`` of them outstanding and responses go back in completion order, matched by
+    request id.
+
+    At most ``max_connections`` connections are served at once. Until a node has authenticated on it, a
+    connection must complete each step, from the TLS handshake on, within ``handshake_timeout`` seconds
+    and may only send small frames; after that it is closed once idle for ``idle_timeout`` seconds.
+    """
+
+    def __init__(self, public_key: Callable[[str], tuple[str, str, Ed25519PublicKey]], vertex_endpoint: str,
+                 host: str = "0.0.0.0", port: int = 0, workers: int = 8, max_in_flight: int = 64,
+                 tls_context: ssl.SSLContext | None = None, max_connections: int = 256,
+                 handshake_timeout: float = 10, idle_timeout: float = 300):
+        self.public_key = public_key
+        self.tls_context = tls_context
+        self.connections = threading.BoundedSemaphore(max_connections)
+        self.handshake_timeout = handshake_timeout
+        self.idle_timeout = idle_timeout
+        self.vertex_endpoint = vertex_endpoint
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.methods = {"authenticate": (self.authenticate, False)}
+        self.listener = None
+        self.executor = None
+
+    def method(self, name: str, authenticated: bool = False) -> Callable:
+        """Registers the decorated function as ``name``. It is called with the request params, preceded by
+        the calling node when ``authenticated``."""
+        def decorator(f):
+            self.methods[name] = (f, authenticated)
+            return f
+
+        return decorator
+
+    def enabled(self) -> bool:
+        return self.port > 0
+
+    def start(self):
+        if not self.enabled() or self.listener is not None:
+            return
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Every gunicorn worker listens on the same port and the kernel spreads connections across them.
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        listener.bind((self.host, self.port))
+        listener.listen(128)
+        self.listener = listener
+        self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix="rpc")
+        threading.Thread(target=self.accept, name="rpc-accept", daemon=True).start()
+
+    def accept(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError:
+                return
+            if not self.connections.acquire(blocking=False):
+                REJECTED.inc()
+                connection.close()
+                continue
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            threading.Thread(target=self.serve, args=(connection,), name="rpc-connection", daemon=True).start()
+
+    def serve(self, connection: socket.socket):
+        try:
+            connection.settimeout(self.handshake_timeout)
+            if self.tls_context is not None:
+                channel = TlsChannel(connection, self.tls_context, True)
+            else:
+                channel = SocketChannel(connection)
+        except Exception:
+            connection.close()
+            self.connections.release()
+            return
+        session = RpcSession(channel, self.max_in_flight)
+        try:
+            channel.handshake()
+            session.send([CHALLENGE, session.nonce])
+            while True:
+                if session.nodes:
+                    channel.settimeout(self.idle_timeout)
+                    message = read_frame(channel)
+                else:
+                    channel.settimeout(self.handshake_timeout)
+                    message = read_frame(channel, PRE_AUTH_FRAME_SIZE)
+                if message is None:
+                    return
+                if not isinstance(message, list) or len(message) != 5 or message[0] != REQUEST:
+                    return
+                # Holding a slot before reading on stops a client that pipelines faster than we serve.
+                session.in_flight.acquire()
+                self.executor.submit(self.handle, session, *message[1:])
+        except Exception:
+            return
+        finally:
+            channel.close()
+            self.connections.release()
+
+    def handle(self, session: RpcSession, request_id: int, method: str, params, caller: str | None):
+        started_on = time.perf_counter()
+        result = "error"
+        try:
+            try:
+                f, authenticated = self.methods.get(method, (None, False))
+                if f is None:
+                    raise RpcError(f"Unknown method {method}")
+                if authenticated:
+                    value = f(self.authenticated_node(session, caller), params)
+                elif f == self.authenticate:
+                    value = f(session, params)
+                else:
+                    value = f(params)
+                response = [RESPONSE, request_id, None, value]
+                result = "ok"
+            except Exception as e:
+                response = [RESPONSE, request_id, str(e) or type(e).__name__, None]
+            try:
+                session.send(response)
+            except OSError:
+                pass
+        finally:
+            session.in_flight.release()
+            SERVER_SECONDS.observe((method if method in self.methods else "unknown", result),
+                                   time.perf_counter() - started_on)
+
+    def authenticate(self, session: RpcSession, params) -> dict:
+        if not isinstance(params, dict) or not isinstance(params.get("kid"), str) or \
+                not isinstance(params.get("signature"), bytes):
+            raise RpcError("kid and signature are required")
+        kid = params["kid"]
+        try:
+            vertex_endpoint, identifier, public_key = self.public_key(kid)
+            public_key.verify(params["signature"], challenge_payload(session.nonce, self.vertex_endpoint, kid))
+        except Exception:
+            raise RpcError("Invalid signature")
+        session.nodes[kid] = ({
+            "identifier": identifier,
+            "vertex_endpoint": vertex_endpoint,
+            "address": kid,
+        }, public_key.public_bytes_raw())
+        return {
+            "address": kid,
+        }
+
+    def authenticated_node(self, session: RpcSession, kid: str | None) -> dict:
+        entry = session.nodes.get(kid)
+        if entry is None:
+            raise RpcError(NOT_AUTHENTICATED)
+        node, key = entry
+        try:
+            current = self.public_key(kid)[2].public_bytes_raw()
+        except Exception:
+            current = None
+        if current != key:
+            # The node's key was rotated or the node is gone since it authenticated.
+            session.nodes.pop(kid, None)
+            raise RpcError(NOT_AUTHENTICATED)
+        return node
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
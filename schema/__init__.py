@@ -0,0 +1,2 @@
+from .schema_compiler import Validator, compile_schema
+from .schema_registry import SchemaRegistry, schemas
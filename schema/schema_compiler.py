@@ -0,0 +1,260 @@
+import ast
+import re
+
+TYPE_CHECKS = {
+    "string": "type(%s) is str",
+    "integer": "type(%s) is int",
+    "number": "type(%s) in (int, float)",
+    "boolean": "type(%s) is bool",
+    "object": "type(%s) is dict",
+    "array": "type(%s) is list",
+    "null": "%s is None",
+}
+KEYWORDS = {
+    "type", "enum", "minLength", "maxLength", "pattern", "minimum", "maximum", "exclusiveMinimum",
+    "exclusiveMaximum", "properties", "required", "additionalProperties", "items", "minItems", "maxItems",
+    "title", "description",
+}
+MAX_DEPTH = 32
+
+
+class Validator:
+    """A schema compiled into a Python function; ``validate`` returns the first error, or None."""
+
+    def __init__(self, schema_id: str, version: int, schema: dict, validate):
+        self.schema_id = schema_id
+        self.version = version
+        self.schema = schema
+        self.validate = validate
+
+    def validate_many(self, values: list) -> list[str | None]:
+        validate = self.validate
+        return [validate(value) for value in values]
+
+    def check(self, value):
+        error = self.validate(value)
+        if error is not None:
+            raise Exception(error)
+        return value
+
+
+class Compiler:
+    """Translates a schema into the source of one function, so validating a value runs straight-line
+    checks instead of walking the schema."""
+
+    def __init__(self, name: str, patterns: bool = True):
+        self.name = name
+        self.patterns = patterns
+        self.lines = []
+        self.constants = {}
+        self.variables = 0
+
+    def constant(self, value) -> str:
+        name = "c%d" % len(self.constants)
+        self.constants[name] = value
+        return name
+
+    def variable(self) -> str:
+        self.variables += 1
+        return "v%d" % self.variables
+
+    def emit(self, indent: int, line: str):
+        self.lines.append("    " * indent + line)
+
+    def fail(self, indent: int, name: str, message: str, prefix: str = ""):
+        try:
+            # Names known when compiling are folded into one constant message.
+            self.emit(indent, "return %r" % (prefix + ast.literal_eval(name) + message))
+        except ValueError:
+            self.emit(indent, "return " + " + ".join([repr(prefix)] * bool(prefix) + [name] +
+                                                     [repr(message)] * bool(message)))
+
+    def drop_empty(self, body: int, headers: int):
+        """Removes the ``headers`` lines opening a block that starts at ``body`` if nothing was emitted in it."""
+        if len(self.lines) == body:
+            del self.lines[body - headers:]
+
+    def compile(self, schema: dict):
+        self.emit(0, "def validate(value):")
+        self.node(schema, "value", None, 1, 0)
+        self.emit(1, "return None")
+        namespace = dict(self.constants, MISSING=MISSING)
+        try:
+            code = compile("\n".join(self.lines), "<schema %s>" % self.name, "exec")
+        except (SyntaxError, RecursionError, MemoryError):
+            # Python caps how deeply blocks nest, which some schemas within MAX_DEPTH still exceed.
+            raise Exception("Invalid schema: nested too deeply")
+        exec(code, namespace)
+        return namespace["validate"]
+
+    def node(self, schema, value: str, path: str | None, indent: int, depth: int):
+        """Emits the checks of ``schema`` on the variable ``value``.
+
+        ``path`` is an expression for the value's name in messages, None for the root. Members of the root
+        are named by their key alone, so messages read like those of ``required_param``.
+        """
+        if not isinstance(schema, dict):
+            raise Exception("Invalid schema: a schema must be an object")
+        if depth > MAX_DEPTH:
+            raise Exception(f"Invalid schema: nested deeper than {MAX_DEPTH} levels")
+        unknown = set(schema) - KEYWORDS
+        if unknown:
+            raise Exception(f"Invalid schema: unknown keyword {sorted(unknown)[0]}")
+        name = path if path is not None else repr(self.name)
+
+        types = schema.get("type", list(TYPE_CHECKS))
+        types = [types] if isinstance(types, str) else types
+        if not isinstance(types, list) or not types or not all(kind in TYPE_CHECKS for kind in types):
+            raise Exception(f"Invalid schema: type must be one or more of {', '.join(TYPE_CHECKS)}")
+        if "type" in schema:
+            self.emit(indent, "if not (%s):" % " or ".join(TYPE_CHECKS[kind] % value for kind in types))
+            self.fail(indent + 1, name, "", "Invalid data type for value of ")
+
+        def guard(kind: str) -> str | None:
+            """Returns the condition that makes a keyword of ``kind`` apply, None if it never does."""
+            if kind not in types and not (kind == "number" and "integer" in types):
+                return None
+            if len(types) == 1:
+                # The type check above already holds.
+                return ""
+            if kind == "number":
+                return "type(%s) in (int, float) and " % value
+            return (TYPE_CHECKS[kind] % value) + " and "
+
+        if "enum" in schema:
+            if not isinstance(schema["enum"], list) or not schema["enum"] or \
+                    not all(item is None or isinstance(item, (str, int, float, bool)) for item in schema["enum"]):
+                raise Exception("Invalid schema: enum must be a list of scalar values")
+            self.emit(indent, "if type(%s) in (dict, list) or %s not in %s:" % (
+                value, value, self.constant(frozenset(schema["enum"]))))
+            self.fail(indent + 1, name, " must be one of %s" % ", ".join(map(str, schema["enum"])))
+
+        for keyword, operator, message in (("minLength", "<", " must be at least %d characters"),
+                                           ("maxLength", ">", " must be at most %d characters")):
+            if keyword in schema:
+                length = self.count(schema, keyword)
+                if guard("string") is not None:
+                    self.emit(indent, "if %slen(%s) %s %d:" % (guard("string"), value, operator, length))
+                    self.fail(indent + 1, name, message % length)
+        if "pattern" in schema:
+            if not self.patterns:
+                raise Exception("Invalid schema: pattern is not supported")
+            try:
+                pattern = re.compile(schema["pattern"])
+            except (re.error, TypeError):
+                raise Exception("Invalid schema: pattern must be a regular expression")
+            if guard("string") is not None:
+                self.emit(indent, "if %snot %s.search(%s):" % (guard("string"), self.constant(pattern), value))
+                self.fail(indent + 1, name, " does not match %s" % schema["pattern"])
+
+        for keyword, operator, message in (("minimum", "<", " must be at least %s"),
+                                           ("maximum", ">", " must be at most %s"),
+                                           ("exclusiveMinimum", "<=", " must be greater than %s"),
+                                           ("exclusiveMaximum", ">=", " must be less than %s")):
+            if keyword in schema:
+                bound = schema[keyword]
+                if isinstance(bound, bool) or not isinstance(bound, (int, float)):
+                    raise Exception(f"Invalid schema: {keyword} must be a number")
+                if guard("number") is not None:
+                    self.emit(indent, "if %s%s %s %r:" % (guard("number"), value, operator, bound))
+                    self.fail(indent + 1, name, message % bound)
+
+        if ("properties" in schema or "required" in schema or "additionalProperties" in schema) and \
+                guard("object") is not None:
+            self.object(schema, value, path, guard("object"), indent, depth)
+        if ("items" in schema or "minItems" in schema or "maxItems" in schema) and guard("array") is not None:
+            self.array(schema, value, name, guard("array"), indent, depth)
+
+    def object(self, schema: dict, value: str, path: str | None, guard: str, indent: int, depth: int):
+        properties = schema.get("properties", {})
+        required = schema.get("required", [])
+        additional = schema.get("additionalProperties", True)
+        if not isinstance(properties, dict):
+            raise Exception("Invalid schema: properties must be an object")
+        if not isinstance(required, list) or not all(isinstance(key, str) for key in required):
+            raise Exception("Invalid schema: required must be a list of property names")
+        if not isinstance(additional, (bool, dict)):
+            raise Exception("Invalid schema: additionalProperties must be a boolean or a schema")
+        if guard:
+            self.emit(indent, "if %s:" % guard[:-len(" and ")])
+            indent += 1
+        start = len(self.lines)
+
+        def member(key) -> str:
+            return repr(key) if path is None else "%s + %r" % (path, "." + key)
+
+        for key, subschema in properties.items():
+            item = self.variable()
+            self.emit(indent, "%s = %s.get(%r, MISSING)" % (item, value, key))
+            if key in required:
+                self.emit(indent, "if %s is MISSING:" % item)
+                self.fail(indent + 1, member(key), " is required")
+                self.node(subschema, item, member(key), indent, depth + 1)
+            else:
+                self.emit(indent, "if %s is not MISSING:" % item)
+                body = len(self.lines)
+                self.node(subschema, item, member(key), indent + 1, depth + 1)
+                self.drop_empty(body, 2)
+        for key in required:
+            if key not in properties:
+                self.emit(indent, "if %r not in %s:" % (key, value))
+                self.fail(indent + 1, member(key), " is required")
+
+        if additional is not True:
+            key, item = self.variable(), self.variable()
+            known = self.constant(frozenset(properties))
+            if additional is False:
+                self.emit(indent, "if not %s.issuperset(%s):" % (known, value))
+                self.emit(indent + 1, "%s = next(%s for %s in %s if %s not in %s)" % (
+                    key, key, key, value, key, known))
+                self.emit(indent + 1, "return %s + ' is not allowed'" % (
+                    key if path is None else "%s + '.' + %s" % (path, key)))
+            else:
+                self.emit(indent, "for %s, %s in %s.items():" % (key, item, value))
+                self.emit(indent + 1, "if %s not in %s:" % (key, known))
+                body = len(self.lines)
+                self.node(additional, item, key if path is None else "%s + '.' + %s" % (path, key), indent + 2,
+                          depth + 1)
+                self.drop_empty(body, 2)
+        self.drop_empty(start, 1 if guard else 0)
+
+    def array(self, schema: dict, value: str, name: str, guard: str, indent: int, depth: int):
+        if guard:
+            self.emit(indent, "if %s:" % guard[:-len(" and ")])
+            indent += 1
+        start = len(self.lines)
+        for keyword, operator, message in (("minItems", "<", " must have at least %d items"),
+                                           ("maxItems", ">", " must have at most %d items")):
+            if keyword in schema:
+                self.emit(indent, "if len(%s) %s %d:" % (value, operator, self.count(schema, keyword)))
+                self.fail(indent + 1, name, message % schema[keyword])
+        if "items" in schema:
+            position, item = self.variable(), self.variable()
+            self.emit(indent, "for %s, %s in enumerate(%s):" % (position, item, value))
+            body = len(self.lines)
+            self.node(schema["items"], item, "%s + '[' + str(%s) + ']'" % (name, position), indent + 1,
+                      depth + 1)
+            self.drop_empty(body, 1)
+        self.drop_empty(start, 1 if guard else 0)
+
+    @staticmethod
+    def count(schema: dict, keyword: str) -> int:
+        count = schema[keyword]
+        if isinstance(count, bool) or not isinstance(count, int) or count < 0:
+            raise Exception(f"Invalid schema: {keyword} must be a non-negative integer")
+        return count
+
+
+MISSING = object()
+
+
+def compile_schema(schema_id: str, version: int, schema: dict, name: str = "Body",
+                   patterns: bool = True) -> Validator:
+    """Compiles ``schema``, a subset of JSON Schema, into a ``Validator``.
+
+    Supported keywords are type, enum, minLength, maxLength, pattern, minimum, maximum, exclusiveMinimum,
+    exclusiveMaximum, properties, required, additionalProperties, items, minItems and maxItems. ``name``
+    stands for the validated value itself in messages. Schemas from untrusted sources should be compiled
+    without ``patterns``, since a backtracking regular expression can take exponential time to match.
+    """
+    return Validator(schema_id, version, schema, Compiler(name, patterns).compile(schema))
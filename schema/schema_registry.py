@@ -0,0 +1,48 @@
+import threading
+from collections import OrderedDict
+
+from .schema_compiler import Validator, compile_schema
+
+
+class SchemaRegistry:
+    """Compiled validators by schema id and version.
+
+    A schema is compiled the first time its version is asked for and reused after that; a new version of
+    the same id compiles anew and leaves the old one to age out. Up to ``max_size`` validators are kept,
+    least recently used first out.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.validators = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, schema_id: str, version: int, schema: dict, name: str = "Body",
+            patterns: bool = True) -> Validator:
+        key = (schema_id, version)
+        with self.lock:
+            validator = self.validators.get(key)
+            if validator is not None:
+                self.validators.move_to_end(key)
+                return validator
+        # Compiling outside the lock lets other schemas be served meanwhile; racing compiles of the same
+        # version produce equivalent validators, and the first one stored wins.
+        validator = compile_schema(schema_id, version, schema, name, patterns)
+        with self.lock:
+            validator = self.validators.setdefault(key, validator)
+            self.validators.move_to_end(key)
+            while len(self.validators) > self.max_size:
+                self.validators.popitem(last=False)
+        return validator
+
+    def evict(self, schema_id: str):
+        with self.lock:
+            for key in [key for key in self.validators if key[0] == schema_id]:
+                del self.validators[key]
+
+    def size(self) -> int:
+        with self.lock:
+            return len(self.validators)
+
+
+schemas = SchemaRegistry()
@@ -0,0 +1,3 @@
+from .storage import Storage, Table, Document, open_storage, BUFFERED, DURABLE
+from .tinydb_storage import TinyDBStorage, TinyDBTable
+from .sqlite_storage import SqliteStorage, SqliteTable
@@ -0,0 +1,118 @@
+import fcntl
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+GENERATION = struct.Struct(">Q")
+
+
+class FileLock:
+    """Reentrant lock shared by the threads of this process and by every other process opening the same path.
+
+    The lock file also carries a generation counter which writers advance so other processes can tell
+    that state they mirror in memory has gone stale.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.fd = None
+        self.pid = None
+        self.depth = 0
+        self.exclusive = False
+
+    @contextmanager
+    def hold(self, exclusive: bool = True):
+        with self.lock:
+            if self.depth == 0:
+                fcntl.flock(self.descriptor(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                self.exclusive = exclusive
+            elif exclusive and not self.exclusive:
+                raise RuntimeError("Cannot upgrade a shared lock to an exclusive lock")
+            self.depth += 1
+            try:
+                yield
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def claim(self) -> bool:
+        """Takes the lock exclusively for the rest of this process's life unless another process holds it."""
+        with self.lock:
+            if self.depth > 0 and self.exclusive:
+                return True
+            try:
+                fcntl.flock(self.descriptor(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            self.exclusive = True
+            self.depth += 1
+            return True
+
+    def claimed(self) -> bool:
+        """Returns whether another process has claimed the lock."""
+        with self.lock:
+            if self.depth > 0:
+                return False
+            try:
+                fcntl.flock(self.descriptor(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            return False
+
+    def generation(self) -> int:
+        data = os.pread(self.descriptor(), GENERATION.size, 0)
+        return GENERATION.unpack(data)[0] if len(data) == GENERATION.size else 0
+
+    def advance(self) -> int:
+        generation = self.generation() + 1
+        os.pwrite(self.descriptor(), GENERATION.pack(generation), 0)
+        return generation
+
+    def descriptor(self) -> int:
+        # A descriptor inherited through fork shares its lock with the parent, so every process opens its own.
+        if self.pid != os.getpid():
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self.pid = os.getpid()
+            self.depth = 0
+        return self.fd
+
+    def close(self):
+        with self.lock:
+            if self.fd is not None and self.pid == os.getpid():
+                os.close(self.fd)
+            self.fd = None
+            self.pid = None
+
+
+class FileSlots:
+    """``count`` slots under ``directory`` shared by every process, each an exclusive lock on its own file.
+
+    The kernel drops the locks of a process that exits, so a crashed process never keeps a slot.
+    """
+
+    def __init__(self, directory: str, count: int):
+        self.directory = directory
+        self.count = count
+        os.makedirs(directory, exist_ok=True)
+
+    def acquire(self, name: str) -> int | None:
+        """Takes a free slot of ``name`` and returns the descriptor to ``release``, or None if all are taken."""
+        # Starting at a different slot each time keeps processes from contending for the first one.
+        first = int.from_bytes(os.urandom(2), "little")
+        for position in range(self.count):
+            fd = os.open(os.path.join(self.directory, "%s.%d" % (name, (first + position) % self.count)),
+                         os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    @staticmethod
+    def release(fd: int):
+        os.close(fd)
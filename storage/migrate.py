@@ -0,0 +1,33 @@
+import argparse
+import json
+import os
+
+from .sqlite_storage import SqliteStorage
+from .storage import Document
+
+
+def migrate(source: str, target: str) -> dict:
+    with open(source) as source_file:
+        data = json.load(source_file)
+
+    storage = SqliteStorage(target)
+    counts = {}
+    for name, documents in data.items():
+        table = storage.table(name)
+        if len(table) != 0:
+            raise Exception(f"Table {name} already has documents in {target}")
+        table.insert_multiple([Document(document, doc_id=int(doc_id)) for doc_id, document in documents.items()])
+        counts[name] = len(documents)
+    storage.close()
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Import a TinyDB meta.json into the SQLite storage backend")
+    parser.add_argument("source", help="path to the existing meta.json")
+    parser.add_argument("target", nargs="?", help="path to the SQLite database, defaults to meta.db next to source")
+    args = parser.parse_args()
+
+    target_path = args.target or os.path.join(os.path.dirname(args.source), "meta.db")
+    for table_name, count in migrate(args.source, target_path).items():
+        print(f"{table_name}: {count} documents")
@@ -0,0 +1,222 @@
+import os
+import re
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Iterator
+
+from utils import fast_json
+from .storage import DURABLE, Document, Storage, Table, timed
+
+FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def field_path(field: str) -> str:
+    if not FIELD_PATTERN.match(field):
+        raise Exception(f"Invalid field name {field}")
+    return field
+
+
+def field_expression(field: str) -> str:
+    return "json_extract(document, '$.%s')" % field_path(field)
+
+
+class SqliteTable(Table):
+    backend = "sqlite"
+
+    def __init__(self, storage: 'SqliteStorage', name: str):
+        if not FIELD_PATTERN.match(name):
+            raise Exception(f"Invalid table name {name}")
+        self.storage = storage
+        self.name = name
+        self.keys = ()
+
+    def create(self, unique: tuple[tuple[str, ...], ...], indexes: tuple[tuple[str, ...], ...]):
+        self.keys = tuple(unique) + tuple(indexes)
+        with self.storage.connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS "%s" '
+                               '(id INTEGER PRIMARY KEY AUTOINCREMENT, document TEXT NOT NULL)' % self.name)
+            for key in unique:
+                self.create_index(connection, key, True)
+            for key in indexes:
+                self.create_index(connection, key, False)
+
+    def create_index(self, connection: sqlite3.Connection, key: tuple[str, ...], unique: bool):
+        connection.execute('CREATE %s INDEX IF NOT EXISTS "%s_%s" ON "%s" (%s)' % (
+            "UNIQUE" if unique else "",
+            self.name,
+            "_".join(key),
+            self.name,
+            ", ".join(field_expression(field) for field in key)
+        ))
+
+    def insert(self, document: dict, durability: str | None = None) -> int:
+        return self.insert_multiple([document], durability)[0]
+
+    @timed("write")
+    def insert_multiple(self, documents: list[dict], durability: str | None = None) -> list[int]:
+        doc_ids = []
+        with self.storage.transaction(durability) as connection:
+            for document in documents:
+                if isinstance(document, Document):
+                    cursor = connection.execute('INSERT INTO "%s" (id, document) VALUES (?, ?)' % self.name,
+                                                (document.doc_id, fast_json.dumps(document)))
+                else:
+                    cursor = connection.execute('INSERT INTO "%s" (document) VALUES (?)' % self.name,
+                                                (fast_json.dumps(document),))
+                doc_ids.append(cursor.lastrowid)
+        return doc_ids
+
+    @timed()
+    def get(self, where: dict) -> Document | None:
+        condition, parameters = self.condition(where)
+        row = self.storage.connection().execute(
+            'SELECT id, document FROM "%s" WHERE %s LIMIT 1' % (self.name, condition), parameters).fetchone()
+        return self.to_document(row) if row else None
+
+    @timed()
+    def search(self, where: dict) -> list[Document]:
+        condition, parameters = self.condition(where)
+        rows = self.storage.connection().execute(
+            'SELECT id, document FROM "%s" WHERE %s ORDER BY id' % (self.name, condition), parameters)
+        return [self.to_document(row) for row in rows]
+
+    @timed()
+    def page(self, where: dict, after: int | None, limit: int) -> list[Document]:
+        return list(self.iterate(where, after, limit))
+
+    def iterate(self, where: dict, after: int | None = None, limit: int = -1) -> Iterator[Document]:
+        condition, parameters = self.condition(where)
+        rows = self.storage.connection().execute(
+            'SELECT id, document FROM "%s" WHERE %s AND id > ? ORDER BY id LIMIT ?' % (self.name, condition),
+            parameters + [after if after is not None else 0, limit])
+        for row in rows:
+            yield self.to_document(row)
+
+    @timed()
+    def contains(self, where: dict) -> bool:
+        condition, parameters = self.condition(where)
+        row = self.storage.connection().execute(
+            'SELECT 1 FROM "%s" WHERE %s LIMIT 1' % (self.name, condition), parameters).fetchone()
+        return row is not None
+
+    @timed("write")
+    def update(self, fields: dict, where: dict, durability: str | None = None) -> list[int]:
+        if len(fields) == 0:
+            raise Exception("Nothing to update")
+        condition, parameters = self.condition(where)
+        assignments = ", ".join("'$.%s', json(?)" % field_path(field) for field in fields)
+        with self.storage.transaction(durability) as connection:
+            doc_ids = [row[0] for row in connection.execute(
+                'SELECT id FROM "%s" WHERE %s' % (self.name, condition), parameters)]
+            if doc_ids:
+                connection.execute('UPDATE "%s" SET document = json_set(document, %s) WHERE id IN (%s)' % (
+                    self.name, assignments, ", ".join("?" * len(doc_ids))
+                ), [fast_json.dumps(value) for value in fields.values()] + doc_ids)
+        return doc_ids
+
+    @timed("write")
+    def remove(self, where: dict, durability: str | None = None) -> list[int]:
+        condition, parameters = self.condition(where)
+        with self.storage.transaction(durability) as connection:
+            doc_ids = [row[0] for row in connection.execute(
+                'SELECT id FROM "%s" WHERE %s' % (self.name, condition), parameters)]
+            if doc_ids:
+                connection.execute('DELETE FROM "%s" WHERE id IN (%s)' % (
+                    self.name, ", ".join("?" * len(doc_ids))), doc_ids)
+        return doc_ids
+
+    @timed("read")
+    def __len__(self) -> int:
+        return self.storage.connection().execute('SELECT COUNT(*) FROM "%s"' % self.name).fetchone()[0]
+
+    def indexed(self, where: dict) -> bool:
+        return any(all(field in where for field in key) for key in self.keys)
+
+    @staticmethod
+    def condition(where: dict) -> (str, list):
+        if len(where) == 0:
+            return "1", []
+        clauses = []
+        parameters = []
+        for field, value in where.items():
+            clauses.append("%s IS ?" % field_expression(field))
+            parameters.append(value)
+        return " AND ".join(clauses), parameters
+
+    @staticmethod
+    def to_document(row: tuple) -> Document:
+        return Document(fast_json.loads(row[1]), doc_id=row[0])
+
+
+class ConnectionHolder:
+    """Holds a thread's connection in its thread-local storage, which drops it when the thread ends."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+
+
+class SqliteStorage(Storage):
+    def __init__(self, path: str):
+        self.path = path
+        self.local = threading.local()
+        self.connections = {}
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def connection(self) -> sqlite3.Connection:
+        if self.pid != os.getpid():
+            # Connections must not be shared with a forked child; abandon the inherited ones without closing
+            # them, since closing one could checkpoint the parent's WAL.
+            for finalizer in self.connections.values():
+                finalizer.detach()
+            self.local = threading.local()
+            self.connections = {}
+            self.pid = os.getpid()
+        holder = getattr(self.local, "holder", None)
+        if holder is None:
+            connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            holder = ConnectionHolder(connection)
+            self.local.holder = holder
+            with self.lock:
+                self.connections[connection] = weakref.finalize(holder, self.release, connection)
+        return holder.connection
+
+    def release(self, connection: sqlite3.Connection):
+        with self.lock:
+            self.connections.pop(connection, None)
+        connection.close()
+
+    @contextmanager
+    def transaction(self, durability: str | None = None) -> Iterator[sqlite3.Connection]:
+        # WAL commits are not fsynced under synchronous=NORMAL; durable writes ask for FULL for their commit.
+        connection = self.connection()
+        durable = durability == DURABLE
+        if durable:
+            connection.execute("PRAGMA synchronous=FULL")
+        try:
+            with connection:
+                yield connection
+        finally:
+            if durable:
+                connection.execute("PRAGMA synchronous=NORMAL")
+
+    def table(self, name: str, unique: tuple[tuple[str, ...], ...] = (),
+              indexes: tuple[tuple[str, ...], ...] = ()) -> SqliteTable:
+        table = SqliteTable(self, name)
+        table.create(unique, indexes)
+        return table
+
+    def tables(self) -> set[str]:
+        rows = self.connection().execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name != 'sqlite_sequence'")
+        return {row[0] for row in rows}
+
+    def close(self):
+        with self.lock:
+            finalizers = list(self.connections.values())
+        for finalizer in finalizers:
+            finalizer()
@@ -0,0 +1,105 @@
+import os
+from functools import wraps
+from typing import Iterator
+
+from utils.metrics import registry
+
+# Durability levels for writes. A buffered write is acknowledged once it is visible to readers and reaches disk
+# with the next group commit; a durable write is acknowledged only after it has been flushed and fsynced.
+BUFFERED = "buffered"
+DURABLE = "durable"
+
+
+OPERATION_SECONDS = registry.histogram("vertex_storage_operation_seconds", "Time spent in storage operations",
+                                       ("backend", "table", "operation"))
+
+
+def timed(operation: str | None = None):
+    """Records the duration of a table method. Lookups are labelled ``read`` when an index covers ``where``
+    (their first argument) and ``scan`` otherwise."""
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(self, *args, **kwargs):
+            label = operation or ("read" if self.indexed(args[0] if args else kwargs["where"]) else "scan")
+            with OPERATION_SECONDS.time((self.backend, self.name, label)):
+                return f(self, *args, **kwargs)
+
+        return decorated
+
+    return decorator
+
+
+class Document(dict):
+    def __init__(self, value: dict, doc_id: int):
+        super().__init__(value)
+        self.doc_id = doc_id
+
+
+class Table:
+    backend = None
+    name = None
+
+    def insert(self, document: dict, durability: str | None = None) -> int:
+        raise NotImplementedError
+
+    def insert_multiple(self, documents: list[dict], durability: str | None = None) -> list[int]:
+        raise NotImplementedError
+
+    def get(self, where: dict) -> Document | None:
+        raise NotImplementedError
+
+    def search(self, where: dict) -> list[Document]:
+        raise NotImplementedError
+
+    def page(self, where: dict, after: int | None, limit: int) -> list[Document]:
+        raise NotImplementedError
+
+    def iterate(self, where: dict, after: int | None = None) -> Iterator[Document]:
+        raise NotImplementedError
+
+    def contains(self, where: dict) -> bool:
+        raise NotImplementedError
+
+    def update(self, fields: dict, where: dict, durability: str | None = None) -> list[int]:
+        raise NotImplementedError
+
+    def remove(self, where: dict, durability: str | None = None) -> list[int]:
+        raise NotImplementedError
+
+    def all(self) -> list[Document]:
+        return self.search({})
+
+    def indexed(self, where: dict) -> bool:
+        return False
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+class Storage:
+    def table(self, name: str, unique: tuple[tuple[str, ...], ...] = (),
+              indexes: tuple[tuple[str, ...], ...] = ()) -> Table:
+        raise NotImplementedError
+
+    def tables(self) -> set[str]:
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_storage(backend: str, data_path: str, commit_window: float = 0, commit_batch: int = 100,
+                 durability: str = BUFFERED) -> Storage:
+    if durability not in (BUFFERED, DURABLE):
+        raise Exception(f"Unknown durability {durability}")
+    if backend == "sqlite":
+        from .sqlite_storage import SqliteStorage
+        return SqliteStorage(os.path.join(data_path, "meta.db"))
+    if backend in (None, "", "tinydb"):
+        from .tinydb_storage import TinyDBStorage
+        return TinyDBStorage(os.path.join(data_path, "meta.json"), commit_window, commit_batch, durability)
+    raise Exception(f"Unknown storage backend {backend}")
@@ -0,0 +1,407 @@
+import atexit
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from tinydb import TinyDB
+from tinydb.storages import JSONStorage
+from tinydb.table import Document
+import tinydb.storages
+import tinydb.table
+
+from .file_lock import FileLock
+from .storage import BUFFERED, DURABLE, Storage, Table, timed
+
+BUFFERED_ELSEWHERE = ("Storage is written with a commit window by another process; run a single worker or set "
+                      "STORAGE_COMMIT_WINDOW_MS to 0")
+
+
+class TinyDBTable(Table):
+    backend = "tinydb"
+
+    def __init__(self, table: tinydb.table.Table, storage: "TinyDBStorage",
+                 unique: tuple[tuple[str, ...], ...], indexes: tuple[tuple[str, ...], ...]):
+        self.table = table
+        self.name = table.name
+        self.storage = storage
+        self.unique = unique
+        self.keys = tuple(unique) + tuple(key for key in indexes if key not in unique)
+        self.documents = None
+        self.ids = []
+        self.indexes = {}
+
+    def insert(self, document: dict, durability: str | None = None) -> int:
+        return self.insert_multiple([document], durability)[0]
+
+    @timed("write")
+    def insert_multiple(self, documents: list[dict], durability: str | None = None) -> list[int]:
+        with self.storage.locked(write=True):
+            self.load()
+            self.check_unique(documents)
+            doc_ids = self.table.insert_multiple(documents)
+            for doc_id, document in zip(doc_ids, documents):
+                self.add(Document(dict(document), doc_id))
+        self.storage.commit(durability)
+        return doc_ids
+
+    @timed()
+    def get(self, where: dict) -> Document | None:
+        with self.storage.locked():
+            for doc_id in self.find(where):
+                return self.copy(doc_id)
+            return None
+
+    @timed()
+    def search(self, where: dict) -> list[Document]:
+        with self.storage.locked():
+            return [self.copy(doc_id) for doc_id in sorted(self.find(where))]
+
+    @timed()
+    def page(self, where: dict, after: int | None, limit: int) -> list[Document]:
+        with self.storage.locked():
+            return [self.copy(doc_id) for doc_id in self.ordered(where, after, limit)]
+
+    def iterate(self, where: dict, after: int | None = None) -> Iterator[Document]:
+        while True:
+            documents = self.page(where, after, 100)
+            yield from documents
+            if len(documents) < 100:
+                return
+            after = documents[-1].doc_id
+
+    @timed()
+    def contains(self, where: dict) -> bool:
+        with self.storage.locked():
+            for _ in self.find(where):
+                return True
+            return False
+
+    @timed("write")
+    def update(self, fields: dict, where: dict, durability: str | None = None) -> list[int]:
+        with self.storage.locked(write=True):
+            doc_ids = list(self.find(where))
+            if not doc_ids:
+                return []
+            for key in self.unique:
+                if not any(field in fields for field in key):
+                    continue
+                for doc_id in doc_ids:
+                    value = self.value({**self.documents[doc_id], **fields}, key)
+                    if len(doc_ids) > 1 or self.indexes[key].get(value, set()) - {doc_id}:
+                        raise Exception(f"Duplicate value {value} for {key}")
+            self.table.update(fields, doc_ids=doc_ids)
+            for doc_id in doc_ids:
+                document = self.documents[doc_id]
+                self.unindex(document)
+                document.update(fields)
+                self.index(document)
+        self.storage.commit(durability)
+        return doc_ids
+
+    @timed("write")
+    def remove(self, where: dict, durability: str | None = None) -> list[int]:
+        with self.storage.locked(write=True):
+            doc_ids = list(self.find(where))
+            if not doc_ids:
+                return []
+            self.table.remove(doc_ids=doc_ids)
+            for doc_id in doc_ids:
+                self.discard(self.documents[doc_id])
+        self.storage.commit(durability)
+        return doc_ids
+
+    @timed("read")
+    def __len__(self) -> int:
+        with self.storage.locked():
+            self.load()
+            return len(self.documents)
+
+    def reset(self):
+        self.table = tinydb.table.Table(self.table.storage, self.table.name)
+        self.documents = None
+        self.ids = []
+        self.indexes = {}
+
+    def load(self):
+        if self.documents is not None:
+            return
+        self.documents = {}
+        self.ids = []
+        self.indexes = {key: {} for key in self.keys}
+        for document in self.table.all():
+            self.add(Document(dict(document), document.doc_id))
+
+    def add(self, document: Document):
+        self.documents[document.doc_id] = document
+        if not self.ids or document.doc_id > self.ids[-1]:
+            self.ids.append(document.doc_id)
+        else:
+            bisect.insort(self.ids, document.doc_id)
+        self.index(document)
+
+    def discard(self, document: Document):
+        self.documents.pop(document.doc_id, None)
+        position = bisect.bisect_left(self.ids, document.doc_id)
+        if position < len(self.ids) and self.ids[position] == document.doc_id:
+            del self.ids[position]
+        self.unindex(document)
+
+    def index(self, document: Document):
+        for key, index in self.indexes.items():
+            index.setdefault(self.value(document, key), set()).add(document.doc_id)
+
+    def unindex(self, document: Document):
+        for key, index in self.indexes.items():
+            value = self.value(document, key)
+            doc_ids = index.get(value)
+            if doc_ids is not None:
+                doc_ids.discard(document.doc_id)
+                if not doc_ids:
+                    del index[value]
+
+    def find(self, where: dict):
+        self.load()
+        key = self.best_key(where)
+        if key is None:
+            candidates = self.documents.keys()
+        else:
+            candidates = self.indexes[key].get(tuple(where[field] for field in key), ())
+            if len(key) == len(where):
+                return candidates
+        return [doc_id for doc_id in candidates if self.matches(self.documents[doc_id], where)]
+
+    def ordered(self, where: dict, after: int | None, limit: int) -> list[int]:
+        self.load()
+        if self.best_key(where) is None:
+            start = bisect.bisect_right(self.ids, after) if after is not None else 0
+            candidates = (self.ids[position] for position in range(start, len(self.ids)))
+        else:
+            candidates = sorted(doc_id for doc_id in self.find(where) if after is None or doc_id > after)
+        doc_ids = []
+        for doc_id in candidates:
+            if len(doc_ids) >= limit:
+                break
+            if self.matches(self.documents[doc_id], where):
+                doc_ids.append(doc_id)
+        return doc_ids
+
+    def indexed(self, where: dict) -> bool:
+        return self.best_key(where) is not None
+
+    def best_key(self, where: dict) -> tuple[str, ...] | None:
+        best = None
+        for key in self.keys:
+            if all(field in where for field in key):
+                if key in self.unique:
+                    return key
+                if best is None or len(key) > len(best):
+                    best = key
+        return best
+
+    def check_unique(self, documents: list[dict]):
+        for key in self.unique:
+            seen = set()
+            for document in documents:
+                value = self.value(document, key)
+                if value in seen or value in self.indexes[key]:
+                    raise Exception(f"Duplicate value {value} for {key}")
+                seen.add(value)
+
+    def copy(self, doc_id: int) -> Document:
+        return Document(dict(self.documents[doc_id]), doc_id)
+
+    @staticmethod
+    def value(document: dict, key: tuple[str, ...]) -> tuple:
+        return tuple(document.get(field) for field in key)
+
+    @staticmethod
+    def matches(document: dict, where: dict) -> bool:
+        for field, value in where.items():
+            if field not in document or document[field] != value:
+                return False
+        return True
+
+
+class BufferedJSONStorage(tinydb.storages.Storage):
+    """Keeps the database in memory and writes it to the JSON file only when flushed."""
+
+    def __init__(self, path: str, **kwargs):
+        self.storage = JSONStorage(path, **kwargs)
+        self.data = None
+        self.dirty = False
+
+    def read(self) -> dict | None:
+        if self.data is None:
+            self.data = self.storage.read()
+        return self.data
+
+    def write(self, data: dict):
+        self.data = data
+        self.dirty = True
+
+    def flush(self):
+        if self.dirty:
+            self.storage.write(self.data)
+            self.dirty = False
+
+    def invalidate(self):
+        if not self.dirty:
+            self.data = None
+
+    def close(self):
+        self.storage.close()
+
+
+class TinyDBStorage(Storage):
+    """TinyDB backed storage which stays consistent when several processes open the same file.
+
+    Every operation holds a lock on a sibling lock file, shared for reads and exclusive for writes. Writers
+    advance the generation stored in the lock file, and a process which sees a generation it did not write
+    drops its in-memory mirrors so they are rebuilt from the file.
+
+    With a ``commit_window`` writes are group committed: they are applied in memory and a background thread
+    rewrites and fsyncs the file once per window, or sooner once ``commit_batch`` writes are pending. Writes
+    with ``DURABLE`` durability wait for the flush that covers them. Buffered writes are not visible to other
+    processes until flushed and a flush rewrites the whole file, so the first buffered write claims a writer
+    lock that it keeps until closed, and buffered writes from any other process fail instead of overwriting
+    its changes. Other processes can still read.
+    """
+
+    def __init__(self, path: str, commit_window: float = 0, commit_batch: int = 100,
+                 durability: str = BUFFERED):
+        self.buffered = commit_window > 0
+        self.db = TinyDB(path, storage=BufferedJSONStorage if self.buffered else JSONStorage)
+        self.lock = FileLock(path + ".lock")
+        self.writer = FileLock(path + ".writer")
+        self.generation = self.lock.generation()
+        self.opened = []
+        self.commit_window = commit_window
+        self.commit_batch = commit_batch
+        self.durability = durability
+        self.condition = threading.Condition()
+        self.written = 0
+        self.flushed = 0
+        self.pending_since = None
+        self.error = None
+        self.flusher = None
+        self.flusher_pid = None
+        self.closed = False
+        if self.buffered:
+            atexit.register(self.close)
+
+    def table(self, name: str, unique: tuple[tuple[str, ...], ...] = (),
+              indexes: tuple[tuple[str, ...], ...] = ()) -> TinyDBTable:
+        table = TinyDBTable(self.db.table(name), self, unique, indexes)
+        self.opened.append(table)
+        return table
+
+    @contextmanager
+    def locked(self, write: bool = False):
+        if write and self.buffered and not self.writer.claim():
+            raise Exception(BUFFERED_ELSEWHERE)
+        with self.lock.hold(exclusive=write):
+            if write and not self.buffered and self.writer.claimed():
+                raise Exception(BUFFERED_ELSEWHERE)
+            generation = self.lock.generation()
+            if generation != self.generation:
+                if self.buffered:
+                    self.db.storage.invalidate()
+                for table in self.opened:
+                    table.reset()
+                self.generation = generation
+            try:
+                yield
+            finally:
+                if write and self.buffered:
+                    with self.condition:
+                        self.written += 1
+                        if self.pending_since is None:
+                            self.pending_since = time.monotonic()
+                        self.start()
+                        self.condition.notify_all()
+                elif write:
+                    self.generation = self.lock.advance()
+
+    def commit(self, durability: str | None):
+        if self.buffered and (durability or self.durability) == DURABLE:
+            self.wait()
+
+    def wait(self):
+        """Blocks until every write made so far has been flushed to disk."""
+        with self.condition:
+            target = self.written
+            while self.flushed < target:
+                if self.error is not None:
+                    raise Exception(f"Failed to flush storage: {self.error}")
+                self.start()
+                self.condition.wait()
+
+    def start(self):
+        if self.flusher is None or self.flusher_pid != os.getpid():
+            self.flusher = threading.Thread(target=self.run, name="tinydb-group-commit", daemon=True)
+            self.flusher_pid = os.getpid()
+            self.flusher.start()
+
+    def run(self):
+        with self.condition:
+            while True:
+                while self.written == self.flushed and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                deadline = self.pending_since + (self.commit_window if self.error is None
+                                                 else max(self.commit_window, 1))
+                while self.written - self.flushed < self.commit_batch and not self.closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                self.condition.release()
+                try:
+                    self.flush()
+                except Exception:
+                    pass
+                finally:
+                    self.condition.acquire()
+
+    def flush(self):
+        if not self.buffered:
+            return
+        with self.lock.hold(exclusive=True):
+            target = self.written
+            if target == self.flushed:
+                return
+            try:
+                self.db.storage.flush()
+                self.generation = self.lock.advance()
+            except Exception as e:
+                with self.condition:
+                    self.error = e
+                    self.pending_since = time.monotonic()
+                    self.condition.notify_all()
+                raise
+            with self.condition:
+                self.flushed = target
+                self.pending_since = None if self.written == target else time.monotonic()
+                self.error = None
+                self.condition.notify_all()
+
+    def tables(self) -> set[str]:
+        with self.locked():
+            return self.db.tables()
+
+    def close(self):
+        if self.buffered:
+            with self.condition:
+                self.closed = True
+                self.condition.notify_all()
+            if self.flusher is not None and self.flusher_pid == os.getpid() and \
+                    self.flusher is not threading.current_thread():
+                self.flusher.join()
+            self.flush()
+        self.db.close()
+        self.lock.close()
+        self.writer.close()
@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.update({
+    "JWT_SIGNING_KEY": "test-signing-key-" + "x" * 32,
+    "VERTEX_ENDPOINT": "127.0.0.1:5000",
+    "DATA_PATH": tempfile.mkdtemp(prefix="vertex-test-"),
+    "FEDERATION_PROTOCOL": "http",
+    "PASSWORD_HASHER_WORKERS": "0",
+    "RPC_PORT": "0",
+    "BUCKET_CHUNK_SIZE": "1024",
+})
+
+
+@pytest.fixture(scope="session")
+def app():
+    from main import app
+    return app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture(scope="session")
+def admin_token(client):
+    client.post("/api/v1/admins/init", json={"username": "admin", "password": "admin-password"})
+    return client.post("/api/v1/admins/token", json={"username": "admin", "password": "admin-password"}).get_json()["token"]
+
+
+@pytest.fixture(scope="session")
+def node(client, admin_token):
+    client.post("/api/v1/nodes", json={"identifier": "test"}, headers={"Authorization": "Bearer " + admin_token})
+    return "test"
+
+
+@pytest.fixture(scope="session")
+def actor_token(client, node):
+    client.post("/api/v1/nodes/%s/actors/signup" % node, json={
+        "identifier": "actor",
+        "password": "actor-password",
+        "type": "person",
+        "display_name": "Actor",
+    })
+    return client.post("/api/v1/nodes/%s/actors/token" % node, json={
+        "identifier": "actor",
+        "password": "actor-password",
+    }).get_json()["token"]
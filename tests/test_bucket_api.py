@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+
+def headers(token: str, **extra) -> dict:
+    return {"Authorization": "Bearer " + token, **extra}
+
+
+# Spans three chunks of the 1 KiB chunk size the tests run with.
+DATA = os.urandom(3000)
+
+
+@pytest.fixture(scope="module")
+def stored(client, node, actor_token) -> str:
+    client.post("/api/v1/nodes/%s/buckets" % node, json={"identifier": "ranges"}, headers=headers(actor_token))
+    url = "/api/v1/nodes/%s/buckets/ranges/objects/data.bin" % node
+    response = client.put(url, data=DATA, headers=headers(actor_token, **{"Content-Type": "application/octet-stream"}))
+    assert response.status_code == 200, response.get_json()
+    return url
+
+
+def get(client, url, token, **extra):
+    return client.get(url, headers=headers(token, **extra))
+
+
+def test_whole_object(client, stored, actor_token):
+    response = get(client, stored, actor_token)
+    assert response.status_code == 200
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.data == DATA
+    assert get(client, stored, actor_token, **{"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+
+@pytest.mark.parametrize("header, start, stop", [
+    ("bytes=0-99", 0, 100),
+    ("bytes=1000-2100", 1000, 2101),
+    ("bytes=2990-", 2990, 3000),
+    ("bytes=-10", 2990, 3000),
+    ("bytes=1024-2047", 1024, 2048),
+])
+def test_single_ranges(client, stored, actor_token, header, start, stop):
+    response = get(client, stored, actor_token, Range=header)
+    assert response.status_code == 206
+    assert response.headers["Content-Range"] == "bytes %d-%d/3000" % (start, stop - 1)
+    assert response.headers["Content-Length"] == str(stop - start)
+    assert response.data == DATA[start:stop]
+
+
+def test_unsatisfiable_and_multiple_ranges(client, stored, actor_token):
+    response = get(client, stored, actor_token, Range="bytes=3000-")
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == "bytes */3000"
+
+    # Multiple ranges are not served; the whole object is.
+    response = get(client, stored, actor_token, Range="bytes=0-1,5-6")
+    assert response.status_code == 200
+    assert response.data == DATA
+
+
+def test_if_range(client, stored, actor_token):
+    etag = get(client, stored, actor_token).headers["ETag"]
+    response = get(client, stored, actor_token, Range="bytes=0-9", **{"If-Range": etag})
+    assert response.status_code == 206
+    assert response.data == DATA[:10]
+
+    response = get(client, stored, actor_token, Range="bytes=0-9", **{"If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.data == DATA
@@ -0,0 +1,86 @@
+import hashlib
+
+import pytest
+
+
+def headers(token: str) -> dict:
+    return {"Authorization": "Bearer " + token}
+
+
+def digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture(scope="module")
+def other_token(client, node):
+    client.post("/api/v1/nodes/%s/actors/signup" % node, json={
+        "identifier": "mallory",
+        "password": "mallory-password",
+        "type": "person",
+        "display_name": "Mallory",
+    })
+    return client.post("/api/v1/nodes/%s/actors/token" % node, json={
+        "identifier": "mallory",
+        "password": "mallory-password",
+    }).get_json()["token"]
+
+
+def create_bundle(client, node, token, identifier) -> str:
+    response = client.post("/api/v1/nodes/%s/bundles" % node, json={"identifier": identifier}, headers=headers(token))
+    assert response.status_code == 200, response.get_json()
+    return "/api/v1/nodes/%s/bundles/%s" % (node, identifier)
+
+
+def upload(client, bundle, token, data: bytes):
+    response = client.put(bundle + "/chunks/" + digest(data), data=data, headers=headers(token))
+    assert response.status_code == 200, response.get_json()
+
+
+def deploy(client, bundle, token, files: dict[str, list[bytes]]) -> dict:
+    return client.put(bundle + "/manifest", json={
+        "files": [{"path": path, "chunks": [digest(chunk) for chunk in chunks]} for path, chunks in files.items()],
+    }, headers=headers(token)).get_json()
+
+
+def missing(client, bundle, token, chunks: list[bytes]) -> list[str]:
+    return client.post(bundle + "/chunks/missing", json={"digests": [digest(chunk) for chunk in chunks]},
+                       headers=headers(token)).get_json()["missing"]
+
+
+def test_delta_deploy(client, node, actor_token):
+    bundle = create_bundle(client, node, actor_token, "delta")
+    first, second, third = b"first chunk", b"second chunk", b"third chunk"
+    assert missing(client, bundle, actor_token, [first, second]) == [digest(first), digest(second)]
+    upload(client, bundle, actor_token, first)
+    upload(client, bundle, actor_token, second)
+    assert deploy(client, bundle, actor_token, {"app/main.py": [first, second]})["changed"] is True
+
+    # Only the new chunk has to be uploaded for the next version.
+    assert missing(client, bundle, actor_token, [first, second, third]) == [digest(third)]
+    assert deploy(client, bundle, actor_token, {"app/main.py": [first, third]})["missing"] == [digest(third)]
+    upload(client, bundle, actor_token, third)
+    assert deploy(client, bundle, actor_token, {"app/main.py": [first, third]})["changed"] is True
+    assert deploy(client, bundle, actor_token, {"app/main.py": [first, third]})["changed"] is False
+
+    response = client.get(bundle + "/files/app/main.py", headers=headers(actor_token))
+    assert response.status_code == 200
+    assert response.data == first + third
+
+
+def test_chunks_of_other_owners_are_missing(client, node, actor_token, other_token):
+    secret = b"alice's secret content"
+    alice = create_bundle(client, node, actor_token, "alice")
+    upload(client, alice, actor_token, secret)
+    assert deploy(client, alice, actor_token, {"secret.txt": [secret]})["missing"] == []
+
+    mallory = create_bundle(client, node, other_token, "mallory")
+    assert missing(client, mallory, other_token, [secret]) == [digest(secret)]
+    result = deploy(client, mallory, other_token, {"secret.txt": [secret]})
+    assert result["digest"] is None
+    assert result["missing"] == [digest(secret)]
+    assert client.get(mallory + "/files/secret.txt", headers=headers(other_token)).status_code != 200
+
+    # Uploading the content proves Mallory holds it, after which the stored chunk is shared.
+    upload(client, mallory, other_token, secret)
+    assert deploy(client, mallory, other_token, {"secret.txt": [secret]})["missing"] == []
+    assert client.get(mallory + "/files/secret.txt", headers=headers(other_token)).data == secret
@@ -0,0 +1,136 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def collection(client, node, actor_token):
+    response = client.post("/api/v1/nodes/%s/collections" % node, json={
+        "identifier": "people",
+        "indexes": {"age": "range", "city": "equality"},
+        "schema": {
+            "type": "object",
+            "required": ["name", "age"],
+            "properties": {
+                "name": {"type": "string"},
+                "age": {"type": "integer", "minimum": 0},
+                "city": {"type": "string"},
+            },
+        },
+    }, headers=headers(actor_token))
+    assert response.status_code == 200, response.get_json()
+    return "/api/v1/nodes/%s/collections/people" % node
+
+
+def headers(token: str) -> dict:
+    return {"Authorization": "Bearer " + token}
+
+
+def insert(client, collection, actor_token, documents: list[dict]) -> list[int]:
+    response = client.post(collection + "/documents", json={"documents": documents}, headers=headers(actor_token))
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()["ids"]
+
+
+def test_get_document(client, collection, actor_token):
+    document_id, = insert(client, collection, actor_token, [{"name": "Ada", "age": 36, "city": "London"}])
+
+    response = client.get(collection + "/documents/%d" % document_id, headers=headers(actor_token))
+
+    assert response.status_code == 200
+    assert response.get_json() == {"id": document_id, "document": {"name": "Ada", "age": 36, "city": "London"}}
+
+
+def test_get_missing_document(client, collection, actor_token):
+    response = client.get(collection + "/documents/999999", headers=headers(actor_token))
+
+    assert response.status_code == 500
+    assert response.get_json()["success"] is False
+
+
+def test_replace_and_delete_document(client, collection, actor_token):
+    document_id, = insert(client, collection, actor_token, [{"name": "Alan", "age": 41}])
+
+    response = client.put(collection + "/documents/%d" % document_id, json={
+        "document": {"name": "Alan", "age": 42, "city": "Manchester"},
+    }, headers=headers(actor_token))
+    assert response.status_code == 200
+    assert client.get(collection + "/documents/%d" % document_id,
+                      headers=headers(actor_token)).get_json()["document"]["age"] == 42
+
+    assert client.delete(collection + "/documents/%d" % document_id, headers=headers(actor_token)).status_code == 200
+    assert client.get(collection + "/documents/%d" % document_id, headers=headers(actor_token)).status_code == 500
+
+
+def test_insert_rejects_invalid_documents(client, collection, actor_token):
+    response = client.post(collection + "/documents", json={
+        "documents": [{"name": "Grace", "age": 85}, {"name": "Nobody", "age": -1}],
+    }, headers=headers(actor_token))
+
+    assert response.status_code == 500
+    assert "Document 1 is invalid" in response.get_json()["message"]
+
+
+def test_query_by_index(client, collection, actor_token):
+    insert(client, collection, actor_token, [{"name": "P%d" % i, "age": 100 + i, "city": "Paris"} for i in range(5)])
+
+    response = client.post(collection + "/query", json={
+        "where": {"age": {"$gte": 102}, "city": "Paris"},
+        "fields": ["name"],
+        "order_by": "age",
+        "limit": 2,
+    }, headers=headers(actor_token))
+    assert response.status_code == 200, response.get_json()
+    page = response.get_json()
+    assert [result["document"] for result in page["results"]] == [{"name": "P2"}, {"name": "P3"}]
+
+    response = client.post(collection + "/query", json={
+        "where": {"age": {"$gte": 102}, "city": "Paris"},
+        "fields": ["name"],
+        "order_by": "age",
+        "limit": 2,
+        "cursor": page["next"],
+    }, headers=headers(actor_token))
+    assert [result["document"] for result in response.get_json()["results"]] == [{"name": "P4"}]
+
+
+def test_aggregate(client, collection, actor_token):
+    insert(client, collection, actor_token, [{"name": "B%d" % i, "age": 20 + i, "city": "Berlin"} for i in range(4)])
+
+    response = client.post(collection + "/aggregate", json={
+        "where": {"city": "Berlin"},
+        "aggregates": {"oldest": {"$max": "age"}},
+    }, headers=headers(actor_token))
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()["groups"][0]["count"] == 4
+    assert response.get_json()["groups"][0]["oldest"] == 23
+
+
+def test_collection_requires_token(client, collection):
+    response = client.get(collection, headers=headers("invalid"))
+
+    assert response.status_code != 200
+    assert response.get_json()["success"] is False
+
+
+def test_schema_rejects_patterns(client, node, actor_token):
+    response = client.post("/api/v1/nodes/%s/collections" % node, json={
+        "identifier": "patterns",
+        "schema": {"type": "string", "pattern": "^(a+)+$"},
+    }, headers=headers(actor_token))
+
+    assert response.status_code == 500
+    assert response.get_json()["message"] == "Invalid schema: pattern is not supported"
+
+
+def test_schema_rejects_deep_nesting(client, node, actor_token):
+    schema = {"type": "string"}
+    for _ in range(32):
+        schema = {"type": ["object", "null"], "additionalProperties": schema}
+
+    response = client.post("/api/v1/nodes/%s/collections" % node, json={
+        "identifier": "nested",
+        "schema": schema,
+    }, headers=headers(actor_token))
+
+    assert response.status_code == 500
+    assert response.get_json()["message"] == "Invalid schema: nested too deeply"
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+
+import pytest
+
+from collection.document_store import DocumentStore
+from collection.query_planner import normalize, plan
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DocumentStore(os.path.join(tmp_path, "documents.db"))
+    yield store
+    store.close()
+
+
+def query(store, collection_id, where, indexes, order_by=None, limit=50, cursor=None):
+    conditions = normalize(where)
+    return store.query(collection_id, plan(conditions, indexes, order_by), conditions, None, limit, cursor)
+
+
+def ids(page) -> list[int]:
+    return [result["id"] for result in page["results"]]
+
+
+def test_index_follows_replace_and_delete(store):
+    first, second, third = store.insert(1, [{"age": 30}, {"age": 40}, {"name": "no age"}])
+    store.create_index(1, "age")
+    indexes = {"age": "range"}
+    assert query(store, 1, {"age": {"$gte": 0}}, indexes)["plan"] == {"index": "age", "strategy": "range"}
+    assert ids(query(store, 1, {"age": {"$gte": 0}}, indexes)) == [first, second]
+
+    store.replace(1, first, {"age": 50})
+    store.replace(1, third, {"age": 35})
+    store.delete(1, second)
+
+    assert ids(query(store, 1, {"age": 50}, indexes)) == [first]
+    assert ids(query(store, 1, {"age": 30}, indexes)) == []
+    assert ids(query(store, 1, {"age": {"$gte": 0}}, indexes)) == [third, first]
+
+
+def test_null_conditions_do_not_read_the_index(store):
+    store.create_index(1, "age")
+    with_age, without_age, null_age = store.insert(1, [{"age": 1}, {}, {"age": None}])
+
+    page = query(store, 1, {"age": None}, {"age": "range"})
+
+    assert page["plan"]["strategy"] == "scan"
+    assert ids(page) == [without_age, null_age]
+    assert ids(query(store, 1, {}, {"age": "range"}, "age")) == [with_age]
+
+
+def test_keyset_pages_through_equal_values(store):
+    store.create_index(1, "group")
+    inserted = store.insert(1, [{"group": "b" if i % 2 else "a"} for i in range(7)])
+    indexes = {"group": "range"}
+
+    seen = []
+    cursor = None
+    while True:
+        page = query(store, 1, {}, indexes, "group", 2, cursor)
+        seen.extend(ids(page))
+        cursor = page["next"]
+        if cursor is None:
+            break
+
+    assert seen == inserted[0::2] + inserted[1::2]
+
+
+def test_indexes_are_kept_per_collection(store):
+    for collection_id in range(2, 50):
+        store.create_index(collection_id, "age")
+        store.create_index(collection_id, "name")
+    store.create_index(1, "age")
+    document_id, = store.insert(1, [{"age": 7, "name": "x"}])
+
+    connection = store.storage.connection()
+    assert connection.execute("SELECT collection_id, field FROM entries WHERE document_id = ?",
+                              (document_id,)).fetchall() == [(1, "age")]
+
+    store.drop(1)
+    assert connection.execute("SELECT COUNT(*) FROM entries WHERE collection_id = 1").fetchone() == (0,)
+
+
+def test_legacy_partial_indexes_are_migrated(tmp_path):
+    path = os.path.join(tmp_path, "documents.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE documents (id INTEGER PRIMARY KEY AUTOINCREMENT, collection_id INTEGER NOT NULL, "
+                       "document TEXT NOT NULL)")
+    connection.execute("""INSERT INTO documents (collection_id, document) VALUES (4, '{"a": {"b": 2}}')""")
+    connection.execute("""CREATE INDEX "collection_4_a__b" ON documents (json_extract(document, '$.a.b')) """
+                       "WHERE collection_id = 4")
+    connection.commit()
+    connection.close()
+
+    store = DocumentStore(path)
+    try:
+        assert ids(query(store, 4, {"a.b": 2}, {"a.b": "equality"})) == [1]
+        assert store.storage.connection().execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name LIKE 'collection_%'").fetchone() == (0,)
+    finally:
+        store.close()
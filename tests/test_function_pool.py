@@ -0,0 +1,63 @@
+import hashlib
+import os
+import signal
+import time
+
+import pytest
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+from function import FunctionPool
+from storage.file_lock import FileSlots
+
+SOURCE = "def handle(payload, context):\n    return payload * 2\n"
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = FunctionPool(workers=1, max_workers=2, max_per_node=1, queue_timeout=0.2,
+                        slots_path=str(tmp_path / "functions"))
+    pool.start()
+    yield pool
+    pool.close()
+
+
+def invoke(pool, node_identifier: str):
+    return pool.invoke(node_identifier, "key", SOURCE, "handle", 21, {}, 5, 256 * 1024 * 1024)["result"]
+
+
+def test_limits_hold_across_processes(pool, tmp_path):
+    # Slots taken here stand in for invocations running in another app process.
+    nodes = FileSlots(str(tmp_path / "functions" / "nodes"), 1)
+    node_slot = nodes.acquire("node-" + hashlib.blake2b(b"busy", digest_size=16).hexdigest())
+    with pytest.raises(TooManyRequests):
+        invoke(pool, "busy")
+    nodes.release(node_slot)
+    assert invoke(pool, "busy") == 42
+
+    workers = FileSlots(str(tmp_path / "functions" / "workers"), 2)
+    held = [workers.acquire("worker"), workers.acquire("worker")]
+    assert None not in held
+    with pytest.raises(ServiceUnavailable):
+        invoke(pool, "other")
+    for slot in held:
+        workers.release(slot)
+    assert invoke(pool, "other") == 42
+
+
+def test_zygote_replaces_its_forking_process(pool):
+    with open("/proc/%d/task/%d/children" % (pool.zygote.pid, pool.zygote.pid)) as children:
+        forker = int(children.read().split()[0])
+    os.kill(forker, signal.SIGKILL)
+    time.sleep(1.5)
+
+    worker = pool.spawn()
+    worker.connection.send(("key", SOURCE, "handle", 1, {}, 256 * 1024 * 1024))
+    assert worker.connection.recv()[:2] == ("ok", "2")
+    worker.kill()
+
+
+def test_pools_never_fork_a_zygote_while_serving():
+    pool = FunctionPool(workers=0)
+    with pytest.raises(ServiceUnavailable):
+        invoke(pool, "node")
+    assert pool.zygote is None
@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+from werkzeug.exceptions import ServiceUnavailable
+
+from messaging.inbox_notifier import InboxNotifier
+from utils.invalidation import InvalidationBoard
+
+
+def headers(token: str) -> dict:
+    return {"Authorization": "Bearer " + token}
+
+
+def test_readers_beyond_the_cap_are_turned_away():
+    notifier = InboxNotifier(max_readers=1)
+    notifier.acquire()
+    with pytest.raises(ServiceUnavailable):
+        notifier.acquire()
+    notifier.release()
+    notifier.acquire()
+
+
+def test_notify_only_wakes_waiters_of_the_inbox():
+    notifier = InboxNotifier()
+    checks = {"first": 0, "second": 0}
+    ready = {"first": False, "second": False}
+
+    def predicate(inbox_id):
+        checks[inbox_id] += 1
+        return ready[inbox_id]
+
+    waiters = [threading.Thread(target=notifier.wait,
+                                args=(inbox_id, lambda inbox_id=inbox_id: predicate(inbox_id), 5))
+               for inbox_id in checks]
+    for waiter in waiters:
+        waiter.start()
+    while len(notifier.waiters) < 2:
+        time.sleep(0.01)
+
+    ready["first"] = True
+    notifier.notify("first")
+    waiters[0].join(1)
+    assert not waiters[0].is_alive()
+    assert checks["second"] == 1
+
+    ready["second"] = True
+    notifier.notify("second")
+    waiters[1].join(1)
+
+
+def test_appends_of_other_processes_wake_waiters(tmp_path):
+    path = str(tmp_path / "invalidation")
+    notifier = InboxNotifier(InvalidationBoard(path, slots=64), poll_interval=0.05)
+    # Another process appending only shares the board with this one.
+    other = InboxNotifier(InvalidationBoard(path, slots=64))
+    appended = []
+
+    def append():
+        time.sleep(0.1)
+        appended.append(True)
+        other.notify("inbox")
+
+    threading.Thread(target=append).start()
+    started = time.monotonic()
+    assert notifier.wait("inbox", lambda: bool(appended), 5)
+    assert time.monotonic() - started < 1
+
+
+def test_streams_give_back_their_reader_slot(client, node, actor_token):
+    from main import inbox_manager
+    inboxes = "/api/v1/nodes/%s/messaging/inboxes" % node
+    client.post(inboxes, json={"identifier": "streamed"}, headers=headers(actor_token))
+    inbox_manager.append_messages(node, "streamed", [{"id": "a"}])
+
+    response = client.get(inboxes + "/streamed/stream", headers={**headers(actor_token),
+                                                                 "Accept": "text/event-stream"}, buffered=False)
+    assert inbox_manager.notifier.readers == 1
+    assert b"id: 0" in b"".join([next(response.response), next(response.response)])
+    response.close()
+    assert inbox_manager.notifier.readers == 0
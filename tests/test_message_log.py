@@ -0,0 +1,65 @@
+import os
+
+from messaging.message_log import MessageLog, MessageLogStore
+
+
+def headers(token: str) -> dict:
+    return {"Authorization": "Bearer " + token}
+
+
+def test_segments_roll_over(tmp_path):
+    log = MessageLog(str(tmp_path), segment_size=64, index_interval=16)
+    offsets = []
+    for number in range(20):
+        offsets.extend(log.append([b"message %02d" % number]))
+    assert offsets == list(range(20))
+    assert len([name for name in os.listdir(tmp_path) if name.endswith(".log")]) > 1
+
+    # Every offset reads back from whichever segment holds it, also after reopening.
+    log.close()
+    log = MessageLog(str(tmp_path), segment_size=64, index_interval=16)
+    assert log.next_offset == 20
+    for offset in range(20):
+        assert log.read(offset, 1) == [(offset, b"message %02d" % offset)]
+
+
+def test_offset_cursor_pages_across_segments(tmp_path):
+    log = MessageLog(str(tmp_path), segment_size=64, index_interval=16)
+    log.append([b"message %02d" % number for number in range(5)])
+    log.append([b"message %02d" % number for number in range(5, 20)])
+
+    offset, pages = 0, []
+    while True:
+        page = log.read(offset, 7)
+        if not page:
+            break
+        pages.append([record_offset for record_offset, _ in page])
+        offset = page[-1][0] + 1
+    assert pages == [list(range(0, 7)), list(range(7, 14)), list(range(14, 20))]
+    assert log.read(20, 7) == []
+
+
+def test_store_closes_evicted_logs(tmp_path):
+    store = MessageLogStore(str(tmp_path), max_open=2)
+    first = store.get("first")
+    first.append([b"one"])
+    store.get("second")
+    store.get("third")
+    assert list(store.logs) == ["second", "third"]
+    assert first.segments is None
+
+    # An evicted log reopens on next use.
+    assert first.read(0, 10) == [(0, b"one")]
+
+
+def test_recreated_inbox_starts_empty(client, node, actor_token):
+    from main import inbox_manager
+    inboxes = "/api/v1/nodes/%s/messaging/inboxes" % node
+    assert client.post(inboxes, json={"identifier": "recreated"}, headers=headers(actor_token)).status_code == 200
+    assert inbox_manager.append_messages(node, "recreated", [{"id": "a"}, {"id": "b"}]) == [0, 1]
+    assert client.delete(inboxes + "/recreated", headers=headers(actor_token)).status_code == 200
+
+    assert client.post(inboxes, json={"identifier": "recreated"}, headers=headers(actor_token)).status_code == 200
+    assert client.get(inboxes + "/recreated/messages", headers=headers(actor_token)).get_json()["results"] == []
+    # Ids seen by the deleted inbox are not duplicates in the new one.
+    assert inbox_manager.append_messages(node, "recreated", [{"id": "a"}]) == [0]
@@ -0,0 +1,23 @@
+import os
+
+from utils.metrics import Registry
+
+
+def test_shared_registries_add_up(tmp_path):
+    first, second = Registry(), Registry()
+    for registry, count, seconds in ((first, 1, 0.5), (second, 2, 2)):
+        registry.share(str(tmp_path))
+        registry.counter("requests_total", "Requests").inc((), count)
+        registry.histogram("request_seconds", "Seconds", buckets=(1,)).observe((), seconds)
+        registry.gauge("queue_length", "Queue", (), lambda: {(): 4}, shared=True)
+
+    # Both registries run in this process, so the second one's file is moved aside to stand for another worker.
+    second.write()
+    os.replace(tmp_path / ("%d.json" % os.getpid()), tmp_path / "other.json")
+
+    lines = first.render().splitlines()
+    assert "requests_total 3" in lines
+    assert 'request_seconds_bucket{le="1"} 1' in lines
+    assert 'request_seconds_bucket{le="+Inf"} 2' in lines
+    assert "request_seconds_count 2" in lines
+    assert "queue_length 4" in lines
@@ -0,0 +1,81 @@
+import pytest
+
+from storage import open_storage
+
+
+def headers(token: str) -> dict:
+    return {"Authorization": "Bearer " + token}
+
+
+@pytest.fixture(scope="module")
+def pager_token(client, node):
+    client.post("/api/v1/nodes/%s/actors/signup" % node, json={
+        "identifier": "pager",
+        "password": "pager-password",
+        "type": "person",
+        "display_name": "Pager",
+    })
+    return client.post("/api/v1/nodes/%s/actors/token" % node, json={
+        "identifier": "pager",
+        "password": "pager-password",
+    }).get_json()["token"]
+
+
+@pytest.fixture(params=["tinydb", "sqlite"])
+def table(request, tmp_path):
+    storage = open_storage(request.param, str(tmp_path))
+    yield storage.table("items", indexes=(("group",),))
+    storage.close()
+
+
+def pages(table, where: dict, size: int) -> list[list[int]]:
+    results, after = [], None
+    while True:
+        page = table.page(where, after, size)
+        if not page:
+            return results
+        results.append([document["number"] for document in page])
+        after = page[-1].doc_id
+
+
+def test_pages_end_exactly_at_the_last_document(table):
+    table.insert_multiple([{"number": number, "group": number % 2} for number in range(6)])
+    assert pages(table, {}, 3) == [[0, 1, 2], [3, 4, 5]]
+    assert pages(table, {}, 4) == [[0, 1, 2, 3], [4, 5]]
+    assert pages(table, {"group": 1}, 2) == [[1, 3], [5]]
+    assert pages(table, {"group": 2}, 2) == []
+
+
+def test_cursors_survive_removal_of_the_document_they_point_at(table):
+    doc_ids = table.insert_multiple([{"number": number, "group": 0} for number in range(5)])
+    table.remove({"number": 1})
+    assert [document["number"] for document in table.page({}, doc_ids[1], 10)] == [2, 3, 4]
+    assert [document["number"] for document in table.page({"group": 0}, doc_ids[1], 10)] == [2, 3, 4]
+
+
+def test_list_endpoint_pages_with_cursors(client, node, pager_token):
+    outboxes = "/api/v1/nodes/%s/messaging/outboxes" % node
+    for number in range(5):
+        client.post(outboxes, json={"identifier": "outbox-%d" % number}, headers=headers(pager_token))
+
+    identifiers, cursor = [], None
+    while True:
+        page = client.get(outboxes, query_string={"size": 2, **({"cursor": cursor} if cursor else {})},
+                          headers=headers(pager_token)).get_json()
+        identifiers.append([outbox["identifier"] for outbox in page["results"]])
+        cursor = page["next"]
+        if cursor is None:
+            break
+    assert identifiers == [["outbox-0", "outbox-1"], ["outbox-2", "outbox-3"], ["outbox-4"]]
+
+    # A page that ends on the last outbox has no next cursor.
+    assert client.get(outboxes, query_string={"size": 5}, headers=headers(pager_token)).get_json()["next"] is None
+    # Sizes are clamped to 1..1000.
+    assert len(client.get(outboxes, query_string={"size": 0},
+                          headers=headers(pager_token)).get_json()["results"]) == 1
+
+    first = client.get(outboxes, query_string={"size": 1}, headers=headers(pager_token)).get_json()
+    streamed = client.get(outboxes, query_string={"stream": "true", "cursor": first["next"]},
+                          headers=headers(pager_token)).get_json()
+    assert [outbox["identifier"] for outbox in streamed["results"]] == ["outbox-%d" % number
+                                                                        for number in range(1, 5)]
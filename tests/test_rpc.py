@@ -0,0 +1,95 @@
+import socket
+import struct
+import time
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+from rpc import RpcConnection, RpcError, RpcServer
+from rpc.rpc_protocol import NOT_AUTHENTICATED, challenge_payload
+
+SERVER = "127.0.0.1:7000"
+KID = "127.0.0.1:7001/node"
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@pytest.fixture
+def keys():
+    return {KID: Ed25519PrivateKey.generate()}
+
+
+@pytest.fixture
+def server(keys):
+    def public_key(kid):
+        return "127.0.0.1:7001", "node", keys[kid].public_key()
+
+    server = RpcServer(public_key, SERVER, "127.0.0.1", free_port(), workers=2, max_connections=2,
+                       handshake_timeout=0.5)
+    server.method("whoami", authenticated=True)(lambda node, params: node["address"])
+    server.method("echo")(lambda params: params)
+    server.start()
+    yield server
+    server.close()
+
+
+def connect(server) -> RpcConnection:
+    return RpcConnection(SERVER, ("127.0.0.1", server.port), 3)
+
+
+def authenticate(connection: RpcConnection, key: Ed25519PrivateKey):
+    return connection.call("authenticate", {
+        "kid": KID,
+        "signature": key.sign(challenge_payload(connection.nonce, SERVER, KID)),
+    }, None, 3)
+
+
+def test_calls_on_behalf_of_a_node_need_its_signature(server, keys):
+    connection = connect(server)
+    with pytest.raises(RpcError, match=NOT_AUTHENTICATED):
+        connection.call("whoami", None, KID, 3)
+    with pytest.raises(RpcError, match="Invalid signature"):
+        authenticate(connection, Ed25519PrivateKey.generate())
+
+    assert authenticate(connection, keys[KID]) == {"address": KID}
+    assert connection.call("whoami", None, KID, 3) == KID
+    connection.close()
+
+
+def test_rotated_keys_end_the_session(server, keys):
+    connection = connect(server)
+    authenticate(connection, keys[KID])
+    keys[KID] = Ed25519PrivateKey.generate()
+    with pytest.raises(RpcError, match=NOT_AUTHENTICATED):
+        connection.call("whoami", None, KID, 3)
+
+    authenticate(connection, keys[KID])
+    assert connection.call("whoami", None, KID, 3) == KID
+    connection.close()
+
+
+def test_unauthenticated_connections_are_closed(server):
+    idle = connect(server)
+    assert idle.call("echo", "hello", None, 3) == "hello"
+    time.sleep(1)
+    assert idle.closed
+
+    # Frames above the pre-authentication limit end the connection before they are read.
+    large = connect(server)
+    large.channel.sendall(struct.pack(">I", 1024 * 1024))
+    time.sleep(0.2)
+    assert large.closed
+
+
+def test_connections_beyond_the_limit_are_refused(server, keys):
+    connections = [connect(server), connect(server)]
+    with pytest.raises(Exception, match="did not open an RPC session"):
+        connect(server)
+    for connection in connections:
+        connection.close()
+    time.sleep(0.2)
+    connect(server).close()
@@ -0,0 +1,119 @@
+import json
+import time
+
+import pytest
+
+from storage import BUFFERED, DURABLE, TinyDBStorage, open_storage
+
+
+@pytest.fixture(params=["tinydb", "sqlite"])
+def storage(request, tmp_path):
+    storage = open_storage(request.param, str(tmp_path))
+    yield storage
+    storage.close()
+
+
+def open_table(storage):
+    return storage.table("items", unique=(("node", "identifier"),), indexes=(("node", "creator"),))
+
+
+def identifiers(table, where: dict) -> list[str]:
+    return [document["identifier"] for document in table.search(where)]
+
+
+def test_updates_move_documents_between_index_keys(storage):
+    table = open_table(storage)
+    table.insert_multiple([{"node": "n", "identifier": "a", "creator": "x"},
+                           {"node": "n", "identifier": "b", "creator": "x"}])
+    assert table.update({"creator": "y"}, {"node": "n", "identifier": "a"})
+    assert identifiers(table, {"node": "n", "creator": "x"}) == ["b"]
+    assert identifiers(table, {"node": "n", "creator": "y"}) == ["a"]
+
+    assert table.update({"identifier": "c"}, {"node": "n", "identifier": "b"})
+    assert table.get({"node": "n", "identifier": "b"}) is None
+    assert table.get({"node": "n", "identifier": "c"})["creator"] == "x"
+    with pytest.raises(Exception):
+        table.update({"identifier": "a"}, {"node": "n", "identifier": "c"})
+
+
+def test_removed_documents_leave_the_indexes(storage):
+    table = open_table(storage)
+    table.insert_multiple([{"node": "n", "identifier": "a", "creator": "x"},
+                           {"node": "n", "identifier": "b", "creator": "x"}])
+    assert len(table.remove({"node": "n", "identifier": "a"})) == 1
+    assert identifiers(table, {"node": "n", "creator": "x"}) == ["b"]
+    assert not table.contains({"node": "n", "identifier": "a"})
+
+    # The unique key is free again.
+    table.insert({"node": "n", "identifier": "a", "creator": "z"})
+    assert identifiers(table, {"node": "n", "creator": "z"}) == ["a"]
+    with pytest.raises(Exception):
+        table.insert({"node": "n", "identifier": "a", "creator": "z"})
+
+
+def test_indexes_follow_writes_of_other_processes(tmp_path):
+    path = str(tmp_path / "meta.json")
+    first, second = TinyDBStorage(path), TinyDBStorage(path)
+    mine, theirs = open_table(first), open_table(second)
+    mine.insert({"node": "n", "identifier": "a", "creator": "x"})
+    assert identifiers(theirs, {"node": "n", "creator": "x"}) == ["a"]
+
+    theirs.update({"creator": "y"}, {"node": "n", "identifier": "a"})
+    assert identifiers(mine, {"node": "n", "creator": "x"}) == []
+    assert identifiers(mine, {"node": "n", "creator": "y"}) == ["a"]
+    theirs.remove({"node": "n", "identifier": "a"})
+    assert not mine.contains({"node": "n", "identifier": "a"})
+    first.close()
+    second.close()
+
+
+def on_disk(path: str) -> list[str]:
+    with open(path) as file:
+        content = file.read()
+    return [document["identifier"] for document in json.loads(content or "{}").get("items", {}).values()]
+
+
+def test_durable_writes_wait_for_the_group_commit(tmp_path):
+    path = str(tmp_path / "meta.json")
+    storage = TinyDBStorage(path, commit_window=0.5, durability=BUFFERED)
+    table = open_table(storage)
+    started = time.monotonic()
+    table.insert({"node": "n", "identifier": "buffered", "creator": "x"})
+    # Buffered writes are visible here straight away but only reach the file with the window's flush.
+    assert table.contains({"node": "n", "identifier": "buffered"})
+    assert on_disk(path) == []
+
+    table.insert({"node": "n", "identifier": "durable", "creator": "x"}, durability=DURABLE)
+    assert on_disk(path) == ["buffered", "durable"]
+    assert time.monotonic() - started < 5
+    storage.close()
+
+
+def test_full_batches_flush_before_the_window(tmp_path):
+    path = str(tmp_path / "meta.json")
+    storage = TinyDBStorage(path, commit_window=60, commit_batch=3)
+    table = open_table(storage)
+    for identifier in "abc":
+        table.insert({"node": "n", "identifier": identifier, "creator": "x"})
+    deadline = time.monotonic() + 5
+    while len(on_disk(path)) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert on_disk(path) == ["a", "b", "c"]
+    storage.close()
+
+
+def test_closing_flushes_buffered_writes(tmp_path):
+    path = str(tmp_path / "meta.json")
+    storage = TinyDBStorage(path, commit_window=60)
+    open_table(storage).insert({"node": "n", "identifier": "a", "creator": "x"})
+    storage.close()
+    assert on_disk(path) == ["a"]
+
+    # Another process buffering into the same file is refused rather than overwriting it.
+    reopened, other = TinyDBStorage(path, commit_window=60), TinyDBStorage(path, commit_window=60)
+    open_table(reopened).insert({"node": "n", "identifier": "b", "creator": "x"})
+    with pytest.raises(Exception, match="another process"):
+        open_table(other).insert({"node": "n", "identifier": "c", "creator": "x"})
+    reopened.close()
+    other.close()
+    assert on_disk(path) == ["a", "b"]
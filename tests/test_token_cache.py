@@ -0,0 +1,76 @@
+import os
+
+import pytest
+from werkzeug.exceptions import NotFound
+
+from utils.cache import TTLCache
+from utils.invalidation import InvalidationBoard
+from utils.token_cache import TokenCache
+
+
+def test_invalidation_reaches_other_caches(tmp_path):
+    # Two boards on one file stand in for two worker processes.
+    path = os.path.join(tmp_path, "invalidation")
+    first = TokenCache(10, 60, InvalidationBoard(path))
+    second = TokenCache(10, 60, InvalidationBoard(path))
+    first.put("token", "actor", {"sub": "a"}, ["actor:a"])
+    second.put("token", "actor", {"sub": "a"}, ["actor:a"])
+
+    second.invalidate("actor:a")
+
+    assert first.get("token", "actor") is None
+    assert second.get("token", "actor") is None
+
+
+def test_generations_taken_before_a_check_catch_a_racing_invalidation(tmp_path):
+    cache = TokenCache(10, 60, InvalidationBoard(os.path.join(tmp_path, "invalidation")))
+    generations = cache.generations(["admin:root"])
+
+    cache.invalidate("admin:root")
+    cache.put("token", "admin", {"username": "root"}, ["admin:root"], None, generations)
+
+    assert cache.get("token", "admin") is None
+
+
+def test_ttl_cache_invalidation_reaches_other_caches(tmp_path):
+    path = os.path.join(tmp_path, "invalidation")
+    first = TTLCache(10, 60, 0, InvalidationBoard(path))
+    second = TTLCache(10, 60, 0, InvalidationBoard(path))
+    assert first.get("key", lambda: "old") == "old"
+
+    second.invalidate("key")
+
+    assert first.get("key", lambda: "new") == "new"
+
+
+def test_deleting_an_admin_revokes_its_token(app, client, admin_token):
+    from main import admin_manager
+
+    headers = {"Authorization": "Bearer " + admin_token}
+    client.post("/api/v1/admins", json={"username": "temporary"}, headers=headers)
+    admin_manager.change_password("temporary", "temporary-password")
+    token = client.post("/api/v1/admins/token", json={
+        "username": "temporary",
+        "password": "temporary-password",
+    }).get_json()["token"]
+    assert client.get("/api/v1/admins/current", headers={"Authorization": "Bearer " + token}).status_code == 200
+
+    assert client.delete("/api/v1/admins/temporary", headers=headers).status_code == 200
+
+    assert client.get("/api/v1/admins/current", headers={"Authorization": "Bearer " + token}).status_code == 500
+
+
+def test_only_not_found_is_cached_as_a_miss():
+    cache = TTLCache(10, 60, 60)
+    loads = []
+
+    def load(error):
+        loads.append(error)
+        raise error
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            cache.get("unreachable", lambda: load(ConnectionError("timed out")))
+        with pytest.raises(NotFound):
+            cache.get("missing", lambda: load(NotFound("Node missing not found")))
+    assert [type(error) for error in loads] == [ConnectionError, NotFound, ConnectionError]
@@ -1,41 +1,97 @@
-from flask import g, request
+from typing import Iterator
+
+from flask import current_app, g, request, Response
 from functools import wraps
 import jwt
 
+from schema import Validator
+from utils.metrics import registry
+from utils.profiler import mark
+
+JWT_SECONDS = registry.histogram("vertex_jwt_verification_seconds", "Time spent verifying access tokens", ("kind",))
+AUTHENTICATIONS = registry.counter("vertex_authentications_total", "Access token checks by outcome",
+                                   ("kind", "result"))
+
+
+def request_body():
+    # Parsed on first use so requests that never read a body don't pay for decoding it.
+    if "request_body" not in g:
+        g.request_body = request.get_json(force=True, silent=True)
+    return g.request_body
+
 
 def required_param(key: str, data_type=str):
-    if not g.request_body:
+    body = request_body()
+    if not body:
         raise Exception("Request body is missing")
-    if key not in g.request_body:
+    if key not in body:
         raise Exception(f"{key} is required")
-    val = g.request_body[key]
+    val = body[key]
     if not isinstance(val, data_type):
         raise Exception(f"Invalid data type for value of {key}")
     return val
 
 
 def optional_param(key: str, data_type=str):
-    if not g.request_body:
+    body = request_body()
+    if not body:
         return None
-    if key not in g.request_body:
+    if key not in body:
         return None
-    val = g.request_body[key]
+    val = body[key]
     if not isinstance(val, data_type):
         raise Exception(f"Invalid data type for value of {key}")
     return val
 
 
-def page():
-    return request.args.get("page", 0, int)
+def validated_body(validator: Validator) -> dict:
+    body = request_body()
+    if not body:
+        raise Exception("Request body is missing")
+    return validator.check(body)
+
+
+def bulk_param(key: str, max_items: int) -> list:
+    items = required_param(key, list)
+    if len(items) > max_items:
+        raise Exception(f"At most {max_items} {key} can be created in one request")
+    return items
+
+
+def cursor():
+    return request.args.get("cursor", None, int)
 
 
 def size():
-    return request.args.get("size", 50, int)
+    return min(max(request.args.get("size", 50, int), 1), 1000)
+
+
+def streamed():
+    return request.args.get("stream", "false").lower() == "true"
+
+
+def offset():
+    return request.args.get("offset", 0, int)
+
+
+def stream_results(results: Iterator[dict]) -> Response:
+    dumps = current_app.json.dumps
+
+    def generate():
+        yield '{"results": ['
+        separator = ""
+        for result in results:
+            yield separator + dumps(result)
+            separator = ", "
+        yield '], "next": null}'
+
+    return Response(generate(), mimetype="application/json")
 
 
 def authenticate_admin(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        mark("auth")
         token = None
 
         if 'Authorization' in request.headers:
@@ -46,17 +102,35 @@ def authenticate_admin(f):
         if not token:
             raise Exception("Invalid access token")
 
+        current_admin = g.token_cache.get(token, "admin")
+        if current_admin is not None:
+            AUTHENTICATIONS.inc(("admin", "cached"))
+            mark("manager")
+            return f(current_admin, *args, **kwargs)
+
         try:
-            data = jwt.decode(token, g.jwt_signing_key, algorithms=['HS256'], issuer=g.vertex_endpoint,
-                              audience=g.vertex_endpoint)
+            with JWT_SECONDS.time(("admin",)):
+                data = jwt.decode(token, g.jwt_signing_key, algorithms=['HS256'], issuer=g.vertex_endpoint,
+                                  audience=g.vertex_endpoint)
             if data["type"] != "admin":
                 raise Exception("Invalid access token")
             current_admin = {
                 "username": data["sub"]
             }
+            tags = ["admin:%s" % data["sub"]]
+            # Taken before the lookup, so a deletion racing with it still invalidates what gets cached.
+            generations = g.token_cache.generations(tags)
+            if not g.admin_manager.username_exists(data["sub"]):
+                raise Exception("Invalid access token")
         except Exception as _:
+            AUTHENTICATIONS.inc(("admin", "rejected"))
             raise Exception("Invalid access token")
 
+        AUTHENTICATIONS.inc(("admin", "verified"))
+
+        g.token_cache.put(token, "admin", current_admin, tags, data.get("exp"), generations)
+
+        mark("manager")
         return f(current_admin, *args, **kwargs)
 
     return decorated
@@ -65,6 +139,7 @@ def authenticate_admin(f):
 def authenticate_actor(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        mark("auth")
         token = None
 
         if 'Authorization' in request.headers:
@@ -75,16 +150,24 @@ def authenticate_actor(f):
         if not token:
             raise Exception("Invalid access token")
 
+        audience = "%s/%s" % (g.vertex_endpoint, kwargs.get("node_identifier"))
+        current_actor = g.token_cache.get(token, "actor:%s" % audience)
+        if current_actor is not None:
+            AUTHENTICATIONS.inc(("actor", "cached"))
+            mark("manager")
+            return f(current_actor, *args, **kwargs)
+
         try:
             kid = jwt.get_unverified_header(token)["kid"]
             issuer_vertex_endpoint, issuer_node_identifier, issuer_signing_public_key = g.node_key_manager.get_signing_public_key(
                 kid)
 
-            data = jwt.decode(token,
-                              issuer_signing_public_key,
-                              algorithms=['EdDSA'],
-                              issuer="%s/%s" % (issuer_vertex_endpoint, issuer_node_identifier),
-                              audience="%s/%s" % (g.vertex_endpoint, kwargs.get("node_identifier")))
+            with JWT_SECONDS.time(("actor",)):
+                data = jwt.decode(token,
+                                  issuer_signing_public_key,
+                                  algorithms=['EdDSA'],
+                                  issuer="%s/%s" % (issuer_vertex_endpoint, issuer_node_identifier),
+                                  audience=audience)
             if data["type"] != "actor":
                 raise Exception("Invalid access token")
             current_actor = {
@@ -94,14 +177,81 @@ def authenticate_actor(f):
                 "node_address": "%s/%s" % (issuer_vertex_endpoint, issuer_node_identifier),
                 "address": "%s/%s/%s" % (g.vertex_endpoint, issuer_node_identifier, data["sub"])
             }
+            tags = [
+                "node:%s" % current_actor["node_address"],
+                "actor:%s/%s" % (current_actor["node_address"], current_actor["identifier"]),
+            ]
+            generations = g.token_cache.generations(tags)
+            if check_local_vertex(issuer_vertex_endpoint) and \
+                    not g.actor_manager.username_exists(issuer_node_identifier, data["sub"]):
+                raise Exception("Invalid access token")
         except Exception as _:
+            AUTHENTICATIONS.inc(("actor", "rejected"))
             raise Exception("Invalid access token")
 
+        AUTHENTICATIONS.inc(("actor", "verified"))
+        g.token_cache.put(token, "actor:%s" % audience, current_actor, tags, data.get("exp"), generations)
+
+        mark("manager")
         return f(current_actor, *args, **kwargs)
 
     return decorated
 
 
+def authenticate_node(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        mark("auth")
+        token = None
+
+        if 'Authorization' in request.headers:
+            auth_header = request.headers['Authorization']
+            if auth_header.startswith('Bearer '):
+                token = auth_header.split(' ')[1]
+
+        if not token:
+            raise Exception("Invalid access token")
+
+        audience = "%s/%s" % (g.vertex_endpoint, kwargs.get("node_identifier"))
+        current_node = g.token_cache.get(token, "node:%s" % audience)
+        if current_node is not None:
+            AUTHENTICATIONS.inc(("node", "cached"))
+            mark("manager")
+            return f(current_node, *args, **kwargs)
+
+        try:
+            kid = jwt.get_unverified_header(token)["kid"]
+            issuer_vertex_endpoint, issuer_node_identifier, issuer_signing_public_key = g.node_key_manager.get_signing_public_key(
+                kid)
+
+            with JWT_SECONDS.time(("node",)):
+                data = jwt.decode(token,
+                                  issuer_signing_public_key,
+                                  algorithms=['EdDSA'],
+                                  issuer="%s/%s" % (issuer_vertex_endpoint, issuer_node_identifier),
+                                  audience=audience)
+            if data["type"] != "node" or data["sub"] != issuer_node_identifier:
+                raise Exception("Invalid access token")
+            current_node = {
+                "identifier": issuer_node_identifier,
+                "vertex_endpoint": issuer_vertex_endpoint,
+                "address": "%s/%s" % (issuer_vertex_endpoint, issuer_node_identifier),
+            }
+        except Exception as _:
+            AUTHENTICATIONS.inc(("node", "rejected"))
+            raise Exception("Invalid access token")
+
+        AUTHENTICATIONS.inc(("node", "verified"))
+        g.token_cache.put(token, "node:%s" % audience, current_node, [
+            "node:%s" % current_node["address"],
+        ], data.get("exp"))
+
+        mark("manager")
+        return f(current_node, *args, **kwargs)
+
+    return decorated
+
+
 def check_local_vertex(actor_vertex_endpoint: str) -> bool:
     return g.vertex_endpoint == actor_vertex_endpoint
 
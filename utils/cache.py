@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from werkzeug.exceptions import NotFound
+
+from utils.invalidation import InvalidationBoard
+
+
+class Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        self.stale = False
+        self.generation = None
+
+
+class TTLCache:
+    """Loaded values by key, each loaded once however many threads ask for it at the same time.
+
+    With a ``board`` invalidating a key reaches every process sharing it: entries keep the key's generation
+    from before they were loaded and count as missing once it has moved.
+
+    Only ``NotFound`` raised by a loader is remembered, for ``negative_ttl`` seconds; any other error, such as a
+    timeout reaching another vertex, is passed on and the next lookup loads again.
+    """
+
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float = 0, board: InvalidationBoard = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.board = board
+        self.entries = OrderedDict()
+        self.flights = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_on, value, error, generation = entry
+                if expires_on > time.monotonic() and generation == self.generation(key):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    if error is not None:
+                        raise error
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight()
+                flight.generation = self.generation(key)
+                self.flights[key] = flight
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+                if not flight.stale:
+                    if flight.error is None:
+                        self.store(key, flight.value, None, self.ttl, flight.generation)
+                    elif isinstance(flight.error, NotFound):
+                        self.store(key, None, flight.error, self.negative_ttl, flight.generation)
+            flight.event.set()
+        return flight.value
+
+    def put(self, key: Hashable, value: Any, ttl: float = None):
+        with self.lock:
+            self.store(key, value, None, self.ttl if ttl is None else ttl, self.generation(key))
+
+    def invalidate(self, key: Hashable):
+        if self.board is not None:
+            self.board.bump(str(key))
+        with self.lock:
+            self.entries.pop(key, None)
+            flight = self.flights.get(key)
+            if flight is not None:
+                flight.stale = True
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            for flight in self.flights.values():
+                flight.stale = True
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def generation(self, key: Hashable) -> int | None:
+        return self.board.generation(str(key)) if self.board is not None else None
+
+    def store(self, key: Hashable, value: Any, error: Exception | None, ttl: float, generation: int | None):
+        if ttl <= 0:
+            return
+        self.entries[key] = (time.monotonic() + ttl, value, error, generation)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
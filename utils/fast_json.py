@@ -0,0 +1,70 @@
+import json
+
+from flask import Flask, Response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps_bytes(obj) -> bytes:
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj) -> str:
+    return dumps_bytes(obj).decode("utf-8")
+
+
+def loads(data: str | bytes):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, falling back to the stdlib provider when orjson is not installed,
+    when ``backend`` is ``json``, or for values orjson cannot encode such as integers beyond 64 bits.
+
+    Unlike the stdlib, orjson writes non-ASCII characters as UTF-8 rather than escaping them, and decodes
+    integers beyond 64 bits as floats.
+    """
+
+    def __init__(self, app: Flask, backend: str = "orjson"):
+        super().__init__(app)
+        if backend not in ("orjson", "json"):
+            raise Exception(f"Unknown JSON backend {backend}")
+        self.fast = backend == "orjson" and orjson is not None
+
+    def dumps(self, obj, **kwargs) -> str:
+        if self.fast and not kwargs:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self.options()).decode("utf-8")
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s: str | bytes, **kwargs):
+        if self.fast and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs) -> Response:
+        if not self.fast:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        option = self.options() | orjson.OPT_APPEND_NEWLINE
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        try:
+            body = orjson.dumps(obj, default=self.default, option=option)
+        except TypeError:
+            return super().response(*args, **kwargs)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+    def options(self) -> int:
+        return orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
@@ -0,0 +1,55 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from werkzeug.exceptions import NotFound
+
+
+class FederationClient:
+    def __init__(self, federation_protocol: str, connect_timeout: float = 3, read_timeout: float = 10,
+                 pool_size: int = 10):
+        self.federation_protocol = federation_protocol
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get(self, vertex_endpoint: str, path: str, params: dict = None, headers: dict = None):
+        return self.request("GET", vertex_endpoint, path, params=params, headers=headers)
+
+    def post(self, vertex_endpoint: str, path: str, body, headers: dict = None):
+        return self.request("POST", vertex_endpoint, path, json=body, headers=headers)
+
+    def request(self, method: str, vertex_endpoint: str, path: str, **kwargs):
+        response = self.session(vertex_endpoint).request(
+            method, "%s://%s%s" % (self.federation_protocol, vertex_endpoint, path), timeout=self.timeout, **kwargs)
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        if not response.ok:
+            message = body.get("message") if isinstance(body, dict) else None
+            message = message or f"Vertex {vertex_endpoint} responded with {response.status_code}"
+            if response.status_code == 404:
+                raise NotFound(message)
+            raise Exception(message)
+        return body
+
+    def session(self, vertex_endpoint: str) -> requests.Session:
+        session = self.sessions.get(vertex_endpoint)
+        if session is not None:
+            return session
+        with self.lock:
+            session = self.sessions.get(vertex_endpoint)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount("%s://" % self.federation_protocol, adapter)
+                self.sessions[vertex_endpoint] = session
+            return session
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
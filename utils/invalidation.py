@@ -0,0 +1,49 @@
+import hashlib
+import mmap
+import os
+import struct
+
+from storage.file_lock import FileLock
+
+GENERATION = struct.Struct("<Q")
+
+
+class InvalidationBoard:
+    """Generation counters that every process opening the same file shares through a memory map.
+
+    Caches remember the generations of the tags an entry depends on and drop the entry once one of them
+    has moved, so invalidating a tag in one process reaches the caches of every other process on their next
+    lookup. Tags hash onto ``slots`` counters; two tags sharing one only costs an unneeded reload.
+    """
+
+    def __init__(self, path: str, slots: int = 65536):
+        self.slots = slots
+        self.lock = FileLock(path + ".lock")
+        size = slots * GENERATION.size
+        with self.lock.hold(exclusive=True):
+            descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(descriptor).st_size < size:
+                    os.ftruncate(descriptor, size)
+                self.map = mmap.mmap(descriptor, size)
+            finally:
+                os.close(descriptor)
+
+    def offset(self, tag: str) -> int:
+        digest = hashlib.blake2b(tag.encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "little") % self.slots * GENERATION.size
+
+    def generation(self, tag: str) -> int:
+        return GENERATION.unpack_from(self.map, self.offset(tag))[0]
+
+    def generations(self, tags: list[str]) -> tuple[int, ...]:
+        return tuple(self.generation(tag) for tag in tags)
+
+    def bump(self, tag: str):
+        offset = self.offset(tag)
+        with self.lock.hold(exclusive=True):
+            GENERATION.pack_into(self.map, offset, GENERATION.unpack_from(self.map, offset)[0] + 1)
+
+    def close(self):
+        self.map.close()
+        self.lock.close()
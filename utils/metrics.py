@@ -0,0 +1,232 @@
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = ['%s="%s"' % (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+             for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> dict:
+        with self.lock:
+            return dict(self.values)
+
+    @staticmethod
+    def merge(samples: dict, labels: tuple, value):
+        samples[labels] = samples.get(labels, 0) + value
+
+    def render(self, samples: dict | None = None) -> list[str]:
+        values = (self.samples() if samples is None else samples).items()
+        lines = ["# HELP %s %s" % (self.name, self.description), "# TYPE %s counter" % self.name]
+        for labels, value in values:
+            lines.append("%s%s %s" % (self.name, format_labels(self.labels, labels), format_value(value)))
+        return lines
+
+
+class Gauge:
+    """Metric whose samples are read from ``collect`` at scrape time, as ``{labels: value}``.
+
+    ``metric_type`` may be set to ``counter`` for totals that are kept elsewhere, such as cache statistics.
+    Samples of processes sharing a registry add up, unless the gauge is ``shared``: a value every process
+    reads the same, such as the length of a queue they share.
+    """
+
+    def __init__(self, name: str, description: str, labels: tuple[str, ...], collect: Callable[[], dict],
+                 metric_type: str = "gauge", shared: bool = False):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.collect = collect
+        self.metric_type = metric_type
+        self.shared = shared
+
+    def samples(self) -> dict:
+        return self.collect()
+
+    merge = Counter.merge
+
+    def render(self, samples: dict | None = None) -> list[str]:
+        lines = ["# HELP %s %s" % (self.name, self.description), "# TYPE %s %s" % (self.name, self.metric_type)]
+        for labels, value in (self.samples() if samples is None else samples).items():
+            lines.append("%s%s %s" % (self.name, format_labels(self.labels, labels), format_value(value)))
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def observe(self, labels: tuple, value: float):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][slot] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, labels: tuple = ()):
+        started_on = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(labels, time.perf_counter() - started_on)
+
+    def samples(self) -> dict:
+        with self.lock:
+            return {labels: [list(counts), total] for labels, (counts, total) in self.values.items()}
+
+    def merge(self, samples: dict, labels: tuple, value):
+        counts, total = value
+        if len(counts) != len(self.buckets) + 1:
+            return
+        entry = samples.get(labels)
+        if entry is None:
+            samples[labels] = [list(counts), total]
+        else:
+            entry[0] = [mine + theirs for mine, theirs in zip(entry[0], counts)]
+            entry[1] += total
+
+    def render(self, samples: dict | None = None) -> list[str]:
+        values = (self.samples() if samples is None else samples).items()
+        lines = ["# HELP %s %s" % (self.name, self.description), "# TYPE %s histogram" % self.name]
+        for labels, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append("%s_bucket%s %d" % (
+                    self.name, format_labels(self.labels, labels, 'le="%s"' % format_value(bound)), cumulative))
+            lines.append("%s_sum%s %s" % (self.name, format_labels(self.labels, labels), format_value(total)))
+            lines.append("%s_count%s %d" % (self.name, format_labels(self.labels, labels), cumulative))
+        return lines
+
+
+class Registry:
+    """The metrics of this process.
+
+    After ``share`` every process writes its samples to a file of its own in a shared directory, when
+    rendering and at most every ``interval`` seconds from ``write_if_due``, and ``render`` reports the sum
+    over all the files. Other processes' samples are then at most ``interval`` seconds behind, as of their
+    last request.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.directory = None
+        self.interval = 0
+        self.written_on = 0
+
+    def counter(self, name: str, description: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, description, labels))
+
+    def histogram(self, name: str, description: str, labels: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def gauge(self, name: str, description: str, labels: tuple[str, ...], collect: Callable[[], dict],
+              metric_type: str = "gauge", shared: bool = False) -> Gauge:
+        return self.register(Gauge(name, description, labels, collect, metric_type, shared), replace=True)
+
+    def register(self, metric, replace: bool = False):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None and not replace:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def share(self, directory: str, interval: float = 5):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.interval = interval
+        atexit.register(self.write)
+
+    def write_if_due(self):
+        if self.directory is not None and time.monotonic() - self.written_on >= self.interval:
+            self.write()
+
+    def write(self):
+        self.written_on = time.monotonic()
+        with self.lock:
+            metrics = [metric for metric in self.metrics.values() if not getattr(metric, "shared", False)]
+        samples = {metric.name: [[list(labels), value] for labels, value in metric.samples().items()]
+                   for metric in metrics}
+        path = os.path.join(self.directory, "%d.json" % os.getpid())
+        with open(path + ".tmp", "w") as file:
+            json.dump(samples, file)
+        os.replace(path + ".tmp", path)
+
+    def collect(self) -> dict[str, dict]:
+        """Sums the samples every process sharing the directory has written, by metric name."""
+        self.write()
+        with self.lock:
+            metrics = dict(self.metrics)
+        merged = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as file:
+                    samples = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for metric_name, values in samples.items():
+                metric = metrics.get(metric_name)
+                if metric is None:
+                    continue
+                target = merged.setdefault(metric_name, {})
+                for labels, value in values:
+                    metric.merge(target, tuple(labels), value)
+        return merged
+
+    def render(self) -> str:
+        merged = self.collect() if self.directory is not None else None
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            if merged is None or getattr(metric, "shared", False):
+                lines.extend(metric.render())
+            else:
+                lines.extend(metric.render(merged.get(metric.name, {})))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
@@ -0,0 +1,125 @@
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+import bcrypt
+from werkzeug.exceptions import ServiceUnavailable
+
+from utils.metrics import registry
+
+OPERATION_SECONDS = registry.histogram("vertex_password_operation_seconds",
+                                       "Time spent hashing and checking passwords, including queueing",
+                                       ("operation",), (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+REJECTED = registry.counter("vertex_password_operations_rejected_total",
+                            "Password operations rejected because the hasher was saturated")
+
+HASH_PATTERN = re.compile(r"^\$2[aby]\$\d\d\$[./A-Za-z0-9]{53}$")
+
+
+def hash_password(password: str) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+
+
+def check_password(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+def is_password_hash(value: str) -> bool:
+    return HASH_PATTERN.match(value) is not None
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = None, max_pending: int = 64, timeout: float = 30):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.executor = None
+        self.executor_pid = None
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.rejected = 0
+
+    def hash(self, password: str) -> str:
+        return self.submit("hash", hash_password, password)
+
+    def check(self, password: str, hashed_password: str) -> bool:
+        return self.submit("check", check_password, password, hashed_password)
+
+    def hash_many(self, passwords: list[str]) -> list[str]:
+        """Hashes ``passwords`` across every worker, one window of ``workers`` passwords at a time.
+
+        Each password in a window holds a pending slot, and slots are given back between windows, so a large
+        batch queues at most one window ahead of single operations and each window gets the normal timeout.
+        """
+        hashed = []
+        for start in range(0, len(passwords), self.workers):
+            window = passwords[start:start + self.workers]
+            with self.slot("hash_many", len(window)):
+                futures = [self.pool().submit(hash_password, password) for password in window]
+                hashed.extend(future.result(timeout=self.timeout) for future in futures)
+        return hashed
+
+    def submit(self, operation: str, function, *args):
+        with self.slot(operation):
+            return self.pool().submit(function, *args).result(timeout=self.timeout)
+
+    @contextmanager
+    def slot(self, operation: str, count: int = 1):
+        for acquired in range(count):
+            if not self.slots.acquire(blocking=False):
+                for _ in range(acquired):
+                    self.slots.release()
+                with self.lock:
+                    self.rejected += 1
+                REJECTED.inc()
+                raise ServiceUnavailable("Too many password operations in progress, retry later", retry_after=1)
+
+        started_on = time.perf_counter()
+        try:
+            yield
+        except BrokenProcessPool:
+            self.reset()
+            raise Exception("Password hashing failed")
+        finally:
+            for _ in range(count):
+                self.slots.release()
+            self.record(operation, time.perf_counter() - started_on)
+
+    def pool(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None or self.executor_pid != os.getpid():
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+                self.executor_pid = os.getpid()
+            return self.executor
+
+    def reset(self):
+        with self.lock:
+            if self.executor is not None and self.executor_pid == os.getpid():
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def record(self, operation: str, duration: float):
+        OPERATION_SECONDS.observe((operation,), duration)
+        with self.lock:
+            count, total, maximum = self.latencies.get(operation, (0, 0.0, 0.0))
+            self.latencies[operation] = (count + 1, total + duration, max(maximum, duration))
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "rejected": self.rejected,
+                "operations": {
+                    operation: {
+                        "count": count,
+                        "average_seconds": total / count,
+                        "max_seconds": maximum,
+                    } for operation, (count, total, maximum) in self.latencies.items()
+                }
+            }
+
+    def close(self):
+        self.reset()
@@ -0,0 +1,159 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from flask import Flask, g, request
+from werkzeug.exceptions import Conflict
+
+PHASES = ("before_request", "auth", "manager", "serialization")
+
+
+def mark(phase: str):
+    """Starts ``phase`` of the current request's timing breakdown; a no-op unless a profile is being recorded."""
+    marks = g.get("profile_marks")
+    if marks is not None:
+        marks.append((phase, time.perf_counter()))
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return "%s (%s:%d)" % (code.co_name, os.sep.join(code.co_filename.split(os.sep)[-2:]), code.co_firstlineno)
+
+
+class Profile:
+    def __init__(self, max_requests: int, interval: float, max_breakdowns: int):
+        self.max_requests = max_requests
+        self.interval = interval
+        self.max_breakdowns = max_breakdowns
+        self.stacks = Counter()
+        self.samples = 0
+        self.requests = 0
+        self.breakdowns = []
+        self.done = threading.Event()
+
+
+class Profiler:
+    """Samples the stacks of threads that are handling requests, and times the phases of those requests.
+
+    Only one profile runs at a time and it covers the current process only. While no profile runs the
+    request hooks reduce to a couple of attribute checks.
+    """
+
+    def __init__(self, max_seconds: float = 60, max_breakdowns: int = 1000):
+        self.max_seconds = max_seconds
+        self.max_breakdowns = max_breakdowns
+        self.lock = threading.Lock()
+        self.profile = None
+        self.active = set()
+
+    def install(self, app: Flask):
+        """Hooks into the app; call after every route has been registered."""
+        app.before_request_funcs.setdefault(None, []).insert(0, self.start_request)
+        app.after_request(self.finish_request)
+        app.teardown_request(self.teardown_request)
+        for endpoint, view in app.view_functions.items():
+            app.view_functions[endpoint] = self.timed_view(view)
+
+    def run(self, seconds: float, requests: int | None, interval: float) -> dict:
+        profile = Profile(requests or 0, interval, self.max_breakdowns)
+        with self.lock:
+            if self.profile is not None:
+                raise Conflict("A profile is already being recorded")
+            self.profile = profile
+        started_on = time.perf_counter()
+        excluded = {threading.get_ident()}
+        try:
+            deadline = started_on + min(seconds, self.max_seconds)
+            while not profile.done.is_set():
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self.sample(profile, excluded)
+                profile.done.wait(min(interval, remaining))
+        finally:
+            with self.lock:
+                self.profile = None
+        return {
+            "seconds": time.perf_counter() - started_on,
+            "interval": interval,
+            "samples": profile.samples,
+            "requests": profile.requests,
+            "collapsed": "\n".join("%s %d" % (stack, count) for stack, count in profile.stacks.most_common()),
+            "phases": self.summarize(profile.breakdowns),
+            "breakdowns": profile.breakdowns,
+        }
+
+    def sample(self, profile: Profile, excluded: set[int]):
+        with self.lock:
+            active = self.active - excluded
+        if not active:
+            return
+        frames = sys._current_frames()
+        for ident in active:
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                stack.append(frame_name(frame))
+                frame = frame.f_back
+            if stack:
+                profile.stacks[";".join(reversed(stack))] += 1
+        profile.samples += 1
+
+    def start_request(self):
+        if self.profile is not None:
+            with self.lock:
+                self.active.add(threading.get_ident())
+            g.profile_marks = [("before_request", time.perf_counter())]
+
+    def finish_request(self, response):
+        marks = g.get("profile_marks")
+        profile = self.profile
+        if marks is None or profile is None:
+            return response
+        marks.append((None, time.perf_counter()))
+        phases = dict.fromkeys(PHASES, 0.0)
+        for (phase, started_on), (_, ended_on) in zip(marks, marks[1:]):
+            phases[phase] = phases.get(phase, 0.0) + (ended_on - started_on) * 1000
+        with self.lock:
+            profile.requests += 1
+            if len(profile.breakdowns) < profile.max_breakdowns:
+                profile.breakdowns.append({
+                    "endpoint": request.endpoint,
+                    "method": request.method,
+                    "status": response.status_code,
+                    "total_ms": (marks[-1][1] - marks[0][1]) * 1000,
+                    "phases_ms": phases,
+                })
+            if profile.max_requests and profile.requests >= profile.max_requests:
+                profile.done.set()
+        return response
+
+    def teardown_request(self, _):
+        if g.pop("profile_marks", None) is not None:
+            with self.lock:
+                self.active.discard(threading.get_ident())
+
+    @staticmethod
+    def timed_view(view):
+        @wraps(view)
+        def decorated(*args, **kwargs):
+            mark("manager")
+            result = view(*args, **kwargs)
+            mark("serialization")
+            return result
+
+        return decorated
+
+    @staticmethod
+    def summarize(breakdowns: list[dict]) -> dict:
+        if not breakdowns:
+            return {}
+        return {
+            phase: {
+                "total_ms": sum(breakdown["phases_ms"].get(phase, 0.0) for breakdown in breakdowns),
+                "average_ms": sum(breakdown["phases_ms"].get(phase, 0.0) for breakdown in breakdowns) / len(breakdowns),
+            } for phase in PHASES
+        }
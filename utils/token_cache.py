@@ -0,0 +1,96 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from utils.invalidation import InvalidationBoard
+
+
+class TokenCache:
+    """Verified token claims by token and scope, dropped when any tag they were stored with is invalidated.
+
+    With a ``board`` tags are invalidated in every process sharing it: an entry keeps the generations its
+    tags had before the token was checked, and a lookup that finds one of them moved treats it as a miss.
+    """
+
+    def __init__(self, max_size: int, ttl: float, board: InvalidationBoard = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.board = board
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str, scope: str) -> dict | None:
+        key = self.key(token, scope)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_on, claims, tags, generations = entry
+                if expires_on > time.time() and (self.board is None or
+                                                 self.board.generations(tags) == generations):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(claims)
+                self.discard(key)
+            self.misses += 1
+            return None
+
+    def generations(self, tags: list[str]) -> tuple[int, ...] | None:
+        """Returns what ``put`` compares later lookups with; take it before checking what the tags stand for."""
+        return self.board.generations(tags) if self.board is not None else None
+
+    def put(self, token: str, scope: str, claims: dict, tags: list[str], exp: int = None,
+            generations: tuple[int, ...] = None):
+        if self.max_size <= 0:
+            return
+        if generations is None:
+            generations = self.generations(tags)
+        expires_on = time.time() + self.ttl
+        if exp is not None:
+            expires_on = min(expires_on, exp)
+        key = self.key(token, scope)
+        with self.lock:
+            self.discard(key)
+            self.entries[key] = (expires_on, dict(claims), tags, generations)
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_size:
+                self.discard(next(iter(self.entries)))
+
+    def invalidate(self, tag: str):
+        if self.board is not None:
+            self.board.bump(tag)
+        with self.lock:
+            for key in self.tags.pop(tag, ()):
+                self.discard(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def discard(self, key: bytes):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+    @staticmethod
+    def key(token: str, scope: str) -> bytes:
+        return hashlib.sha256(("%s\0%s" % (scope, token)).encode("utf-8")).digest()